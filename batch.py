@@ -0,0 +1,150 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, fields
+
+import pandas
+
+from model import Shit, PlantTotals, feedstock_index, match_feedstock_volumes, write_table
+from library_cache import load_library
+from run_history import RunHistory, default_history_path, snapshot
+
+
+PROJECT_DETAILS = 'Project Details.csv'
+DEFAULT_VOLUMES = 'feedstock volumes.csv'
+TOTAL_COLUMNS = [f.name for f in fields(PlantTotals)]
+
+# Set once per worker process by _init_worker
+_shit = None
+_index = None
+_record = False
+
+
+def find_projects(directory: str, volumes_name: str = DEFAULT_VOLUMES):
+    """(project directory, volumes file) for every folder under `directory` holding a Project Details.csv
+
+    The volumes file is `volumes_name` when present, otherwise the only other
+    CSV in the folder. A project without one is returned with None so the
+    problem shows up in the results.
+    """
+    projects = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        if PROJECT_DETAILS not in files:
+            continue
+        others = sorted(name for name in files if name.lower().endswith('.csv') and name != PROJECT_DETAILS)
+        if volumes_name in files:
+            volumes = volumes_name
+        elif len(others) == 1:
+            volumes = others[0]
+        else:
+            volumes = None
+        projects.append((root, None if volumes is None else os.path.join(root, volumes)))
+    return projects
+
+
+def read_project_details(path: str):
+    """First row of a Project Details.csv as {header: value}, headers stripped"""
+    df = pandas.read_csv(path, dtype=object, keep_default_na=False, encoding='utf-8-sig')
+    if df.empty:
+        return {header.strip(): '' for header in df.columns}
+    return {header.strip(): str(value).strip() for header, value in df.iloc[0].items()}
+
+
+def _init_worker(feedstock_path, cache_dir, record=False):
+    # Every worker maps the same cache files; volume edits stay in private copy-on-write pages
+    global _shit, _index, _record
+    _shit = Shit.from_library(load_library(feedstock_path, cache_dir))
+    _index = feedstock_index(_shit.library)
+    _record = record
+
+
+def run_project(project):
+    """Evaluate one project against the worker's library; errors are reported, not raised"""
+    directory, volumes_path = project
+    # Runner columns are prefixed so Project Details headers such as 'Status' cannot overwrite them
+    row = {'project_dir': directory, 'volumes_file': volumes_path, 'run_status': 'ok', 'run_error': ''}
+    try:
+        row.update(read_project_details(os.path.join(directory, PROJECT_DETAILS)))
+        if volumes_path is None:
+            raise FileNotFoundError(f"No volumes file in {directory}")
+        report = match_feedstock_volumes(_shit, volumes_path, index=_index)
+        row.update(
+            matched=len(report.matched),
+            unmatched='; '.join(map(str, report.unmatched)),
+            ambiguous=len(report.ambiguous),
+            invalid=len(report.invalid)
+        )
+        if not report.ok:
+            row['run_status'] = 'warning'
+        row.update(asdict(_shit.totals()))
+        if _record:
+            row['_snapshot'] = snapshot(_shit)
+    except Exception as e:
+        row.update(run_status='error', run_error=f"{type(e).__name__}: {e}")
+    return row
+
+
+def run_batch(directory: str, feedstock_path: str, output_path: str, workers: int = None,
+              volumes_name: str = DEFAULT_VOLUMES, cache_dir: str = None, history_path: str = None):
+    """Run every project under `directory` across a process pool and write one results file
+
+    The feedstock library is parsed (or served from the binary cache) once
+    up front; workers then memory-map the same cache entry instead of each
+    parsing the CSV. Output is CSV, or JSON records when `output_path` ends
+    in .json. With `history_path` every project that ran is also appended
+    to that run history, linked to its Project Details. Returns the
+    results DataFrame.
+    """
+    projects = find_projects(directory, volumes_name)
+    load_library(feedstock_path, cache_dir)  # Build the cache before the workers race for it
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(projects) or 1))
+    record = history_path is not None
+    if workers == 1:
+        _init_worker(feedstock_path, cache_dir, record)
+        rows = [run_project(project) for project in projects]
+    else:
+        chunksize = max(1, len(projects) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(feedstock_path, cache_dir, record)) as executor:
+            rows = list(executor.map(run_project, projects, chunksize=chunksize))
+
+    snapshots = [(row.pop('_snapshot'), row) for row in rows if '_snapshot' in row]
+    if record:
+        with RunHistory(history_path) as history:
+            history.append_many([(data, details, 'batch', None) for data, details in snapshots])
+
+    results = pandas.DataFrame(rows)
+    # Project columns first, then the match report, then the plant totals
+    leading = [column for column in results.columns if column not in TOTAL_COLUMNS]
+    results = results[leading + [column for column in TOTAL_COLUMNS if column in results.columns]]
+
+    write_table(results, output_path)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the biogas model for every project in a directory")
+    parser.add_argument('projects', help="Directory of project folders, each with a Project Details.csv")
+    parser.add_argument('-f', '--feedstocks', default='Feedstocks_Training.csv', help="Feedstock library CSV")
+    parser.add_argument('-o', '--output', default='batch_results.csv', help="Results file (.csv or .json)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--volumes-name', default=DEFAULT_VOLUMES, help="Volumes file name in each project")
+    parser.add_argument('--cache-dir', default=None, help="Feedstock cache directory (default: the user cache)")
+    parser.add_argument('--history', nargs='?', const=default_history_path(), default=None,
+                        help="Also append every run to a run history (default file: the user data directory)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = run_batch(args.projects, args.feedstocks, args.output, args.workers, args.volumes_name,
+                        args.cache_dir, args.history)
+    counts = results['run_status'].value_counts().to_dict() if len(results) else {}
+    print(f"{len(results)} projects in {time.perf_counter() - start:.1f}s "
+          f"({', '.join(f'{n} {status}' for status, n in counts.items()) or 'none found'}) -> {args.output}")
+    return 1 if counts.get('error') else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
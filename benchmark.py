@@ -0,0 +1,294 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas
+
+from model import feed, assign_feedstock_volumes, atomic_write, FEEDSTOCK_HEADERS
+from scenarios import evaluate_scenarios
+
+
+FEEDSTOCK_SIZES = (10, 100, 1000, 10000, 100000, 1000000)
+SCENARIO_SIZES = (1, 10, 100, 1000, 10000, 100000, 1000000)
+QUICK_FEEDSTOCK_SIZES = (10, 1000, 100000)
+QUICK_SCENARIO_SIZES = (1, 1000, 100000)
+SCENARIO_FEEDSTOCKS = 20  # Library size for the scenario cases, 1e6 scenarios is then 160 MB of volumes
+
+MIN_TIME = 1.0  # Seconds of repeats per case before the median time is taken
+MIN_REPEATS = 7
+MAX_REPEATS = 5000
+SEED = 1
+
+# Regressions are only reported past these relative changes
+THROUGHPUT_TOLERANCE = 0.10
+SPREAD_MULTIPLE = 2.0  # A case's throughput tolerance is at least this many times its repeat spread
+SUB_MS = 1e-3  # Cases faster than this many seconds are dominated by timer and scheduler noise
+SUB_MS_TOLERANCE = 0.30
+MAX_TOLERANCE = 0.50  # Halving the throughput is always a regression, however noisy the case
+MEMORY_TOLERANCE = 0.20
+MEMORY_FLOOR = 1 << 20  # Peak changes smaller than this many bytes are noise
+
+
+def write_feedstocks(path: str, n: int, seed: int = SEED):
+    """Write a synthetic feedstock CSV of `n` rows, with a units row like the real libraries"""
+    rng = np.random.default_rng(seed)
+    headers = {field: header for header, field in FEEDSTOCK_HEADERS.items()}
+    columns = {
+        'source': np.full(n, 'Synthetic'),
+        'feedstock_name': np.char.add('Feedstock ', np.arange(n).astype(str)),
+        'dm': rng.uniform(0.02, 0.9, n).round(4),
+        'vs_of_dm': rng.uniform(0.5, 0.95, n).round(4),
+        'biogas_yield_vs': rng.uniform(150, 800, n).round(1),
+        'percent_ch4': rng.uniform(0.5, 0.7, n).round(3),
+        'crop_residue_waste_other': rng.choice(['C', 'R', 'W', 'O'], n),
+        'density': rng.uniform(0.5, 1.2, n).round(3),
+        'l_s': rng.choice(['L', 'S'], n),
+        'digestion_reduction_factor': rng.uniform(0.5, 0.9, n).round(3)
+    }
+    for field in ('cod', 'bod', 'total_n', 'am_n', 'total_p', 'sol_p', 'solid_p', 'total_k'):
+        columns[field] = rng.uniform(0, 50, n).round(2)
+
+    df = pandas.DataFrame({headers[field].title(): values for field, values in columns.items()})
+    units = pandas.DataFrame([['Unit'] + [''] * (df.shape[1] - 1)], columns=df.columns)
+    pandas.concat([units, df.astype(object)]).to_csv(path, index=False)
+    return path
+
+
+def write_volumes(path: str, n: int, seed: int = SEED):
+    """Write a volumes CSV naming every synthetic feedstock, tonnages formatted like the real files"""
+    rng = np.random.default_rng(seed + 1)
+    tonnes = rng.integers(0, 50000, n)
+    pandas.DataFrame({
+        'Feedstock Name': np.char.add('Feedstock ', np.arange(n).astype(str)),
+        'TPA': [f"{t:,}" for t in tonnes]
+    }).to_csv(path, index=False)
+    return path
+
+
+def synthetic_shit(directory: str, n: int):
+    """Shit loaded from a fresh synthetic library, volumes assigned"""
+    shit = feed(write_feedstocks(os.path.join(directory, f"feedstocks-{n}.csv"), n))
+    return assign_feedstock_volumes(shit, write_volumes(os.path.join(directory, f"volumes-{n}.csv"), n))
+
+
+def measure(run, setup=None):
+    """Median wall time of `run(state)` over repeats, its spread, and the peak traced allocation of one run
+
+    The spread is the interquartile range of the repeats over their median.
+    `setup` builds a fresh state before every repeat and is not timed. The
+    memory pass runs separately so tracing does not inflate the timings.
+    """
+    setup = setup or (lambda: None)
+    times = []
+    total = 0.0
+    while len(times) < MIN_REPEATS or (total < MIN_TIME and len(times) < MAX_REPEATS):
+        state = setup()
+        gc.disable()  # As timeit does, so a collection does not land in one repeat
+        try:
+            start = time.perf_counter()
+            run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        times.append(elapsed)
+        total += elapsed
+
+    state = setup()
+    tracemalloc.start()
+    try:
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    median = float(np.median(times))
+    q1, q3 = np.percentile(times, [25, 75])
+    spread = float((q3 - q1) / median) if median > 0 else 0.0
+    return median, spread, len(times), peak
+
+
+def _feedstock_cases(directory: str, n: int):
+    """(case, unit, run, setup) for the library-sized hot paths at `n` feedstocks"""
+    feedstock_path = write_feedstocks(os.path.join(directory, f"feedstocks-{n}.csv"), n)
+    volumes_path = write_volumes(os.path.join(directory, f"volumes-{n}.csv"), n)
+    cache_dir = os.path.join(directory, 'cache')
+    feed(feedstock_path, cache=True, cache_dir=cache_dir)  # Build the binary cache for the cached case
+    shit = assign_feedstock_volumes(feed(feedstock_path), volumes_path)
+    volumes = shit.library.column('annual_volume').copy()
+
+    def dirty():
+        # A fresh volume write, so cached mass balances and running totals are rebuilt
+        shit.library.set_column('annual_volume', volumes)
+        return shit
+
+    return [
+        ('feed', 'feedstocks', lambda _: feed(feedstock_path), None),
+        ('feed_cached', 'feedstocks', lambda _: feed(feedstock_path, cache=True, cache_dir=cache_dir), None),
+        ('assign_feedstock_volumes', 'feedstocks', lambda _: assign_feedstock_volumes(shit, volumes_path), None),
+        # The reporting methods print their tables; the benchmarks time the table building only
+        ('biogas_production_stats', 'feedstocks', lambda s: s.production_table().to_dataframe(), dirty),
+        ('bulk_properties', 'feedstocks', lambda s: [t.to_dataframe() for t in s.bulk_tables()], dirty)
+    ]
+
+
+def run_benchmarks(feedstock_sizes=FEEDSTOCK_SIZES, scenario_sizes=SCENARIO_SIZES, cases=None, log=print):
+    """Run every case at every size; returns the results document written by `save`"""
+    results = []
+
+    def record(case, unit, size, run, setup=None):
+        if cases and case not in cases:
+            return
+        seconds, spread, repeats, peak = measure(run, setup)
+        results.append({
+            'case': case,
+            'size': int(size),
+            'unit': unit,
+            'seconds': seconds,
+            'spread': spread,
+            'throughput': size / seconds if seconds > 0 else float('inf'),
+            'peak_bytes': int(peak),
+            'repeats': repeats
+        })
+        if log:
+            log(f"{case:<26} {size:>9,} {unit:<11} {seconds * 1000:>11.3f} ms +/-{spread:>6.1%} "
+                f"{size / seconds:>14,.0f} /s {peak / 1e6:>9.1f} MB")
+
+    directory = tempfile.mkdtemp(prefix='biogas-bench-')
+    try:
+        for n in feedstock_sizes:
+            for case, unit, run, setup in _feedstock_cases(directory, n):
+                record(case, unit, n, run, setup)
+
+        if scenario_sizes:
+            shit = synthetic_shit(directory, SCENARIO_FEEDSTOCKS)
+            rng = np.random.default_rng(SEED)
+            for n in scenario_sizes:
+                volumes = rng.uniform(0, 50000, (n, SCENARIO_FEEDSTOCKS))
+                record('evaluate_scenarios', 'scenarios', n, lambda _: evaluate_scenarios(shit, volumes))
+                del volumes
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pandas.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count()
+        },
+        'results': results
+    }
+
+
+def save(document: dict, path: str):
+    with atomic_write(path, encoding='utf-8') as f:
+        json.dump(document, f, indent=1)
+
+
+def load(path: str):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def case_tolerance(old: dict, new: dict, throughput_tolerance=THROUGHPUT_TOLERANCE):
+    """Allowed fractional throughput drop between two results of one case"""
+    # Results files from before the spread was recorded count as noiseless
+    spread = max(old.get('spread', 0.0), new.get('spread', 0.0))
+    tolerance = max(throughput_tolerance, SPREAD_MULTIPLE * spread)
+    if min(old['seconds'], new['seconds']) < SUB_MS:
+        tolerance = max(tolerance, SUB_MS_TOLERANCE)
+    return min(tolerance, MAX_TOLERANCE)
+
+
+def compare(baseline: dict, current: dict, throughput_tolerance=THROUGHPUT_TOLERANCE,
+            memory_tolerance=MEMORY_TOLERANCE):
+    """Rows of (case, size, throughput ratio, peak ratio, tolerance, problems) for every case in both documents
+
+    Ratios are current / baseline, so a throughput ratio below 1 is slower
+    and a peak ratio above 1 uses more memory. Each case's throughput
+    tolerance is widened from `throughput_tolerance` by the repeat spread
+    of either run, and for sub-millisecond cases.
+    """
+    previous = {(r['case'], r['size']): r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        old = previous.get((result['case'], result['size']))
+        if old is None:
+            continue
+        speed = result['throughput'] / old['throughput'] if old['throughput'] else float('inf')
+        memory = result['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else 1.0
+        tolerance = case_tolerance(old, result, throughput_tolerance)
+        problems = []
+        if speed < 1 - tolerance:
+            problems.append('throughput')
+        if memory > 1 + memory_tolerance and result['peak_bytes'] - old['peak_bytes'] > MEMORY_FLOOR:
+            problems.append('memory')
+        rows.append((result['case'], result['size'], speed, memory, tolerance, problems))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'case':<26} {'size':>9} {'speed':>8} {'memory':>8} {'allowed':>8}")
+    for case, size, speed, memory, tolerance, problems in rows:
+        flag = f"  REGRESSION ({', '.join(problems)})" if problems else ''
+        print(f"{case:<26} {size:>9,} {speed:>7.2f}x {memory:>7.2f}x {-tolerance:>8.0%}{flag}")
+    regressions = sum(1 for row in rows if row[5])
+    print(f"{regressions} regression(s) in {len(rows)} comparable case(s)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the model hot paths on synthetic feedstock libraries")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Run the benchmarks and write a results JSON")
+    run.add_argument('-o', '--output', default='benchmark_results.json', help="Results file")
+    run.add_argument('--quick', action='store_true', help="Three sizes per axis instead of every decade")
+    run.add_argument('--feedstocks', type=int, nargs='*', default=None, help="Library sizes to run")
+    run.add_argument('--scenarios', type=int, nargs='*', default=None, help="Scenario counts to run")
+    run.add_argument('--case', action='append', default=None, help="Only run this case (repeatable)")
+    run.add_argument('--baseline', default=None, help="Compare against this results file when done")
+
+    comparison = commands.add_parser('compare', help="Flag regressions between two results files")
+    comparison.add_argument('baseline', help="Stored baseline results")
+    comparison.add_argument('current', help="New results")
+
+    for command in (run, comparison):
+        command.add_argument('--throughput-tolerance', type=float, default=THROUGHPUT_TOLERANCE,
+                             help="Smallest allowed fractional drop in throughput, widened for noisy cases")
+        command.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE,
+                             help="Allowed fractional rise in peak memory")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        feedstock_sizes = QUICK_FEEDSTOCK_SIZES if args.quick else FEEDSTOCK_SIZES
+        scenario_sizes = QUICK_SCENARIO_SIZES if args.quick else SCENARIO_SIZES
+        document = run_benchmarks(
+            feedstock_sizes if args.feedstocks is None else args.feedstocks,
+            scenario_sizes if args.scenarios is None else args.scenarios,
+            args.case
+        )
+        save(document, args.output)
+        print(f"{len(document['results'])} results -> {args.output}")
+        if args.baseline is None:
+            return 0
+        baseline, current = load(args.baseline), document
+    else:
+        baseline, current = load(args.baseline), load(args.current)
+
+    rows = compare(baseline, current, args.throughput_tolerance, args.memory_tolerance)
+    return 1 if print_comparison(rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from model import assign_feedstock_volumes, feed
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def feedstocks_path():
+    return os.path.join(HERE, 'Feedstocks_Training.csv')
+
+
+@pytest.fixture
+def volumes_path():
+    return os.path.join(HERE, 'feedstock volumes.csv')
+
+
+@pytest.fixture
+def shit(feedstocks_path, volumes_path):
+    return assign_feedstock_volumes(feed(feedstocks_path), volumes_path)
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from model import FeedStockLibrary, atomic_write, load_feedstock_library
+
+
+CACHE_VERSION = 1
+CACHE_NAME = os.path.join('biogas_plant_sim', 'feedstocks')
+
+
+def _content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_cache_dir():
+    """Per-user cache: %LOCALAPPDATA% on Windows, $XDG_CACHE_HOME or ~/.cache elsewhere"""
+    base = os.environ.get('LOCALAPPDATA' if os.name == 'nt' else 'XDG_CACHE_HOME')
+    return os.path.join(base or os.path.join(os.path.expanduser('~'), '.cache'), CACHE_NAME)
+
+
+def _entry_dir(path, cache_dir):
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    return os.path.join(cache_dir, hashlib.sha1(path.encode('utf-8')).hexdigest()[:16])
+
+
+def _read_meta(entry):
+    try:
+        with open(os.path.join(entry, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CACHE_VERSION else None
+
+
+def _save_array(path, array):
+    # np.save appends .npy to names without it, so write through a file object
+    with atomic_write(path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+
+
+def _save_json(path, data):
+    with atomic_write(path, encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def _write_entry(entry, path, stat, content_hash, library: FeedStockLibrary):
+    """Write the arrays under content-hashed names first and the metadata last,
+    so a reader never pairs new metadata with old arrays"""
+    os.makedirs(entry, exist_ok=True)
+    numeric = np.vstack([library.column(name) for name in FeedStockLibrary.NUMERIC_FIELDS])
+    codes = np.vstack([library.codes(name) for name in FeedStockLibrary.CATEGORICAL_FIELDS])
+    _save_array(os.path.join(entry, f"numeric-{content_hash}.npy"), numeric)
+    _save_array(os.path.join(entry, f"codes-{content_hash}.npy"), codes)
+    _save_json(os.path.join(entry, f"text-{content_hash}.json"), {
+        'text': {name: library.column(name) for name in FeedStockLibrary.TEXT_FIELDS},
+        'categories': library.categories,
+        'units': library.units
+    })
+    _save_json(os.path.join(entry, 'meta.json'), {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': content_hash,
+        'rows': len(library)
+    })
+
+    # Drop arrays left over from earlier versions of the CSV
+    for name in os.listdir(entry):
+        if name != 'meta.json' and content_hash not in name and '.tmp-' not in name:
+            try:
+                os.remove(os.path.join(entry, name))
+            except OSError:
+                pass
+
+
+def _load_entry(entry, content_hash):
+    # Copy-on-write maps: loading is near zero-copy and edits stay private to the process
+    numeric = np.load(os.path.join(entry, f"numeric-{content_hash}.npy"), mmap_mode='c')
+    codes = np.load(os.path.join(entry, f"codes-{content_hash}.npy"), mmap_mode='c')
+    with open(os.path.join(entry, f"text-{content_hash}.json"), encoding='utf-8') as f:
+        text = json.load(f)
+    return FeedStockLibrary.from_arrays(
+        numeric=dict(zip(FeedStockLibrary.NUMERIC_FIELDS, numeric)),
+        codes=dict(zip(FeedStockLibrary.CATEGORICAL_FIELDS, codes)),
+        categories=text['categories'],
+        text=text['text'],
+        units=text['units']
+    )
+
+
+def load_library(path: str, cache_dir: str = None):
+    """Feedstock library for a CSV, served from the binary cache when it is current
+
+    Entries live under `cache_dir` (default_cache_dir() when None), keyed
+    on the absolute source path and checked against the file size and
+    mtime. When those changed but the content hash did not (e.g. the
+    file was only touched), the entry is refreshed instead of rebuilt.
+    Any real change to the CSV reparses it and rewrites the entry.
+    If the cache cannot be read or written the CSV is parsed directly.
+    """
+    entry = _entry_dir(path, cache_dir)
+    stat = os.stat(path)
+    meta = _read_meta(entry)
+    try:
+        if meta is not None:
+            if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+                return _load_entry(entry, meta['sha256'])
+            content_hash = _content_hash(path)
+            if content_hash == meta['sha256']:
+                library = _load_entry(entry, content_hash)
+                meta.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                _save_json(os.path.join(entry, 'meta.json'), meta)
+                return library
+    except (OSError, ValueError, KeyError):
+        pass  # Damaged entry - fall through and rebuild it
+
+    content_hash = _content_hash(path)
+    library = load_feedstock_library(path)
+    try:
+        _write_entry(entry, path, stat, content_hash, library)
+    except OSError:
+        pass  # Read-only location, run uncached
+    return library
+
@@ -1,3 +1,7 @@
+import os
+import unicodedata
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 from dataclasses import dataclass
 
 import pandas
@@ -5,253 +9,790 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 
-@dataclass
+class FeedStockLibrary:
+    """Columnar store of feedstock properties - one contiguous array per field"""
+    TEXT_FIELDS = ('source', 'feedstock_name')
+    CATEGORICAL_FIELDS = ('crop_residue_waste_other', 'l_s')
+    NUMERIC_FIELDS = (
+        'dm', 'vs_of_dm', 'biogas_yield_vs', 'percent_ch4', 'density',
+        'digestion_reduction_factor', 'cod', 'bod', 'total_n', 'am_n',
+        'total_p', 'sol_p', 'solid_p', 'total_k', 'annual_volume'
+    )
+    # Field order matches the FeedStock constructor
+    FIELDS = (
+        'source', 'feedstock_name', 'dm', 'vs_of_dm', 'biogas_yield_vs', 'percent_ch4',
+        'crop_residue_waste_other', 'density', 'l_s', 'digestion_reduction_factor',
+        'cod', 'bod', 'total_n', 'am_n', 'total_p', 'sol_p', 'solid_p', 'total_k',
+        'annual_volume'
+    )
+
+    def __init__(self, capacity=16):
+        self.size = 0
+        self.version = 0  # Bumped on every write so cached results can be invalidated
+        self.property_version = 0  # Bumped on every write to a field other than annual_volume
+        self._capacity = max(int(capacity), 1)
+        self._numeric = {name: np.zeros(self._capacity, dtype=np.float64) for name in self.NUMERIC_FIELDS}
+        self._codes = {name: np.full(self._capacity, -1, dtype=np.int32) for name in self.CATEGORICAL_FIELDS}
+        self.categories = {name: [] for name in self.CATEGORICAL_FIELDS}
+        self._category_index = {name: {} for name in self.CATEGORICAL_FIELDS}
+        self._text = {name: [] for name in self.TEXT_FIELDS}
+        self.units = {}  # Field -> unit string from the CSV units row
+        self._watchers = []  # Notified around single-value writes, see RunningTotals
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def from_arrays(cls, numeric: dict, codes: dict, categories: dict, text: dict, units: dict = None):
+        """Build a library that adopts existing arrays without copying (e.g. memory maps)"""
+        library = cls(capacity=1)
+        library.size = library._capacity = len(text['feedstock_name'])
+        library.units = dict(units or {})
+        library._numeric = {name: numeric[name] for name in cls.NUMERIC_FIELDS}
+        library._codes = {name: codes[name] for name in cls.CATEGORICAL_FIELDS}
+        library.categories = {name: list(categories[name]) for name in cls.CATEGORICAL_FIELDS}
+        library._category_index = {
+            name: {value: i for i, value in enumerate(values)} for name, values in library.categories.items()
+        }
+        library._text = {name: list(text[name]) for name in cls.TEXT_FIELDS}
+        return library
+
+    def copy(self):
+        """Independent copy of the stored rows"""
+        return FeedStockLibrary.from_arrays(
+            numeric={name: self.column(name).copy() for name in self.NUMERIC_FIELDS},
+            codes={name: self.codes(name).copy() for name in self.CATEGORICAL_FIELDS},
+            categories=self.categories,
+            text={name: self.column(name) for name in self.TEXT_FIELDS},
+            units=self.units
+        )
+
+    @classmethod
+    def from_columns(cls, columns: dict, units: dict = None):
+        """Build a library in bulk from whole columns keyed by field name
+
+        Numeric fields that are not supplied are left blank (NaN), apart from
+        annual_volume which starts at zero.
+        """
+        size = len(columns['feedstock_name'])
+        library = cls(capacity=size)
+        library.size = size
+        library.units = dict(units or {})
+        for name in cls.NUMERIC_FIELDS:
+            default = 0.0 if name == 'annual_volume' else np.nan
+            values = columns.get(name)
+            library._numeric[name][:size] = default if values is None else np.asarray(values, dtype=np.float64)
+        for name in cls.CATEGORICAL_FIELDS:
+            values = columns.get(name)
+            if values is None:
+                continue
+            codes, uniques = pandas.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+            library._codes[name][:size] = codes
+            library.categories[name] = [str(value) for value in uniques]
+            library._category_index[name] = {value: i for i, value in enumerate(library.categories[name])}
+        for name in cls.TEXT_FIELDS:
+            values = columns.get(name)
+            library._text[name] = [None] * size if values is None else list(values)
+        return library
+
+    def _grow(self, needed):
+        """Double the array capacity until `needed` rows fit"""
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        for name, values in self._numeric.items():
+            grown = np.zeros(capacity, dtype=np.float64)
+            grown[:self.size] = values[:self.size]
+            self._numeric[name] = grown
+        for name, codes in self._codes.items():
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:self.size] = codes[:self.size]
+            self._codes[name] = grown
+        self._capacity = capacity
+
+    def category_code(self, field, value, create=False):
+        """Integer code for a categorical value (-1 for missing or unknown)"""
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return -1
+        value = str(value)
+        index = self._category_index[field]
+        if value not in index:
+            if not create:
+                return -1
+            index[value] = len(self.categories[field])
+            self.categories[field].append(value)
+        return index[value]
+
+    def append(self, **values):
+        """Add one feedstock row and return its index"""
+        row = self.size
+        self._grow(row + 1)
+        self.size += 1
+        for name in self.TEXT_FIELDS:
+            self._text[name].append(None)
+        self.set_row(row, **values)
+        return row
+
+    def set_row(self, row, **values):
+        """Overwrite the given fields of one row"""
+        for name, value in values.items():
+            self.set(name, row, value)
+
+    def remove(self, row):
+        """Delete one row; the rows after it move up by one"""
+        if not 0 <= row < self.size:
+            raise IndexError(f"Row {row} out of range for {self.size} feedstocks")
+        last = self.size - 1
+        for values in self._numeric.values():
+            values[row:last] = values[row + 1:self.size]
+            values[last] = 0.0
+        for codes in self._codes.values():
+            codes[row:last] = codes[row + 1:self.size]
+            codes[last] = -1
+        for values in self._text.values():
+            del values[row]
+        self.size = last
+        self.version += 1
+        self.property_version += 1
+
+    def get(self, field, row):
+        """Read a single value back as a plain Python object"""
+        if field in self._numeric:
+            return float(self._numeric[field][row])
+        if field in self._codes:
+            code = self._codes[field][row]
+            return self.categories[field][code] if code >= 0 else None
+        return self._text[field][row]
+
+    def watch(self, watcher):
+        """Call watcher.row_changing(row) / watcher.row_changed(row) around every set()"""
+        self._watchers.append(watcher)
+
+    def set(self, field, row, value):
+        """Write a single value"""
+        if field not in self._numeric and field not in self._codes and field not in self._text:
+            raise AttributeError(f"Unknown feedstock field: {field}")
+        for watcher in self._watchers:
+            watcher.row_changing(row)
+        if field in self._numeric:
+            self._numeric[field][row] = np.nan if value is None else value
+        elif field in self._codes:
+            self._codes[field][row] = self.category_code(field, value, create=True)
+        else:
+            self._text[field][row] = value
+        self.version += 1
+        if field != 'annual_volume':
+            self.property_version += 1
+        for watcher in self._watchers:
+            watcher.row_changed(row)
+
+    def column(self, field):
+        """Whole column for the stored rows (array view for numeric fields)"""
+        if field in self._numeric:
+            return self._numeric[field][:self.size]
+        if field in self._codes:
+            return self.labels(field)
+        return self._text[field]
+
+    def set_column(self, field, values):
+        """Overwrite a whole numeric column"""
+        self._numeric[field][:self.size] = values
+        self.version += 1
+        if field != 'annual_volume':
+            self.property_version += 1
+
+    def codes(self, field):
+        """Category codes for a categorical field"""
+        return self._codes[field][:self.size]
+
+    def labels(self, field):
+        """Decode a categorical field into an object array of labels"""
+        lookup = np.array(self.categories[field] + [None], dtype=object)
+        return lookup[self.codes(field)]  # -1 picks up the trailing None
+
+    def category_mask(self, field, value):
+        """Boolean mask of rows whose categorical field equals `value`"""
+        code = self.category_code(field, value)
+        if code < 0:
+            return np.zeros(self.size, dtype=bool)
+        return self.codes(field) == code
+
+
+def _field_property(name):
+    def getter(self):
+        return self._library.get(name, self._index)
+
+    def setter(self, value):
+        self._library.set(name, self._index, value)
+
+    return property(getter, setter)
+
+
 class FeedStock:
-    source: str
-    feedstock_name: str
-    dm: float
-    vs_of_dm: float
-    biogas_yield_vs: float
-    percent_ch4: float
-    crop_residue_waste_other: str
-    density: float
-    l_s: str
-    digestion_reduction_factor: float
-    cod: float
-    bod: float
-    total_n: float
-    am_n: float
-    total_p: float
-    sol_p: float
-    solid_p: float
-    total_k: float
-    annual_volume: float = 0.0  # Tonnes per year
+    """Lightweight view of one row of a FeedStockLibrary"""
+    __slots__ = ('_library', '_index', '_detached')
+
+    def __init__(self, source: str, feedstock_name: str, dm: float, vs_of_dm: float,
+                 biogas_yield_vs: float, percent_ch4: float, crop_residue_waste_other: str,
+                 density: float, l_s: str, digestion_reduction_factor: float,
+                 cod: float, bod: float, total_n: float, am_n: float, total_p: float,
+                 sol_p: float, solid_p: float, total_k: float,
+                 annual_volume: float = 0.0):  # Tonnes per year
+        # A standalone feedstock keeps its own single row until added to a Shit
+        self._library = FeedStockLibrary(capacity=1)
+        self._detached = True
+        self._index = self._library.append(
+            source=source, feedstock_name=feedstock_name, dm=dm, vs_of_dm=vs_of_dm,
+            biogas_yield_vs=biogas_yield_vs, percent_ch4=percent_ch4,
+            crop_residue_waste_other=crop_residue_waste_other, density=density, l_s=l_s,
+            digestion_reduction_factor=digestion_reduction_factor, cod=cod, bod=bod,
+            total_n=total_n, am_n=am_n, total_p=total_p, sol_p=sol_p, solid_p=solid_p,
+            total_k=total_k, annual_volume=annual_volume
+        )
+
+    @classmethod
+    def view(cls, library: FeedStockLibrary, index: int):
+        """Create a FeedStock backed by an existing library row"""
+        feed = cls.__new__(cls)
+        feed._library = library
+        feed._index = index
+        feed._detached = False
+        return feed
+
+    def as_dict(self):
+        return {name: self._library.get(name, self._index) for name in FeedStockLibrary.FIELDS}
+
+    def set_values(self, **values):
+        """Set several fields at once"""
+        self._library.set_row(self._index, **values)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={value!r}" for name, value in self.as_dict().items())
+        return f"FeedStock({fields})"
+
+    def __eq__(self, other):
+        if not isinstance(other, FeedStock):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+
+for _name in FeedStockLibrary.FIELDS:
+    setattr(FeedStock, _name, _field_property(_name))
+del _name
+
+
+class FeedStockViews(MutableMapping):
+    """Feedstock name -> FeedStock mapping over a library, creating each view on first access
+
+    Assigning a FeedStock writes its values into the library (over the
+    named row if there is one) and deleting a name removes its row, so the
+    mapping and the library never disagree.
+    """
+
+    def __init__(self, library: FeedStockLibrary, rows: dict = None):
+        self._library = library
+        self._rows = dict(rows or {})  # Name -> library row
+        self._views = {}
+
+    def __getitem__(self, name):
+        view = self._views.get(name)
+        if view is None:
+            view = self._views[name] = FeedStock.view(self._library, self._rows[name])
+        return view
+
+    def __setitem__(self, name, feed: FeedStock):
+        if feed._library is self._library and not feed._detached:
+            index = feed._index  # Already a row of this library
+        elif name in self._rows:
+            index = self._rows[name]
+            self._library.set_row(index, **feed.as_dict())
+        else:
+            index = self._library.append(**feed.as_dict())
+
+        if feed._detached:
+            # Rebind so later edits through the caller's object land in the store
+            feed._library, feed._index, feed._detached = self._library, index, False
+        elif feed._library is not self._library:
+            feed = FeedStock.view(self._library, index)
+        self._rows[name] = index
+        self._views[name] = feed
+
+    def __delitem__(self, name):
+        row = self._rows.pop(name)
+        self._views.pop(name, None)
+        self._library.remove(row)
+        # Rows after the removed one moved up, so the mapping and the views follow them
+        for other, index in self._rows.items():
+            if index > row:
+                self._rows[other] = index - 1
+        for view in self._views.values():
+            if view._index > row:
+                view._index -= 1
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, name):
+        return name in self._rows
+
+
+KWH_PER_M3_METHANE = 10  # Standard conversion for methane energy content
+HOURS_PER_YEAR = 365 * 24
+NON_FEEDSTOCK_NAMES = ('Water', 'Recirc')  # Excluded from the feedstock-only DM figures
+
+
+@dataclass
+class MassBalance:
+    """Per-feedstock arrays and plant totals from one DM -> VS -> biogas -> methane pass"""
+    names: np.ndarray
+    active: np.ndarray  # Feedstocks with a positive annual volume
+    crop: np.ndarray  # Active crop ('C') feedstocks
+    feedstock: np.ndarray  # Active feedstocks other than Water / Recirc
+    annual_volume: np.ndarray
+    dm_input: np.ndarray  # tonnes/year
+    vs_input: np.ndarray  # tonnes/year
+    biogas_volume: np.ndarray  # m3/year
+    methane_volume: np.ndarray  # m3/year
+    energy_mwh: np.ndarray  # MWh/year
+    biogas_per_hour: np.ndarray  # m3/hour
+    methane_per_hour: np.ndarray  # m3/hour
+    total_tpa: float
+    total_dm: float
+    total_vs: float
+    total_biogas: float
+    total_methane: float
+    crop_methane: float
+    residue_waste_methane: float
+    feedstock_tpa: float
+    feedstock_dm: float
+    bulk_dm_percentage: float
+    bulk_vs_percentage: float
+    feedstock_bulk_dm_percentage: float
+    mean_methane_percentage: float
+    power_output_mwh: float
+    total_biogas_per_hour: float
+    total_methane_per_hour: float
+    crop_methane_percentage: float
+    residue_waste_methane_percentage: float
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator * 100 if denominator > 0 else 0
+
+
+def _percentages(numerator, denominator):
+    out = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out * 100
+
+
+def mass_balance(library: FeedStockLibrary):
+    """Run the mass balance for every feedstock in the library in one vectorized pass"""
+    names = np.array(library.column('feedstock_name'), dtype=object)
+    volume = library.column('annual_volume')
+    active = volume > 0
+    crop = active & library.category_mask('crop_residue_waste_other', 'C')
+    feedstock = active & ~np.isin(names, NON_FEEDSTOCK_NAMES)
+
+    # Inactive rows are zeroed so blank lab values never leak into the totals
+    with np.errstate(invalid='ignore'):
+        volume = np.where(active, volume, 0.0)
+        dm_input = np.where(active, volume * library.column('dm'), 0.0)
+        vs_input = np.where(active, dm_input * library.column('vs_of_dm'), 0.0)
+        biogas_volume = np.where(active, vs_input * library.column('biogas_yield_vs'), 0.0)
+        methane_volume = np.where(active, biogas_volume * library.column('percent_ch4'), 0.0)
+
+    # All aggregates come from one reduction of the stacked per-feedstock rows
+    stacked = np.vstack([volume, dm_input, vs_input, biogas_volume, methane_volume])
+    total_tpa, total_dm, total_vs, total_biogas, total_methane = stacked.sum(axis=1)
+    crop_methane = methane_volume[crop].sum()
+    feedstock_tpa, feedstock_dm = stacked[:2, feedstock].sum(axis=1)
+
+    return MassBalance(
+        names=names,
+        active=active,
+        crop=crop,
+        feedstock=feedstock,
+        annual_volume=volume,
+        dm_input=dm_input,
+        vs_input=vs_input,
+        biogas_volume=biogas_volume,
+        methane_volume=methane_volume,
+        energy_mwh=methane_volume * KWH_PER_M3_METHANE / 1000,
+        biogas_per_hour=biogas_volume / HOURS_PER_YEAR,
+        methane_per_hour=methane_volume / HOURS_PER_YEAR,
+        total_tpa=total_tpa,
+        total_dm=total_dm,
+        total_vs=total_vs,
+        total_biogas=total_biogas,
+        total_methane=total_methane,
+        crop_methane=crop_methane,
+        residue_waste_methane=total_methane - crop_methane,
+        feedstock_tpa=feedstock_tpa,
+        feedstock_dm=feedstock_dm,
+        bulk_dm_percentage=_ratio(total_dm, total_tpa),
+        bulk_vs_percentage=_ratio(total_vs, total_dm),
+        feedstock_bulk_dm_percentage=_ratio(feedstock_dm, feedstock_tpa),
+        mean_methane_percentage=_ratio(total_methane, total_biogas),
+        power_output_mwh=total_methane * KWH_PER_M3_METHANE / 1000,
+        total_biogas_per_hour=total_biogas / HOURS_PER_YEAR,
+        total_methane_per_hour=total_methane / HOURS_PER_YEAR,
+        crop_methane_percentage=_ratio(crop_methane, total_methane),
+        residue_waste_methane_percentage=_ratio(total_methane - crop_methane, total_methane)
+    )
+
+
+# Plant totals kept by RunningTotals, in the order of the scenario property matrix
+TOTAL_FIELDS = (
+    'total_tpa', 'total_dm', 'total_vs', 'total_biogas', 'total_methane',
+    'crop_methane', 'feedstock_tpa', 'feedstock_dm'
+)
+
+
+@dataclass
+class PlantTotals:
+    """Plant-level figures of the mass balance, without the per-feedstock arrays"""
+    total_tpa: float
+    total_dm: float
+    total_vs: float
+    total_biogas: float
+    total_methane: float
+    crop_methane: float
+    residue_waste_methane: float
+    feedstock_tpa: float
+    feedstock_dm: float
+    bulk_dm_percentage: float
+    bulk_vs_percentage: float
+    feedstock_bulk_dm_percentage: float
+    mean_methane_percentage: float
+    power_output_mwh: float
+    total_biogas_per_hour: float
+    total_methane_per_hour: float
+    crop_methane_percentage: float
+    residue_waste_methane_percentage: float
+
+    @classmethod
+    def from_totals(cls, total_tpa, total_dm, total_vs, total_biogas, total_methane,
+                    crop_methane, feedstock_tpa, feedstock_dm):
+        return cls(
+            total_tpa=total_tpa,
+            total_dm=total_dm,
+            total_vs=total_vs,
+            total_biogas=total_biogas,
+            total_methane=total_methane,
+            crop_methane=crop_methane,
+            residue_waste_methane=total_methane - crop_methane,
+            feedstock_tpa=feedstock_tpa,
+            feedstock_dm=feedstock_dm,
+            bulk_dm_percentage=_ratio(total_dm, total_tpa),
+            bulk_vs_percentage=_ratio(total_vs, total_dm),
+            feedstock_bulk_dm_percentage=_ratio(feedstock_dm, feedstock_tpa),
+            mean_methane_percentage=_ratio(total_methane, total_biogas),
+            power_output_mwh=total_methane * KWH_PER_M3_METHANE / 1000,
+            total_biogas_per_hour=total_biogas / HOURS_PER_YEAR,
+            total_methane_per_hour=total_methane / HOURS_PER_YEAR,
+            crop_methane_percentage=_ratio(crop_methane, total_methane),
+            residue_waste_methane_percentage=_ratio(total_methane - crop_methane, total_methane)
+        )
+
+
+class RunningTotals:
+    """Plant totals updated by delta whenever one library value is set
+
+    The library calls row_changing / row_changed around every set(), so the
+    row's old contribution is subtracted and its new one added - O(1) per
+    edit whatever the library size. Bulk writes such as set_column move the
+    library version without a matching notification and fall back to one
+    full pass on the next read.
+    Blank lab values on an active row (NaN totals) and rounding drift after
+    more deltas than rows also trigger a full pass, so the amortised cost per
+    edit stays constant.
+    """
+
+    def __init__(self, library: FeedStockLibrary):
+        self.library = library
+        self._totals = [0.0] * len(TOTAL_FIELDS)
+        self._version = None  # Library version the totals are valid for, None when dirty
+        self._pending = None  # Row between row_changing and row_changed
+        self._deltas = 0
+        self._plant_totals = None
+        library.watch(self)
+
+    @property
+    def dirty(self):
+        return self._version != self.library.version
+
+    def _row(self, row):
+        """Contribution of one row to each of TOTAL_FIELDS, same rules as mass_balance"""
+        lib = self.library
+        volume = lib._numeric['annual_volume'][row]
+        if not volume > 0:
+            return None
+        dm_input = volume * lib._numeric['dm'][row]
+        vs_input = dm_input * lib._numeric['vs_of_dm'][row]
+        biogas = vs_input * lib._numeric['biogas_yield_vs'][row]
+        methane = biogas * lib._numeric['percent_ch4'][row]
+        crop_code = lib.category_code('crop_residue_waste_other', 'C')
+        crop = crop_code >= 0 and lib._codes['crop_residue_waste_other'][row] == crop_code
+        feedstock = lib._text['feedstock_name'][row] not in NON_FEEDSTOCK_NAMES
+        return (
+            float(volume), float(dm_input), float(vs_input), float(biogas), float(methane),
+            float(methane) if crop else 0.0,
+            float(volume) if feedstock else 0.0,
+            float(dm_input) if feedstock else 0.0
+        )
+
+    def _apply(self, contribution, sign):
+        if contribution is None:
+            return True
+        if not all(np.isfinite(contribution)):
+            return False
+        self._totals = [total + sign * value for total, value in zip(self._totals, contribution)]
+        return True
+
+    def row_changing(self, row):
+        self._pending = None
+        if self.dirty:
+            return
+        self._version = None
+        if self._apply(self._row(row), -1):
+            self._pending = row
+
+    def row_changed(self, row):
+        if self._pending != row:
+            return
+        self._pending = None
+        self._deltas += 1
+        if self._deltas <= max(len(self.library), 1) and self._apply(self._row(row), 1):
+            self._version = self.library.version
+            self._plant_totals = None
+
+    def rebuild(self, mb: MassBalance = None):
+        """Full pass over the library, or adopt a mass balance already computed for it"""
+        if mb is None:
+            mb = mass_balance(self.library)
+        self._totals = [float(getattr(mb, name)) for name in TOTAL_FIELDS]
+        self._version = self.library.version
+        self._deltas = 0
+        self._plant_totals = None
+
+    def current(self):
+        """PlantTotals for the library as it stands"""
+        if self.dirty:
+            self.rebuild()
+        if self._plant_totals is None:
+            self._plant_totals = PlantTotals.from_totals(*self._totals)
+        return self._plant_totals
+
+
+class ResultTable:
+    """Named result columns; the DataFrame and text rendering are only built on request"""
+    __slots__ = ('title', 'columns', 'float_format', '_dataframe')
+
+    def __init__(self, title: str, columns: dict, float_format: str = None):
+        self.title = title
+        self.columns = columns
+        self.float_format = float_format
+        self._dataframe = None
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def to_dataframe(self):
+        if self._dataframe is None:
+            self._dataframe = pandas.DataFrame(self.columns)
+        return self._dataframe
+
+    def render(self):
+        """Text rendering in the same layout the reporting methods print"""
+        table = self.to_dataframe().to_string(index=False, float_format=self.float_format)
+        return f"{self.title}:\n{table}\n"
+
+    def show(self):
+        print(self.render())
+
+
+def property_table(title: str, rows):
+    """ResultTable with Property / Value / Units columns from (property, value, units) rows"""
+    properties, values, units = zip(*rows)
+    return ResultTable(title, {
+        'Property': list(properties),
+        'Value': np.array(values, dtype=np.float64),
+        'Units': list(units)
+    }, float_format='%.2f')
+
 
 class Shit:
     def __init__(self):
-        self.content = {}
+        self.library = FeedStockLibrary()
+        self.content = FeedStockViews(self.library)
+        self._mass_balance = None
+        self._mass_balance_version = -1
+        self.running_totals = RunningTotals(self.library)
+        self.result_cache = None  # Optional ResultCache shared by Shits evaluating the same mixes
+        self.pasteurisation = None  # Set by the pasturise stage
+
+    @classmethod
+    def from_library(cls, library: FeedStockLibrary):
+        """Wrap an already populated library; FeedStock views are created on demand"""
+        shit = cls()
+        shit.library = library
+        shit.running_totals = RunningTotals(library)
+        names = library.column('feedstock_name')
+        shit.content = FeedStockViews(library, dict(zip(names, range(len(names)))))
+        return shit
+
+    def copy(self):
+        """Independent Shit with a copy of the library, sharing the result cache"""
+        shit = Shit.from_library(self.library.copy())
+        shit.result_cache = self.result_cache
+        return shit
 
     def add_feedstock(self, feed: FeedStock):
         self.content[feed.feedstock_name] = feed
 
-    def stats(self):
+    def feedstock_tables(self):
+        """Feedstock properties and nutrient composition as two ResultTables"""
+        lib = self.library
+        source = lib.column('source')
+        names = lib.column('feedstock_name')
+
         # Table 1: Basic feedstock properties
-        table1_data = []
-        for feed in self.content.values():
-            table1_data.append([
-                feed.source,
-                feed.feedstock_name, 
-                feed.dm,
-                feed.vs_of_dm,
-                feed.biogas_yield_vs,
-                feed.percent_ch4,
-                feed.crop_residue_waste_other,
-                feed.density,
-                feed.l_s,
-                feed.digestion_reduction_factor
-            ])
-        
-        table1_df = pandas.DataFrame(table1_data, columns=[
-            'Source', 'Feedstock Name', 'DM', 'VS of DM', 'Biogas Yield VS', 
-            '% CH4', 'Crop/Residue/Waste/Other', 'Density', 'L/S', 'Digestion Reduction Factor'
-        ])
-        
+        table1 = ResultTable('Table 1', {
+            'Source': source,
+            'Feedstock Name': names,
+            'DM': lib.column('dm'),
+            'VS of DM': lib.column('vs_of_dm'),
+            'Biogas Yield VS': lib.column('biogas_yield_vs'),
+            '% CH4': lib.column('percent_ch4'),
+            'Crop/Residue/Waste/Other': lib.column('crop_residue_waste_other'),
+            'Density': lib.column('density'),
+            'L/S': lib.column('l_s'),
+            'Digestion Reduction Factor': lib.column('digestion_reduction_factor')
+        })
+
         # Table 2: Nutrient composition
-        table2_data = []
-        for feed in self.content.values():
-            table2_data.append([
-                feed.source,
-                feed.feedstock_name,
-                feed.cod,
-                feed.bod,
-                feed.total_n,
-                feed.am_n,
-                feed.total_p,
-                feed.sol_p,
-                feed.solid_p,
-                feed.total_k
-            ])
-        
-        table2_df = pandas.DataFrame(table2_data, columns=[
-            'Source', 'Feedstock Name', 'COD', 'BOD', 'Total N', 'Am N', 'Total P', 'Sol P', 'Solid P', 'Total K'
-        ])
+        table2 = ResultTable('Table 2', {
+            'Source': source,
+            'Feedstock Name': names,
+            'COD': lib.column('cod'),
+            'BOD': lib.column('bod'),
+            'Total N': lib.column('total_n'),
+            'Am N': lib.column('am_n'),
+            'Total P': lib.column('total_p'),
+            'Sol P': lib.column('sol_p'),
+            'Solid P': lib.column('solid_p'),
+            'Total K': lib.column('total_k')
+        })
+
+        return table1, table2
+
+    def stats(self):
+        table1, table2 = self.feedstock_tables()
         
         # Display only the two tables as shown in green circles
-        print("Table 1:")
-        print(table1_df.to_string(index=False))
-        print()
-        
-        print("Table 2:")
-        print(table2_df.to_string(index=False))
-        print()
+        table1.show()
+        table2.show()
         
-        return table1_df, table2_df
+        return table1.to_dataframe(), table2.to_dataframe()
     
+    def volume_table(self):
+        """Feedstock volumes as a ResultTable"""
+        return ResultTable('Feedstock Annual Volumes', {
+            'Feedstock Name': self.library.column('feedstock_name'),
+            'Annual Volume (TPA)': self.library.column('annual_volume')
+        }, float_format='%.2f')
+
     def volume_stats(self):
         """Display feedstock volumes"""
-        volume_data = []
-        for feed in self.content.values():
-            volume_data.append([
-                feed.feedstock_name,
-                feed.annual_volume
-            ])
-        
-        volume_df = pandas.DataFrame(volume_data, columns=[
-            'Feedstock Name', 'Annual Volume (TPA)'
-        ])
-        
-        print("Feedstock Annual Volumes:")
-        print(volume_df.to_string(index=False, float_format='%.2f'))
-        print()
-        
-        return volume_df
+        table = self.volume_table()
+        table.show()
+        return table.to_dataframe()
     
+    def mass_balance(self):
+        """Mass balance for the current library, recomputed only after an edit"""
+        if self._mass_balance is None or self._mass_balance_version != self.library.version:
+            if self.result_cache is not None:
+                self._mass_balance = self.result_cache.mass_balance(self.library)
+            else:
+                self._mass_balance = mass_balance(self.library)
+            self._mass_balance_version = self.library.version
+        return self._mass_balance
+
+    def totals(self):
+        """Plant totals, kept current by delta as feedstock values are edited"""
+        if self.running_totals.dirty:
+            # Share the per-version mass balance, so one run does one full pass
+            self.running_totals.rebuild(self.mass_balance())
+        return self.running_totals.current()
+
+    def production_table(self):
+        """Biogas, methane volumes and kWt for each feedstock with a volume, without printing"""
+        mb = self.mass_balance()
+        active = mb.active
+
+        return ResultTable('Biogas Production Statistics', {
+            'Feedstock Name': mb.names[active],
+            'Annual Volume (TPA)': mb.annual_volume[active],
+            'Biogas Volume (m3/yr)': mb.biogas_volume[active],
+            'Biogas Output (m3/hr)': mb.biogas_per_hour[active],
+            'Methane Volume (m3/yr)': mb.methane_volume[active],
+            'Methane Output (m3/hr)': mb.methane_per_hour[active],
+            'Energy Output (MWh/yr)': mb.energy_mwh[active]
+        }, float_format='%.2f')
+
     def biogas_production_stats(self):
         """Calculate biogas, methane volumes and kWt for each feedstock"""
-        production_data = []
-        
-        for feed in self.content.values():
-            if feed.annual_volume > 0:
-                # Calculate dry matter input (tonnes/year)
-                dm_input = feed.annual_volume * feed.dm
-                
-                # Calculate volatile solids input (tonnes/year)
-                vs_input = dm_input * feed.vs_of_dm
-                
-                # Calculate biogas volume (m3/year) - biogas_yield_vs is m3 per tonne VS
-                biogas_volume = vs_input * feed.biogas_yield_vs
-                
-                # Calculate methane volume (m3/year)
-                methane_volume = biogas_volume * feed.percent_ch4
-                
-                # Calculate kWt (assuming 10 kWh per m3 of methane - standard conversion)
-                kwh_per_m3_methane = 10
-                kwt = methane_volume * kwh_per_m3_methane / 1000  # Convert to MWh
-                
-                # Calculate hourly outputs
-                biogas_per_hour = biogas_volume / (365 * 24)  # m3/hour
-                methane_per_hour = methane_volume / (365 * 24)  # m3/hour
-                
-                production_data.append([
-                    feed.feedstock_name,
-                    feed.annual_volume,
-                    biogas_volume,
-                    biogas_per_hour,
-                    methane_volume,
-                    methane_per_hour,
-                    kwt
-                ])
-        
-        production_df = pandas.DataFrame(production_data, columns=[
-            'Feedstock Name', 'Annual Volume (TPA)', 'Biogas Volume (m3/yr)', 
-            'Biogas Output (m3/hr)', 'Methane Volume (m3/yr)', 'Methane Output (m3/hr)', 'Energy Output (MWh/yr)'
-        ])
-        
-        print("Biogas Production Statistics:")
-        print(production_df.to_string(index=False, float_format='%.2f'))
-        print()
-        
-        return production_df
+        table = self.production_table()
+        table.show()
+        return table.to_dataframe()
     
-    def bulk_properties(self):
-        """Calculate bulk properties of the fluid mixture"""
-        total_tpa = 0.0
-        total_dm = 0.0
-        total_vs = 0.0
-        total_biogas = 0.0
-        total_methane = 0.0
-        total_biogas_weighted_methane = 0.0
-        crop_methane = 0.0
-        residue_waste_methane = 0.0
-        feedstock_tpa = 0.0  # TPA excluding water and recirc
-        feedstock_dm = 0.0   # DM from feedstocks only
-        
-        # Calculate totals
-        for feed in self.content.values():
-            if feed.annual_volume > 0:
-                total_tpa += feed.annual_volume
-                dm_input = feed.annual_volume * feed.dm
-                total_dm += dm_input
-                vs_input = dm_input * feed.vs_of_dm
-                total_vs += vs_input
-                
-                # Calculate biogas and methane for this feedstock
-                biogas_volume = vs_input * feed.biogas_yield_vs
-                methane_volume = biogas_volume * feed.percent_ch4
-                
-                total_biogas += biogas_volume
-                total_methane += methane_volume
-                total_biogas_weighted_methane += biogas_volume * feed.percent_ch4
-                
-                # Categorize methane by crop vs residue/waste
-                if feed.crop_residue_waste_other == 'C':
-                    crop_methane += methane_volume
-                else:  # R, W, or Other
-                    residue_waste_methane += methane_volume
-                
-                # Track feedstock DM (excluding Water and Recirc)
-                if feed.feedstock_name not in ['Water', 'Recirc']:
-                    feedstock_tpa += feed.annual_volume
-                    feedstock_dm += dm_input
-        
-        # Calculate bulk percentages and properties
-        bulk_dm_percentage = (total_dm / total_tpa * 100) if total_tpa > 0 else 0
-        bulk_vs_percentage = (total_vs / total_dm * 100) if total_dm > 0 else 0
-        mean_methane_percentage = (total_methane / total_biogas * 100) if total_biogas > 0 else 0
-        
-        # Calculate power output (10 kWh per m3 of methane)
-        power_output_mwh = total_methane * 10 / 1000  # Convert to MWh
-        
-        # Calculate crop vs residue/waste percentages
-        crop_methane_percentage = (crop_methane / total_methane * 100) if total_methane > 0 else 0
-        residue_waste_methane_percentage = (residue_waste_methane / total_methane * 100) if total_methane > 0 else 0
-        
-        # Calculate feedstock bulk DM% (excluding water and recirc)
-        feedstock_bulk_dm_percentage = (feedstock_dm / feedstock_tpa * 100) if feedstock_tpa > 0 else 0
+    def bulk_tables(self):
+        """Bulk fluid properties and maximum yields as two ResultTables, without printing"""
+        mb = self.totals()
         
         # First table: Bulk Properties
-        bulk_properties_data = [
-            ['Total TPA', total_tpa, 'tonnes/year'],
-            ['Total DM Input', total_dm, 'tonnes/year'],
-            ['Total VS Input', total_vs, 'tonnes/year'],
-            ['Bulk DM %', bulk_dm_percentage, '%'],
-            ['Feedstock Bulk DM %', feedstock_bulk_dm_percentage, '%'],
-            ['Bulk VS of DM %', bulk_vs_percentage, '%']
-        ]
-        
-        bulk_properties_df = pandas.DataFrame(bulk_properties_data, columns=[
-            'Property', 'Value', 'Units'
+        bulk_properties = property_table('Bulk Fluid Properties', [
+            ('Total TPA', mb.total_tpa, 'tonnes/year'),
+            ('Total DM Input', mb.total_dm, 'tonnes/year'),
+            ('Total VS Input', mb.total_vs, 'tonnes/year'),
+            ('Bulk DM %', mb.bulk_dm_percentage, '%'),
+            ('Feedstock Bulk DM %', mb.feedstock_bulk_dm_percentage, '%'),
+            ('Bulk VS of DM %', mb.bulk_vs_percentage, '%')
         ])
         
-        # Calculate hourly outputs for totals
-        total_biogas_per_hour = total_biogas / (365 * 24)  # m3/hour
-        total_methane_per_hour = total_methane / (365 * 24)  # m3/hour
-        
         # Second table: Maximum Yields
-        maximum_yields_data = [
-            ['Total Biogas', total_biogas, 'm3/year'],
-            ['Total Biogas per Hour', total_biogas_per_hour, 'm3/hour'],
-            ['Total Methane', total_methane, 'm3/year'],
-            ['Total Methane per Hour', total_methane_per_hour, 'm3/hour'],
-            ['Mean Methane %', mean_methane_percentage, '%'],
-            ['Power Output', power_output_mwh, 'MWh/year'],
-            ['Methane from Crops %', crop_methane_percentage, '%'],
-            ['Methane from Residue/Waste %', residue_waste_methane_percentage, '%']
-        ]
-        
-        maximum_yields_df = pandas.DataFrame(maximum_yields_data, columns=[
-            'Property', 'Value', 'Units'
+        maximum_yields = property_table('Maximum Yields', [
+            ('Total Biogas', mb.total_biogas, 'm3/year'),
+            ('Total Biogas per Hour', mb.total_biogas_per_hour, 'm3/hour'),
+            ('Total Methane', mb.total_methane, 'm3/year'),
+            ('Total Methane per Hour', mb.total_methane_per_hour, 'm3/hour'),
+            ('Mean Methane %', mb.mean_methane_percentage, '%'),
+            ('Power Output', mb.power_output_mwh, 'MWh/year'),
+            ('Methane from Crops %', mb.crop_methane_percentage, '%'),
+            ('Methane from Residue/Waste %', mb.residue_waste_methane_percentage, '%')
         ])
         
-        print("Bulk Fluid Properties:")
-        print(bulk_properties_df.to_string(index=False, float_format='%.2f'))
-        print()
-        
-        print("Maximum Yields:")
-        print(maximum_yields_df.to_string(index=False, float_format='%.2f'))
-        print()
-        
-        return bulk_properties_df, maximum_yields_df
+        return bulk_properties, maximum_yields
+
+    def bulk_properties(self):
+        """Calculate bulk properties of the fluid mixture"""
+        bulk_properties, maximum_yields = self.bulk_tables()
+        bulk_properties.show()
+        maximum_yields.show()
+        return bulk_properties.to_dataframe(), maximum_yields.to_dataframe()
     
     def plot_feedstock_chart(self):
         """Plot bar chart showing feedstock volumes, biogas and methane volumes produced"""
@@ -337,68 +878,281 @@ class Shit:
         return fig
 
 
-def assign_feedstock_volumes(shit: Shit, volumes_path: str):
+@dataclass
+class VolumeMatchReport:
+    """How the rows of a volumes file were matched to library feedstocks"""
+    matched: dict  # Library feedstock name -> annual volume assigned
+    unmatched: list  # Volume file names with no library feedstock
+    missing: list  # Library feedstocks with no volume row, set to 0.0
+    ambiguous: list  # (normalised name, names) where several rows or feedstocks collide
+    invalid: list  # (volume file name, TPA text) that could not be parsed, set to 0.0
+
+    @property
+    def ok(self):
+        return not (self.unmatched or self.ambiguous or self.invalid)
+
+
+def normalise_name(name, aliases=None):
+    """Matching key for a feedstock name - unicode form, whitespace and case folded
+
+    `aliases` maps normalised alternative names to normalised library names.
+    """
+    key = ' '.join(unicodedata.normalize('NFKC', str(name)).split()).casefold()
+    if aliases:
+        key = aliases.get(key, key)
+    return key
+
+
+def parse_tonnages(values):
+    """Parse TPA text such as '18,500', ' -   ' or blank; returns (tonnes, invalid mask)"""
+    text = pandas.Series(values, dtype=object).fillna('').astype(str)
+    text = text.str.replace(',', '', regex=False).str.replace(' ', '', regex=False).str.strip()
+    blank = text.isin(['', '-', 'nan']).to_numpy()
+    tonnes = pandas.to_numeric(text.where(~blank, '0'), errors='coerce').to_numpy(dtype=np.float64, copy=True)
+    invalid = np.isnan(tonnes)
+    tonnes[invalid] = 0.0
+    return tonnes, invalid
+
+
+def feedstock_index(library: FeedStockLibrary):
+    """Normalised feedstock name -> library row indices"""
+    index = {}
+    for row, name in enumerate(library.column('feedstock_name')):
+        index.setdefault(normalise_name(name), []).append(row)
+    return index
+
+
+def match_feedstock_volumes(shit: Shit, volumes_path: str, aliases: dict = None, index: dict = None):
+    """Assign annual volumes from a CSV using a normalised-name index and report the matching
+
+    Names are compared after unicode normalisation, whitespace collapsing and
+    case folding, with optional `aliases` mapping volume file names to library
+    names. When a name appears on several volume rows the last row wins.
+    Callers matching many files against one library can pass its
+    feedstock_index to skip rebuilding it.
+    """
+    df_volumes = pandas.read_csv(volumes_path, dtype=object, keep_default_na=False, encoding='utf-8-sig')
+    headers = {normalise_header(header): header for header in df_volumes.columns}
+    volume_names = df_volumes[headers['feedstock name']].to_numpy(dtype=object)
+    tonnes, invalid = parse_tonnages(df_volumes[headers['tpa']].to_numpy(dtype=object))
+    aliases = {normalise_name(alias): normalise_name(name) for alias, name in (aliases or {}).items()}
+
+    library_names = shit.library.column('feedstock_name')
+    if index is None:
+        index = feedstock_index(shit.library)
+
+    volume_rows = {}
+    for row, name in enumerate(volume_names):
+        volume_rows.setdefault(normalise_name(name, aliases), []).append(row)
+
+    volumes = np.zeros(len(library_names))
+    assigned = np.zeros(len(library_names), dtype=bool)
+    unmatched, ambiguous = [], []
+    for key, rows in volume_rows.items():
+        targets = index.get(key)
+        if targets is None:
+            unmatched.extend(volume_names[row] for row in rows)
+            continue
+        if len(rows) > 1 or len(targets) > 1:
+            names = [volume_names[row] for row in rows] + [library_names[target] for target in targets]
+            ambiguous.append((key, names))
+        volumes[targets] = tonnes[rows[-1]]
+        assigned[targets] = True
+
+    shit.library.set_column('annual_volume', volumes)
+    return VolumeMatchReport(
+        matched={library_names[row]: float(volumes[row]) for row in np.flatnonzero(assigned)},
+        unmatched=unmatched,
+        missing=[library_names[row] for row in np.flatnonzero(~assigned)],
+        ambiguous=ambiguous,
+        invalid=[(volume_names[row], df_volumes[headers['tpa']].iat[row]) for row in np.flatnonzero(invalid)]
+    )
+
+
+def assign_feedstock_volumes(shit: Shit, volumes_path: str, aliases: dict = None):
     """Assign annual volumes to feedstocks from CSV file"""
-    df_volumes = pandas.read_csv(volumes_path)
-    
-    # Clean up the TPA column - remove spaces and commas, handle dashes
-    volume_dict = {}
-    for _, row in df_volumes.iterrows():
-        feedstock_name = row['Feedstock Name'].strip()
-        tpa_value = str(row['TPA']).strip()
-        
-        if tpa_value == '-' or tpa_value == 'nan':
-            volume_dict[feedstock_name] = 0.0
+    match_feedstock_volumes(shit, volumes_path, aliases)
+    return shit
+
+
+class FeedstockDataError(ValueError):
+    """Raised with every invalid cell found while loading a feedstock library"""
+
+    def __init__(self, path, errors):
+        self.path = path
+        self.errors = errors  # (csv line, column, value, problem) tuples
+        lines = [f"{path}: {len(errors)} invalid cell(s)"]
+        lines += [f"  line {line}, {column!r}: {value!r} {problem}" for line, column, value, problem in errors]
+        super().__init__('\n'.join(lines))
+
+
+# Normalised CSV header -> FeedStockLibrary field
+FEEDSTOCK_HEADERS = {
+    'source': 'source',
+    'feedstock name': 'feedstock_name',
+    'dm': 'dm',
+    'vs of dm': 'vs_of_dm',
+    'biogas yield vs': 'biogas_yield_vs',
+    '% ch4': 'percent_ch4',
+    'crop/residue/waste/other': 'crop_residue_waste_other',
+    'density': 'density',
+    'l/s': 'l_s',
+    'digestion reduction factor': 'digestion_reduction_factor',
+    'cod': 'cod',
+    'bod': 'bod',
+    'total n': 'total_n',
+    'am n': 'am_n',
+    'total p': 'total_p',
+    'sol p': 'sol_p',
+    'solid p': 'solid_p',
+    'total k': 'total_k'
+}
+REQUIRED_FIELDS = ('feedstock_name', 'dm', 'vs_of_dm', 'biogas_yield_vs', 'percent_ch4')  # Columns that must exist
+
+# Valid (minimum, maximum) for numeric fields, None for open-ended
+FIELD_RANGES = {
+    'dm': (0, 1),
+    'vs_of_dm': (0, 1),
+    'biogas_yield_vs': (0, None),
+    'percent_ch4': (0, 1),
+    'density': (0, None),
+    'digestion_reduction_factor': (0, 1),
+    'cod': (0, None),
+    'bod': (0, None),
+    'total_n': (0, None),
+    'am_n': (0, None),
+    'total_p': (0, None),
+    'sol_p': (0, None),
+    'solid_p': (0, None),
+    'total_k': (0, None)
+}
+
+
+def normalise_header(header: str):
+    return ' '.join(str(header).split()).lower()
+
+
+def _parse_numbers(text):
+    """Parse a column of CSV strings, returning the values and a mask of blank cells"""
+    blank = text == ''
+    try:
+        return np.where(blank, 'nan', text).astype(np.float64), blank
+    except ValueError:
+        # Slow path only when the column has padded blanks or a bad cell
+        blank = np.array([value.strip() == '' for value in text], dtype=bool)
+        values = pandas.to_numeric(pandas.Series(text, dtype=object).str.strip(), errors='coerce')
+        return values.to_numpy(dtype=np.float64), blank
+
+
+def load_feedstock_library(input_path: str):
+    """Read and validate a feedstock CSV straight into a FeedStockLibrary
+
+    Headers are matched after normalising case and whitespace. A units row
+    (first cell 'Unit') is kept as library.units. Blank numeric cells load
+    as NaN; every unparseable or out-of-range value and every blank name is
+    collected and raised together as a FeedstockDataError.
+    """
+    # Blank lines are kept so error line numbers match the file
+    raw = pandas.read_csv(input_path, dtype=object, keep_default_na=False, skip_blank_lines=False,
+                          encoding='utf-8-sig')
+    fields = {}
+    for header in raw.columns:
+        field = FEEDSTOCK_HEADERS.get(normalise_header(header))
+        if field is not None and field not in fields:
+            fields[field] = header
+
+    headers = {field: header for header, field in FEEDSTOCK_HEADERS.items()}
+    errors = [(1, headers[name], None, 'column is missing') for name in REQUIRED_FIELDS if name not in fields]
+    if errors:
+        raise FeedstockDataError(input_path, errors)
+
+    has_units = len(raw) > 0 and raw.iloc[0, 0].strip().lower() in ('unit', 'units')
+    raw = {field: raw[header].to_numpy(dtype=object) for field, header in fields.items()}
+    units = {}
+    first_line = 2  # CSV line of the first data row, header is line 1
+    if has_units:
+        units = {field: text[0].strip() for field, text in raw.items() if field in FIELD_RANGES and text[0].strip()}
+        raw = {field: text[1:] for field, text in raw.items()}
+        first_line = 3
+
+    columns = {}
+    blanks = {}
+    for field, text in raw.items():
+        if field in FIELD_RANGES:
+            columns[field], blanks[field] = _parse_numbers(text)
         else:
-            # Remove spaces and commas, convert to float
-            clean_volume = tpa_value.replace(',', '').replace(' ', '')
-            try:
-                volume_dict[feedstock_name] = float(clean_volume)
-            except ValueError:
-                volume_dict[feedstock_name] = 0.0
-    
-    # Assign volumes to feedstocks in the Shit object
-    for feed_name, feed in shit.content.items():
-        # Try exact match first
-        if feed_name in volume_dict:
-            feed.annual_volume = volume_dict[feed_name]
+            # Text cells keep their original spacing
+            blanks[field] = np.array([value.strip() == '' for value in text], dtype=bool)
+            columns[field] = np.where(blanks[field], None, text)
+
+    # Skip fully blank lines
+    filled = ~np.all(list(blanks.values()), axis=0)
+    columns = {field: values[filled] for field, values in columns.items()}
+    blanks = {field: blank[filled] for field, blank in blanks.items()}
+    raw = {field: text[filled] for field, text in raw.items()}
+    lines = np.flatnonzero(filled) + first_line
+
+    def report(mask, field, problem):
+        for i in np.flatnonzero(mask):
+            errors.append((int(lines[i]), fields[field], raw[field][i], problem))
+
+    for field, (low, high) in FIELD_RANGES.items():
+        if field not in columns:
+            continue
+        values = columns[field]
+        report(np.isnan(values) & ~blanks[field], field, 'is not a number')
+        if low is not None:
+            report(values < low, field, f'is below {low}')
+        if high is not None:
+            report(values > high, field, f'is above {high}')
+    report(blanks['feedstock_name'], 'feedstock_name', 'is required')
+
+    if errors:
+        errors.sort(key=lambda error: error[0])
+        raise FeedstockDataError(input_path, errors)
+
+    # A repeated name replaces the earlier row, as adding it to a Shit would
+    keep = ~pandas.Series(columns['feedstock_name']).duplicated(keep='last').to_numpy()
+    if not keep.all():
+        columns = {field: values[keep] for field, values in columns.items()}
+    return FeedStockLibrary.from_columns(columns, units)
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', **kwargs):
+    """Open a temporary file beside `path` and move it into place once written
+
+    Readers see the old file or the whole new one, never a partial write.
+    The temporary file is removed if writing fails.
+    """
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_table(df: pandas.DataFrame, path: str):
+    """Write a table to CSV, or JSON records when `path` ends in .json"""
+    with atomic_write(path, encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.json'):
+            df.to_json(f, orient='records', indent=1)
         else:
-            # Try matching by trimming spaces from volume dict keys
-            matched = False
-            for vol_name, vol_value in volume_dict.items():
-                if feed_name.strip() == vol_name.strip():
-                    feed.annual_volume = vol_value
-                    matched = True
-                    break
-            if not matched:
-                feed.annual_volume = 0.0
-    
-    return shit
+            df.to_csv(f, index=False)
 
-def feed(input_path: str):
-    shit = Shit()
-    df_feed = pandas.read_csv(input_path, skiprows=[1])  # Skip units row
-    df_feed.apply(lambda row: shit.add_feedstock(FeedStock(
-        source=row['Source'],
-        feedstock_name=row['Feedstock Name'],
-        dm=row['DM'],
-        vs_of_dm=row['VS of DM'],
-        biogas_yield_vs=row['Biogas Yield VS'],
-        percent_ch4=row['% CH4'],
-        crop_residue_waste_other=row['Crop/Residue/Waste/Other'],
-        density=row['Density '],
-        l_s=row['L/S'],
-        digestion_reduction_factor=row['Digestion Reduction Factor'],
-        cod=row['COD '],
-        bod=row['BOD'],
-        total_n=row['Total N'],
-        am_n=row['Am N '],
-        total_p=row['Total P'],
-        sol_p=row['Sol P '],
-        solid_p=row['Solid P'],
-        total_k=row['Total K ']
-    )), axis=1)
-    return shit
+
+def feed(input_path: str, cache: bool = False, cache_dir: str = None):
+    if cache:
+        # Repeat loads come from the binary cache, by default in the user's cache directory
+        from library_cache import load_library
+        return Shit.from_library(load_library(input_path, cache_dir))
+    return Shit.from_library(load_feedstock_library(input_path))
 
 
 def mix(shit: Shit, clean_water: FeedStock, recirc_fluid: FeedStock):
@@ -407,49 +1161,443 @@ def mix(shit: Shit, clean_water: FeedStock, recirc_fluid: FeedStock):
     return shit
 
 
-def digestion(feed_input: dict):
-    pass
-    # INPUTS:
-    # feed - which has clean water and recirc fluid added
+DEFAULT_RATE_CONSTANT = 0.1  # First-order degradation constant, 1/day
+MAX_BLOCK_DECAY = 200.0  # Largest log-decay spanned by one vectorized block
+MAX_BLOCK_STEPS = 1024
 
-    # PERFORMS
-    # does reduction in VS for each feedstock
-    # calculates the yeild - applies the proportions (meth_perc & gas yeild) to vs
 
-    # LOGS
-    # yeild
-    # same params as input_feed_stats
-    # retention time (tank volume / input rate)
+@dataclass
+class DigestionResults:
+    """Time series from a digester run, one row per time step"""
+    time_days: np.ndarray  # End of each step
+    tank_volumes: np.ndarray  # m3, tanks in series
+    tank_biogas: np.ndarray  # m3 per step from each tank, (steps, tanks)
+    biogas: np.ndarray  # m3 per step, all tanks
+    methane: np.ndarray  # m3 per step
+    energy_mwh: np.ndarray  # MWh per step
+    vs_inventory: np.ndarray  # Tonnes VS held in each tank at the end of the step, (steps, tanks)
+    retention_time: np.ndarray  # Hydraulic retention time in days, (steps, tanks)
+    digestate_dm_percentage: np.ndarray  # DM % leaving the last tank
+    feedstock_biogas: np.ndarray  # m3 per feedstock over the whole run
+    vs_fed: float  # Tonnes VS fed over the run
+    vs_destroyed: float  # Tonnes VS converted to gas over the run
+    digestate_mass: float  # Tonnes leaving the last tank over the run
+    digestate_dm: float
+    digestate_vs: float
 
-    # OUTPUTS
-    # overall rate 
-    # percentage DM
-    # tbh this is probably going to be the feedstock dict again
+    @property
+    def vs_destruction_percentage(self):
+        return _ratio(self.vs_destroyed, self.vs_fed)
 
+    def digestate(self, name: str = 'Digestate'):
+        """Digestate leaving the last tank as a FeedStock, annualised over the run"""
+        days = self.time_days[-1] if len(self.time_days) else 0
+        per_year = 365 / days if days else 0
+        dm = self.digestate_dm / self.digestate_mass if self.digestate_mass > 0 else 0.0
+        vs_of_dm = self.digestate_vs / self.digestate_dm if self.digestate_dm > 0 else 0.0
+        return stream(name, self.digestate_mass * per_year, dm, vs_of_dm, source='Digestion')
 
-def pasturise(feed_input: dict):
-    pass
-    # TODO:
-    # INPUT:
-    # feedstock
+    def summary_table(self):
+        """Run totals as a ResultTable"""
+        days = self.time_days[-1] if len(self.time_days) else 0
+        per_year = 365 / days if days else 0
+        return property_table('Digestion', [
+            ('Run Length', days, 'days'),
+            ('Total Biogas', self.biogas.sum() * per_year, 'm3/year'),
+            ('Total Methane', self.methane.sum() * per_year, 'm3/year'),
+            ('Power Output', self.energy_mwh.sum() * per_year, 'MWh/year'),
+            ('VS Destruction', self.vs_destruction_percentage, '%'),
+            ('Digestate DM %', _ratio(self.digestate_dm, self.digestate_mass), '%'),
+            ('Mean Retention Time', self.retention_time.sum(axis=1).mean() if days else 0, 'days')
+        ])
 
-    # OUTPUT:
-    # feedstock
 
-def seperate(feed_input: dict):
-    pass
-    # INPUT:
-    # feedstock
+def _densities(library: FeedStockLibrary):
+    """Density of every row in tonnes/m3; Water rows carry no density and count as 1"""
+    density = library.column('density')
+    return np.where(density > 0, density, 1.0)
 
-    # PERFORMS:
-    # seperates solids from liquid
-    # takes x percent DM from the input to create y percent DM in sludge / solid
-    # the rest is te liquid / recirc
 
-    # LOGS
-    # same stuff
-    # proportions liquid / sludge
-    
+def _tank_block(carry, inflow, decay, washout):
+    """Vectorized first-order CSTR over one block of steps
+
+    Each step adds `inflow`, degrades a fraction 1 - exp(-decay) of every
+    pool, then washes out a fraction 1 - exp(-washout) of the tank. The
+    linear recurrence is solved for all steps at once in the log domain.
+    Returns the pre-reaction contents z, and the end-of-block state.
+    """
+    log_a = -(decay[None, :] + washout[:, None])  # (steps, pools)
+    log_g = np.zeros_like(log_a)
+    np.cumsum(log_a[:-1], axis=0, out=log_g[1:])
+    z = np.exp(log_g) * (carry + np.cumsum(inflow * np.exp(-log_g), axis=0))
+    return z, z[-1] * np.exp(log_a[-1])
+
+
+def digestion(shit: Shit, tank_volumes, days=365, steps_per_day=1, schedule=None,
+              rate_constant=DEFAULT_RATE_CONSTANT, warm_start=True):
+    """Time-stepped simulation of continuously stirred digester tanks in series
+
+    Each feedstock is split into degradable VS (digestion_reduction_factor of
+    its VS), inert VS, fixed solids and water. Degradable VS breaks down with
+    first-order kinetics at `rate_constant` (1/day, scalar or per feedstock)
+    and yields biogas so that full degradation gives the lab Biogas Yield VS.
+    Every pool washes out of each tank at the hydraulic rate Q / V.
+
+    `schedule` is a (steps x feedstocks) array of tonnes fed per step in
+    library row order; by default each feedstock's annual volume is fed
+    evenly. With `warm_start` the tanks start at the steady state of the first
+    step's feed instead of empty.
+    """
+    lib = shit.library
+    dt = 1.0 / steps_per_day
+    tank_volumes = np.atleast_1d(np.asarray(tank_volumes, dtype=np.float64))
+    if schedule is None:
+        steps = int(round(days * steps_per_day))
+        schedule = np.broadcast_to(lib.column('annual_volume') * dt / 365, (steps, len(lib)))
+    schedule = np.maximum(np.asarray(schedule, dtype=np.float64), 0.0)
+    steps = schedule.shape[0]
+
+    # Only feedstocks that are ever fed take part
+    fed = schedule.sum(axis=0) > 0
+    schedule = schedule[:, fed]
+    n = schedule.shape[1]
+    dm = np.nan_to_num(lib.column('dm')[fed])
+    vs_of_dm = np.nan_to_num(lib.column('vs_of_dm')[fed])
+    drf = np.nan_to_num(lib.column('digestion_reduction_factor')[fed])
+    density = _densities(lib)[fed]
+    biogas_yield = np.nan_to_num(lib.column('biogas_yield_vs')[fed])
+    gas_per_tonne = np.divide(biogas_yield, drf, out=np.zeros(n), where=drf > 0)  # m3 per tonne VS degraded
+    methane_per_tonne = gas_per_tonne * np.nan_to_num(lib.column('percent_ch4')[fed])
+
+    # Pools per feedstock: degradable VS, inert VS, fixed solids, water
+    vs = dm * vs_of_dm
+    split = np.concatenate([vs * drf, vs * (1 - drf), dm - vs, 1 - dm])
+    decay = np.concatenate([np.broadcast_to(np.asarray(rate_constant, dtype=np.float64) * dt, (n,)), np.zeros(3 * n)])
+    retained = 1 - np.exp(-decay)
+
+    flow = (schedule / density).sum(axis=1)  # m3 per step
+    washout = flow[:, None] / tank_volumes[None, :]  # (steps, tanks)
+
+    carry = np.zeros((len(tank_volumes), 4 * n))
+    if warm_start and steps:
+        inflow = np.tile(schedule[0], 4) * split
+        for tank in range(len(tank_volumes)):
+            a = np.exp(-(decay + washout[0, tank]))
+            z = inflow / (1 - a)
+            carry[tank] = a * z
+            inflow = z * np.exp(-decay) * (1 - np.exp(-washout[0, tank]))
+
+    tank_biogas = np.zeros((steps, len(tank_volumes)))
+    methane = np.zeros(steps)
+    vs_inventory = np.zeros((steps, len(tank_volumes)))
+    digestate_dm_percentage = np.zeros(steps)
+    feedstock_biogas = np.zeros(n)
+    digestate = np.zeros(4 * n)
+    vs_destroyed = 0.0
+
+    # Block length keeps exp(-log_g) within floating point range
+    per_step = decay.max(initial=0) + (washout.max() if steps else 0)
+    block = int(max(1, min(MAX_BLOCK_STEPS, MAX_BLOCK_DECAY // max(per_step, 1e-12))))
+    for start in range(0, steps, block):
+        stop = min(start + block, steps)
+        inflow = np.tile(schedule[start:stop], 4) * split
+        for tank in range(len(tank_volumes)):
+            w = washout[start:stop, tank]
+            z, carry[tank] = _tank_block(carry[tank], inflow, decay, w)
+            degraded = z[:, :n] * retained[:n]
+            tank_biogas[start:stop, tank] = degraded @ gas_per_tonne
+            methane[start:stop] += degraded @ methane_per_tonne
+            feedstock_biogas += degraded.sum(axis=0) * gas_per_tonne
+            vs_destroyed += degraded.sum()
+            after = z * np.exp(-decay)
+            vs_inventory[start:stop, tank] = (after[:, :2 * n] * np.exp(-w)[:, None]).sum(axis=1)
+            inflow = after * (1 - np.exp(-w))[:, None]  # Outflow feeds the next tank
+        solids = inflow[:, :3 * n].sum(axis=1)
+        digestate_dm_percentage[start:stop] = _percentages(solids, inflow.sum(axis=1))
+        digestate += inflow.sum(axis=0)
+
+    biogas = tank_biogas.sum(axis=1)
+    return DigestionResults(
+        time_days=np.arange(1, steps + 1) * dt,
+        tank_volumes=tank_volumes,
+        tank_biogas=tank_biogas,
+        biogas=biogas,
+        methane=methane,
+        energy_mwh=methane * KWH_PER_M3_METHANE / 1000,
+        vs_inventory=vs_inventory,
+        retention_time=np.divide(tank_volumes[None, :], flow[:, None] / dt,
+                                 out=np.full((steps, len(tank_volumes)), np.inf), where=flow[:, None] > 0),
+        digestate_dm_percentage=digestate_dm_percentage,
+        feedstock_biogas=_scatter(feedstock_biogas, fed),
+        vs_fed=float((schedule.sum(axis=0) * vs).sum()),
+        vs_destroyed=float(vs_destroyed),
+        digestate_mass=float(digestate.sum()),
+        digestate_dm=float(digestate[:3 * n].sum()),
+        digestate_vs=float(digestate[:2 * n].sum())
+    )
+
+
+def _scatter(values, mask):
+    """Expand values for the masked rows back to one entry per library row"""
+    out = np.zeros(mask.shape[0])
+    out[mask] = values
+    return out
+
+
+PASTEURISATION_TEMPERATURE = 70.0  # Degrees C
+PASTEURISATION_HOLD_HOURS = 1.0
+CP_WATER = 4.18  # kJ/kg K
+CP_DRY_MATTER = 1.5  # kJ/kg K, typical for organic solids
+CHP_THERMAL_EFFICIENCY = 0.45  # Share of methane energy recovered as heat
+
+
+@dataclass
+class PasteurisationResults:
+    """Heat balance of the pasteuriser, one array entry per scenario"""
+    mass_flow: np.ndarray  # tonnes/hour
+    volume_flow: np.ndarray  # m3/hour
+    hold_volume: np.ndarray  # m3 held at temperature
+    heat_up: np.ndarray  # MWh/year to raise the stream to temperature
+    heat_recovered: np.ndarray  # MWh/year returned by the heat exchanger
+    hold_losses: np.ndarray  # MWh/year lost during the hold
+    heat_demand: np.ndarray  # MWh/year net
+    heat_demand_kw: np.ndarray  # Average kW
+    chp_heat: np.ndarray  # MWh/year available from the CHP
+    surplus_heat: np.ndarray  # MWh/year, negative when the CHP falls short
+    parasitic_percentage: np.ndarray  # Net demand as % of CHP heat
+
+    def summary_table(self, scenario: int = 0):
+        """One scenario as a ResultTable"""
+        return property_table('Pasteurisation', [
+            ('Mass Flow', self.mass_flow[scenario], 'tonnes/hour'),
+            ('Volume Flow', self.volume_flow[scenario], 'm3/hour'),
+            ('Hold Volume', self.hold_volume[scenario], 'm3'),
+            ('Heat Up', self.heat_up[scenario], 'MWh/year'),
+            ('Heat Recovered', self.heat_recovered[scenario], 'MWh/year'),
+            ('Hold Losses', self.hold_losses[scenario], 'MWh/year'),
+            ('Net Heat Demand', self.heat_demand[scenario], 'MWh/year'),
+            ('Average Heat Load', self.heat_demand_kw[scenario], 'kW'),
+            ('CHP Heat Available', self.chp_heat[scenario], 'MWh/year'),
+            ('Surplus Heat', self.surplus_heat[scenario], 'MWh/year'),
+            ('Parasitic Heat Load', self.parasitic_percentage[scenario], '%')
+        ])
+
+
+def pasteurisation(shit: Shit, volumes=None, inlet_temperature=10.0, temperature=PASTEURISATION_TEMPERATURE,
+                   hold_hours=PASTEURISATION_HOLD_HOURS, heat_recovery=0.5, hold_loss_per_hour=0.02,
+                   chp_thermal_efficiency=CHP_THERMAL_EFFICIENCY):
+    """Heat balance for bringing the mixed stream to `temperature` for `hold_hours`
+
+    `volumes` is an optional (scenarios x feedstocks) array of annual tonnes
+    in library row order; by default the current annual volumes are used.
+    Every scenario is evaluated with one matrix product. The stream's heat
+    capacity is weighted by DM, `heat_recovery` of the heat-up is returned by
+    the heat exchanger, and `hold_loss_per_hour` of it is lost per hour held.
+    Scalar settings may also be per-scenario arrays.
+    """
+    from scenarios import PROPERTY_COLUMNS, property_matrix  # scenarios imports this module
+
+    lib = shit.library
+    if volumes is None:
+        volumes = lib.column('annual_volume')
+    volumes = np.maximum(np.atleast_2d(np.asarray(volumes, dtype=np.float64)), 0.0)
+
+    dm = np.nan_to_num(lib.column('dm'))
+    density = _densities(lib)
+    methane_yield = property_matrix(lib)[:, PROPERTY_COLUMNS.index('total_methane')]
+    per_tonne = np.column_stack([
+        np.ones(len(lib)),
+        ((1 - dm) * CP_WATER + dm * CP_DRY_MATTER),  # MJ/K per tonne
+        1 / density,  # m3 per tonne
+        methane_yield  # m3 methane per tonne
+    ])
+    tonnes, heat_capacity, cubic_metres, methane = (volumes @ per_tonne).T
+
+    heat_up = heat_capacity * (np.asarray(temperature) - np.asarray(inlet_temperature)) / 3600  # MWh/year
+    heat_recovered = heat_up * heat_recovery
+    hold_losses = heat_up * hold_loss_per_hour * hold_hours
+    heat_demand = heat_up - heat_recovered + hold_losses
+    chp_heat = methane * KWH_PER_M3_METHANE / 1000 * chp_thermal_efficiency
+    volume_flow = cubic_metres / HOURS_PER_YEAR
+
+    return PasteurisationResults(
+        mass_flow=tonnes / HOURS_PER_YEAR,
+        volume_flow=volume_flow,
+        hold_volume=volume_flow * hold_hours,
+        heat_up=heat_up,
+        heat_recovered=heat_recovered,
+        hold_losses=hold_losses,
+        heat_demand=heat_demand,
+        heat_demand_kw=heat_demand * 1000 / HOURS_PER_YEAR,
+        chp_heat=chp_heat,
+        surplus_heat=chp_heat - heat_demand,
+        parasitic_percentage=_percentages(heat_demand, chp_heat)
+    )
+
+
+def pasturise(feed_input: Shit, **conditions):
+    """Pasteurisation stage: composition passes through unchanged, the heat
+    balance for the current volumes is kept on feed_input.pasteurisation"""
+    feed_input.pasteurisation = pasteurisation(feed_input, **conditions)
+    return feed_input
+
+
+def stream(name: str, annual_volume: float, dm: float, vs_of_dm: float, source: str = 'Plant', l_s: str = 'L'):
+    """FeedStock for an internal plant stream - no gas potential, nutrients left blank"""
+    return FeedStock(
+        source=source, feedstock_name=name, dm=dm, vs_of_dm=vs_of_dm, biogas_yield_vs=0.0,
+        percent_ch4=0.0, crop_residue_waste_other='O', density=1.0, l_s=l_s,
+        digestion_reduction_factor=0.0, cod=np.nan, bod=np.nan, total_n=np.nan, am_n=np.nan,
+        total_p=np.nan, sol_p=np.nan, solid_p=np.nan, total_k=np.nan, annual_volume=annual_volume
+    )
+
+
+@dataclass
+class SeparationResults:
+    """Solid / liquid split of a digestate stream"""
+    solids: FeedStock  # Separated fibre / cake
+    liquid: FeedStock  # Liquid fraction, the source of 'Recirc'
+    dm_capture: float
+
+    @property
+    def liquid_fraction(self):
+        total = self.solids.annual_volume + self.liquid.annual_volume
+        return self.liquid.annual_volume / total if total > 0 else 0
+
+    def summary_table(self):
+        return property_table('Separation', [
+            ('Solids', self.solids.annual_volume, 'tonnes/year'),
+            ('Solids DM %', self.solids.dm * 100, '%'),
+            ('Liquid', self.liquid.annual_volume, 'tonnes/year'),
+            ('Liquid DM %', self.liquid.dm * 100, '%'),
+            ('Liquid Fraction', self.liquid_fraction * 100, '%')
+        ])
+
+
+def seperate(feed_input: FeedStock, dm_capture: float = 0.6, solids_dm: float = 0.25):
+    """Split a digestate stream into a solid cake and a liquid fraction
+
+    `dm_capture` of the input DM goes to the solids, which leave at
+    `solids_dm` DM; the rest of the mass is liquid. VS stays in proportion
+    to DM in both fractions.
+    """
+    mass = feed_input.annual_volume
+    dry_matter = mass * feed_input.dm
+    solids_dry_matter = dry_matter * dm_capture
+    solids_mass = solids_dry_matter / solids_dm if solids_dm > 0 else 0.0
+    if solids_mass > mass:
+        raise ValueError(f"Cannot make {solids_dm:.0%} DM solids: input is only {feed_input.dm:.1%} DM")
+
+    liquid_mass = mass - solids_mass
+    liquid_dm = (dry_matter - solids_dry_matter) / liquid_mass if liquid_mass > 0 else 0.0
+    return SeparationResults(
+        solids=stream('Separated Solids', solids_mass, solids_dm, feed_input.vs_of_dm, l_s='S'),
+        liquid=stream('Recirc', liquid_mass, liquid_dm, feed_input.vs_of_dm),
+        dm_capture=dm_capture
+    )
+
+
+def anderson(function, x0, scale=None, tol=1e-10, max_iterations=50, memory=3):
+    """Anderson-accelerated fixed-point iteration for x = function(x)
+
+    Returns (x, iterations, residual, converged); the residual is the
+    largest change per iteration in units of `scale`. When an extrapolated
+    step raises the residual the history is dropped and the next step is a
+    plain fixed-point one.
+    """
+    x = np.asarray(x0, dtype=np.float64)
+    scale = np.ones_like(x) if scale is None else np.asarray(scale, dtype=np.float64)
+    xs, fs = [], []
+    residual = np.inf
+    for iteration in range(1, max_iterations + 1):
+        g = function(x)
+        f = (g - x) / scale
+        previous, residual = residual, np.abs(f).max()
+        if residual < tol:
+            return g, iteration, residual, True
+        if residual > previous:
+            xs, fs = [], []
+        xs.append(g / scale)
+        fs.append(f)
+        if len(fs) > memory + 1:
+            xs.pop(0)
+            fs.pop(0)
+        if len(fs) > 1:
+            delta_f = np.diff(fs, axis=0).T
+            delta_g = np.diff(xs, axis=0).T
+            gamma = np.linalg.lstsq(delta_f, f, rcond=None)[0]
+            x = (g / scale - delta_g @ gamma) * scale
+        else:
+            x = g
+    return x, max_iterations, residual, False
+
+
+@dataclass
+class RecirculationResults:
+    """Steady-state plant loop with the recirculation rate that meets the DM target"""
+    recirc_rate: float  # tonnes/year fed back to the digester
+    recirc: FeedStock
+    digestion: DigestionResults
+    separation: SeparationResults
+    digester_dm_percentage: float
+    iterations: int
+    residual: float
+    converged: bool
+    feasible: bool  # False when the target needs negative or more recirc than the liquid fraction
+
+
+def solve_recirculation(shit: Shit, tank_volumes, target_dm_percentage: float, dm_capture: float = 0.6,
+                        solids_dm: float = 0.25, recirc_name: str = 'Recirc', rate_constant=DEFAULT_RATE_CONSTANT,
+                        tol=1e-10, max_iterations=50):
+    """Find the steady recirculation rate that holds the digester at a target DM %
+
+    The loop feed -> digestion -> seperate -> Recirc -> feed is solved as a
+    fixed point over (recirc rate, recirc DM, recirc VS of DM). Recirc
+    carries no degradable VS, so it passes through the digester unchanged and
+    each iteration can solve the DM balance for the rate directly; Anderson
+    acceleration handles the coupling through retention time and liquid
+    composition. The recirc feedstock in `shit` is left at the solution.
+    """
+    if recirc_name not in shit.content:
+        shit.add_feedstock(stream(recirc_name, 0.0, 0.0, 0.0))
+    recirc = shit.content[recirc_name]
+    recirc.set_values(biogas_yield_vs=0.0, digestion_reduction_factor=0.0, density=1.0)
+    target = target_dm_percentage / 100
+
+    def steady_state(x):
+        rate, dm, vs_of_dm = x
+        recirc.set_values(annual_volume=max(rate, 0.0), dm=dm, vs_of_dm=vs_of_dm)
+        digested = digestion(shit, tank_volumes, days=1, rate_constant=rate_constant)
+        return digested, seperate(digested.digestate(), dm_capture, solids_dm)
+
+    def update(x):
+        rate, dm, vs_of_dm = x
+        digested, separated = steady_state(x)
+        # DM balance over the digester with the recirc share taken out
+        fresh_solids = digested.digestate_dm * 365 - max(rate, 0.0) * dm
+        fresh_mass = digested.digestate_mass * 365 - max(rate, 0.0)
+        liquid = separated.liquid
+        new_rate = (fresh_solids - target * fresh_mass) / (target - liquid.dm) if target > liquid.dm else 0.0
+        return np.array([max(new_rate, 0.0), liquid.dm, liquid.vs_of_dm])
+
+    x0 = np.array([recirc.annual_volume, recirc.dm, recirc.vs_of_dm])
+    scale = np.array([max(shit.mass_balance().total_tpa, 1.0), 1.0, 1.0])
+    x, iterations, residual, converged = anderson(update, x0, scale, tol, max_iterations)
+
+    digested, separated = steady_state(x)
+    digester_dm = digested.digestate_dm / digested.digestate_mass if digested.digestate_mass > 0 else 0
+    return RecirculationResults(
+        recirc_rate=recirc.annual_volume,
+        recirc=recirc,
+        digestion=digested,
+        separation=separated,
+        digester_dm_percentage=digester_dm * 100,
+        iterations=iterations,
+        residual=float(residual),
+        converged=converged,
+        feasible=bool(abs(digester_dm - target) < 1e-6 and recirc.annual_volume <= separated.liquid.annual_volume)
+    )
+
 
 if __name__ == "__main__":
     foo = 10
@@ -0,0 +1,211 @@
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from model import Shit, FeedStockLibrary, ResultTable
+from scenarios import ScenarioResults, property_matrix, results_from_totals, CHUNK_SIZE
+
+
+# Nutrient loads reported for every stream, with the library field they come from
+NUTRIENTS = ('total_n', 'ammonium_n', 'total_p', 'soluble_p', 'total_k', 'cod', 'bod')
+NUTRIENT_FIELDS = {
+    'total_n': 'total_n',
+    'ammonium_n': 'am_n',
+    'total_p': 'total_p',
+    'soluble_p': 'sol_p',
+    'total_k': 'total_k',
+    'cod': 'cod',
+    'bod': 'bod'
+}
+NUTRIENT_LABELS = {
+    'total_n': 'Total N',
+    'ammonium_n': 'Ammonium N',
+    'total_p': 'Total P',
+    'soluble_p': 'Soluble P',
+    'total_k': 'Total K',
+    'cod': 'COD',
+    'bod': 'BOD'
+}
+STREAMS = ('feed', 'digestate', 'liquid', 'solids')
+
+DEFAULT_UNIT = 'kg'  # Load unit when the library has no units row
+NVZ_N_LIMIT = 170.0  # kg N/ha/year from organic manures in a Nitrate Vulnerable Zone
+KG_PER_UNIT = {'mg': 1e-6, 'g': 1e-3, 'kg': 1.0, 't': 1e3, 'tonne': 1e3, 'tonnes': 1e3}
+
+
+@dataclass
+class NutrientResults:
+    """Annual nutrient loads for every scenario, arrays of shape (scenarios, NUTRIENTS)
+
+    The digestate is split by a separator: dissolved species (ammonium N,
+    soluble P, K) go to the solids in proportion to the cake mass, the rest
+    in proportion to the DM captured. The per-feedstock arrays, shape
+    (scenarios, feedstocks, NUTRIENTS), are only filled when asked for.
+    """
+    feed: np.ndarray
+    digestate: np.ndarray
+    liquid: np.ndarray
+    solids: np.ndarray
+    digestate_mass: np.ndarray  # tonnes/year
+    liquid_mass: np.ndarray
+    solids_mass: np.ndarray
+    separable: np.ndarray  # False where the digestate is too wet to make cake at solids_dm
+    units: dict  # Nutrient -> load unit
+    gas: ScenarioResults
+    feedstock_feed: np.ndarray = None
+    feedstock_digestate: np.ndarray = None
+    feedstock_liquid: np.ndarray = None
+    feedstock_solids: np.ndarray = None
+
+    def __len__(self):
+        return len(self.feed)
+
+    def load(self, stream: str, nutrient: str):
+        """Load of one nutrient in one stream, one entry per scenario"""
+        return getattr(self, stream)[:, NUTRIENTS.index(nutrient)]
+
+    def spreading_area(self, limit: float = NVZ_N_LIMIT, stream: str = 'digestate'):
+        """Hectares needed to spread a stream's total N at `limit` kg N per hectare"""
+        unit = self.units['total_n'].split('/')[0].strip().lower()
+        if unit not in KG_PER_UNIT:
+            raise ValueError(f"Cannot convert total N load unit '{self.units['total_n']}' to kg")
+        return self.load(stream, 'total_n') * KG_PER_UNIT[unit] / limit
+
+    def summary_table(self, scenario: int = 0):
+        """Nutrient balance of one scenario as a ResultTable, one row per nutrient"""
+        return ResultTable('Nutrient Balance', {
+            'Nutrient': [NUTRIENT_LABELS[name] for name in NUTRIENTS],
+            'Feed': self.feed[scenario],
+            'Digestate': self.digestate[scenario],
+            'Liquid': self.liquid[scenario],
+            'Solids': self.solids[scenario],
+            'Units': [self.units[name] for name in NUTRIENTS]
+        }, float_format='%.2f')
+
+
+def _load_unit(unit: str):
+    """'(kg / T input)' -> 'kg/year'"""
+    match = re.match(r'\(?\s*([^/()]+?)\s*/', unit or '')
+    return f"{match.group(1) if match else DEFAULT_UNIT}/year"
+
+
+def nutrient_matrices(library: FeedStockLibrary):
+    """Per-tonne nutrient coefficients of each feedstock, each of shape (feedstocks, NUTRIENTS)
+
+    Returns (feed, dissolved, particulate, mass, dry_matter): the loads fed,
+    the loads leaving the digester split by how a separator treats them,
+    and the digestate mass and DM left per tonne fed. N, P and K are
+    conserved through the digester. COD and BOD fall, and organic N turns
+    to ammonium, in proportion to the VS destroyed (the digestion reduction
+    factor). The mass and DM lost are the VS converted to gas.
+    """
+    values = {name: np.nan_to_num(library.column(field)) for name, field in NUTRIENT_FIELDS.items()}
+    dm = np.nan_to_num(library.column('dm'))
+    vs_of_dm = np.nan_to_num(library.column('vs_of_dm'))
+    destruction = np.clip(np.nan_to_num(library.column('digestion_reduction_factor')), 0.0, 1.0)
+    destroyed = dm * vs_of_dm * destruction
+
+    ammonium = np.minimum(values['ammonium_n'], values['total_n'])
+    ammonium_out = ammonium + (values['total_n'] - ammonium) * destruction
+    soluble_p = np.minimum(values['soluble_p'], values['total_p'])
+    zero = np.zeros(len(library))
+
+    feed = np.column_stack([values[name] for name in NUTRIENTS])
+    dissolved = np.column_stack([ammonium_out, ammonium_out, soluble_p, soluble_p, values['total_k'], zero, zero])
+    particulate = np.column_stack([
+        values['total_n'] - ammonium_out,
+        zero,
+        values['total_p'] - soluble_p,
+        zero,
+        zero,
+        values['cod'] * (1 - destruction),
+        values['bod'] * (1 - destruction)
+    ])
+    return feed, dissolved, particulate, 1.0 - destroyed, dm - destroyed
+
+
+def _partition(mass, dry_matter, dm_capture, solids_dm):
+    """Cake mass and the fraction of the digestate mass it takes, per scenario"""
+    wanted = dry_matter * dm_capture / solids_dm if solids_dm > 0 else np.zeros_like(mass)
+    separable = wanted <= mass
+    solids_mass = np.minimum(wanted, mass)
+    fraction = np.zeros_like(mass)
+    np.divide(solids_mass, mass, out=fraction, where=mass > 0)
+    return solids_mass, fraction, separable
+
+
+def evaluate_nutrients(shit: Shit, volumes, dm_capture: float = 0.6, solids_dm: float = 0.25,
+                       per_feedstock: bool = False):
+    """Nutrient loads in and out of the plant for a (scenarios x feedstocks) array of annual tonnages
+
+    Columns follow shit.content and volumes of zero or below are unused,
+    as in evaluate_scenarios. The gas figures come from the same matrix
+    product, one per chunk of scenarios. `dm_capture` and `solids_dm`
+    match seperate; where the cake cannot reach `solids_dm` it takes the
+    whole digestate and `separable` is False. `per_feedstock` also returns
+    every feedstock's loads, which needs scenarios x feedstocks x 7 floats
+    per stream.
+    """
+    volumes = np.atleast_2d(np.asarray(volumes, dtype=np.float64))
+    if volumes.shape[1] != len(shit.library):
+        raise ValueError(f"Expected {len(shit.library)} feedstock columns, got {volumes.shape[1]}")
+
+    gas_matrix = property_matrix(shit.library)
+    feed, dissolved, particulate, mass, dry_matter = nutrient_matrices(shit.library)
+    matrix = np.column_stack([gas_matrix, feed, dissolved, particulate, mass, dry_matter])
+    splits = np.cumsum([gas_matrix.shape[1], len(NUTRIENTS), len(NUTRIENTS), len(NUTRIENTS), 1])
+
+    totals = np.empty((volumes.shape[0], matrix.shape[1]))
+    for start in range(0, volumes.shape[0], CHUNK_SIZE):
+        chunk = volumes[start:start + CHUNK_SIZE]
+        np.matmul(np.maximum(chunk, 0.0), matrix, out=totals[start:start + CHUNK_SIZE])
+    gas_totals, feed_totals, dissolved_totals, particulate_totals, digestate_mass, digestate_dm = \
+        np.split(totals, splits, axis=1)
+    digestate_mass, digestate_dm = digestate_mass[:, 0], digestate_dm[:, 0]
+
+    solids_mass, solids_fraction, separable = _partition(digestate_mass, digestate_dm, dm_capture, solids_dm)
+    capture = np.where(separable, dm_capture, 1.0)
+    solids = dissolved_totals * solids_fraction[:, None] + particulate_totals * capture[:, None]
+    digestate = dissolved_totals + particulate_totals
+
+    units = {name: _load_unit(shit.library.units.get(field)) for name, field in NUTRIENT_FIELDS.items()}
+    results = NutrientResults(
+        feed=feed_totals,
+        digestate=digestate,
+        liquid=digestate - solids,
+        solids=solids,
+        digestate_mass=digestate_mass,
+        liquid_mass=digestate_mass - solids_mass,
+        solids_mass=solids_mass,
+        separable=separable,
+        units=units,
+        gas=results_from_totals(gas_totals)
+    )
+
+    if per_feedstock:
+        used = np.maximum(volumes, 0.0)[:, :, None]
+        results.feedstock_feed = used * feed
+        results.feedstock_digestate = used * (dissolved + particulate)
+        results.feedstock_solids = used * (dissolved * solids_fraction[:, None, None]
+                                           + particulate * capture[:, None, None])
+        results.feedstock_liquid = results.feedstock_digestate - results.feedstock_solids
+    return results
+
+
+def nutrient_tables(shit: Shit, dm_capture: float = 0.6, solids_dm: float = 0.25):
+    """Per-feedstock loads in and out, and the plant nutrient balance, for the current volumes"""
+    volumes = shit.library.column('annual_volume')
+    results = evaluate_nutrients(shit, volumes, dm_capture, solids_dm, per_feedstock=True)
+    active = volumes > 0
+
+    columns = {
+        'Feedstock Name': np.asarray(shit.library.column('feedstock_name'), dtype=object)[active],
+        'Annual Volume (TPA)': volumes[active]
+    }
+    for i, name in enumerate(NUTRIENTS):
+        unit = results.units[name]
+        columns[f"{NUTRIENT_LABELS[name]} In ({unit})"] = results.feedstock_feed[0, active, i]
+        columns[f"{NUTRIENT_LABELS[name]} Out ({unit})"] = results.feedstock_digestate[0, active, i]
+    per_feedstock = ResultTable('Feedstock Nutrient Loads', columns, float_format='%.2f')
+    return per_feedstock, results.summary_table()
@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.optimize import linprog
+
+from model import Shit, KWH_PER_M3_METHANE
+from scenarios import PROPERTY_COLUMNS, evaluate_scenarios, property_matrix
+
+
+@dataclass
+class FeedMixResult:
+    """Optimised annual volumes, in library row order"""
+    names: list
+    volumes: np.ndarray  # tonnes/year
+    success: bool
+    status: int
+    message: str
+    objective: float
+    power_output_mwh: float
+    bulk_dm_percentage: float
+    crop_methane_percentage: float
+
+    def as_dict(self):
+        return dict(zip(self.names, self.volumes.tolist()))
+
+    def apply(self, shit: Shit):
+        """Write the optimised volumes into the Shit"""
+        shit.library.set_column('annual_volume', self.volumes)
+        return shit
+
+
+def _bounds(shit: Shit, availability):
+    lower = np.zeros(len(shit.library))
+    upper = np.full(len(shit.library), np.inf)
+    rows = {name: i for i, name in enumerate(shit.library.column('feedstock_name'))}
+    for name, bound in (availability or {}).items():
+        if name not in rows:
+            raise KeyError(f"Unknown feedstock {name!r}")
+        low, high = bound if isinstance(bound, (tuple, list)) else (0.0, bound)
+        lower[rows[name]] = 0.0 if low is None else low
+        upper[rows[name]] = np.inf if high is None else high
+    return lower, upper
+
+
+def optimise_feed_mix(shit: Shit, target_mwh: float, availability: dict = None, dm_window=(0.0, 100.0),
+                      max_crop_methane_percentage: float = 100.0, costs=None, whole_tonnes=False,
+                      time_limit=None):
+    """Solve for the annual volumes that meet a power target at the least cost
+
+    `availability` maps feedstock names to a maximum tonnage or a
+    (minimum, maximum) pair; unlisted feedstocks may take any volume. The
+    bulk DM % (including Water / Recirc) is kept inside `dm_window` and the
+    crop share of methane under `max_crop_methane_percentage`. `costs` per
+    tonne default to 1, i.e. the least total tonnage, so the power output
+    lands on `target_mwh` unless another constraint forces more.
+    `whole_tonnes` makes it a MILP, optionally capped at `time_limit`
+    seconds. All constraints are linear in the volumes, so HiGHS solves it
+    directly from the feedstock property vectors.
+    """
+    lib = shit.library
+    n = len(lib)
+    per_tonne = property_matrix(lib)
+    dm = per_tonne[:, PROPERTY_COLUMNS.index('total_dm')]
+    methane = per_tonne[:, PROPERTY_COLUMNS.index('total_methane')]
+    crop_methane = per_tonne[:, PROPERTY_COLUMNS.index('crop_methane')]
+    mwh = methane * KWH_PER_M3_METHANE / 1000
+    dm_low, dm_high = dm_window[0] / 100, dm_window[1] / 100
+    crop_cap = max_crop_methane_percentage / 100
+
+    # A_ub @ v <= b_ub
+    a_ub = np.array([
+        dm_low - dm,  # DM % above the window floor
+        dm - dm_high,  # DM % below the window ceiling
+        crop_methane - crop_cap * methane,  # Crop methane share under the cap
+        -mwh  # Power output at least the target
+    ])
+    b_ub = [0.0, 0.0, 0.0, -target_mwh]
+
+    costs = np.ones(n) if costs is None else np.broadcast_to(np.asarray(costs, dtype=np.float64), (n,))
+    lower, upper = _bounds(shit, availability)
+    result = linprog(
+        costs, A_ub=a_ub, b_ub=b_ub, bounds=np.column_stack([lower, upper]), method='highs',
+        integrality=np.ones(n) if whole_tonnes else None,
+        options={} if time_limit is None else {'time_limit': time_limit}
+    )
+
+    volumes = result.x if result.x is not None else np.full(n, np.nan)
+    totals = evaluate_scenarios(shit, np.nan_to_num(volumes))
+    return FeedMixResult(
+        names=list(lib.column('feedstock_name')),
+        volumes=volumes,
+        success=bool(result.success),
+        status=int(result.status),
+        message=result.message,
+        objective=float(result.fun) if result.fun is not None else np.nan,
+        power_output_mwh=float(totals.power_output_mwh[0]),
+        bulk_dm_percentage=float(totals.bulk_dm_percentage[0]),
+        crop_methane_percentage=float(totals.crop_methane_percentage[0])
+    )
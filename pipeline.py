@@ -0,0 +1,167 @@
+import os
+
+import numpy as np
+
+from model import Shit, FeedStock, feed, assign_feedstock_volumes, mix, pasturise, digestion, seperate
+
+
+def _same(a, b):
+    """Parameter equality that also copes with NumPy arrays"""
+    if a is b:
+        return True
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+def _stamp(path):
+    """(mtime, size) of an input file, or None when there is no such file"""
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Stage:
+    """One node of the flowsheet: function(*upstream outputs, **params)"""
+
+    def __init__(self, name: str, function, inputs=(), copy_inputs=True, files=(), **params):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.copy_inputs = copy_inputs  # Stages may mutate a Shit, so they get their own copy
+        self.files = tuple(files)  # Names of the params that are input file paths
+        self.params = params
+        self.output = None
+        self.revision = 0  # Bumped whenever the output is recomputed
+        self.runs = 0
+        self._param_revision = 0
+        self._key = None
+
+    def set_params(self, **params):
+        changed = {name: value for name, value in params.items()
+                   if name not in self.params or not _same(self.params[name], value)}
+        if changed:
+            self.params.update(changed)
+            self._param_revision += 1
+        return bool(changed)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={list(self.inputs)}, runs={self.runs})"
+
+
+class Pipeline:
+    """Directed acyclic flowsheet of plant stages with cached stage outputs
+
+    A stage is rerun only when its parameters, the mtime or size of an input
+    file it reads, an upstream output, or the library version of a Shit it
+    consumes has changed since its last run.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name: str, function, inputs=(), copy_inputs=True, files=(), **params):
+        if name in self.stages:
+            raise ValueError(f"Stage {name!r} already exists")
+        stage = Stage(name, function, inputs, copy_inputs, files, **params)
+        self.stages[name] = stage
+        return stage
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def set_params(self, name: str, **params):
+        return self.stages[name].set_params(**params)
+
+    def order(self, targets=None):
+        """Stages needed for `targets` (default all) in topological order"""
+        needed = set()
+        pending = list(targets or self.stages)
+        while pending:
+            name = pending.pop()
+            if name in needed:
+                continue
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage {name!r}")
+            needed.add(name)
+            pending.extend(self.stages[name].inputs)
+
+        # Kahn's algorithm, keeping insertion order among ready stages
+        remaining = {name: sum(1 for i in self.stages[name].inputs if i in needed) for name in needed}
+        ordered = []
+        ready = [name for name in self.stages if name in needed and remaining[name] == 0]
+        while ready:
+            name = ready.pop(0)
+            ordered.append(name)
+            for other in self.stages:
+                if other in needed and name in self.stages[other].inputs:
+                    remaining[other] -= 1
+                    if remaining[other] == 0:
+                        ready.append(other)
+        if len(ordered) != len(needed):
+            cycle = sorted(name for name in needed if name not in ordered)
+            raise ValueError(f"Pipeline has a cycle through {cycle}")
+        return ordered
+
+    def run(self, targets=None):
+        """Execute stale stages and return {stage name: output} for the stages run or reused"""
+        outputs = {}
+        for name in self.order(targets):
+            stage = self.stages[name]
+            upstream = [self.stages[i] for i in stage.inputs]
+            key = (
+                stage._param_revision,
+                tuple(_stamp(stage.params.get(f)) for f in stage.files),
+                tuple(u.revision for u in upstream),
+                tuple(u.output.library.version if isinstance(u.output, Shit) else None for u in upstream)
+            )
+            if key != stage._key:
+                args = [u.output.copy() if stage.copy_inputs and isinstance(u.output, Shit) else u.output
+                        for u in upstream]
+                stage.output = stage.function(*args, **stage.params)
+                stage.revision += 1
+                stage.runs += 1
+                stage._key = key
+            outputs[name] = stage.output
+        return outputs
+
+
+def _feed_stage(path, volumes_path=None):
+    shit = feed(path, cache=True)
+    if volumes_path is not None:
+        assign_feedstock_volumes(shit, volumes_path)
+    return shit
+
+
+def _mix_stage(shit, clean_water=None, recirc_fluid=None):
+    # Fresh FeedStocks, so the stage parameters are never rebound to a run's library
+    clean_water, recirc_fluid = (None if s is None else FeedStock(**s.as_dict()) for s in (clean_water, recirc_fluid))
+    if clean_water is not None and recirc_fluid is not None:
+        return mix(shit, clean_water, recirc_fluid)
+    for fluid in (clean_water, recirc_fluid):
+        if fluid is not None:
+            shit.add_feedstock(fluid)
+    return shit
+
+
+def _seperate_stage(digested, **params):
+    return seperate(digested.digestate(), **params)
+
+
+def plant_pipeline(feedstock_path: str, volumes_path: str, tank_volumes, clean_water=None, recirc_fluid=None,
+                   days=365, dm_capture=0.6, solids_dm=0.25):
+    """Standard flowsheet: feed -> mix -> pasturise -> digestion -> seperate"""
+    pipeline = Pipeline()
+    pipeline.add('feed', _feed_stage, files=('path', 'volumes_path'), path=feedstock_path, volumes_path=volumes_path)
+    pipeline.add('mix', _mix_stage, inputs=['feed'], clean_water=clean_water, recirc_fluid=recirc_fluid)
+    pipeline.add('pasturise', pasturise, inputs=['mix'])
+    pipeline.add('digestion', digestion, inputs=['pasturise'], tank_volumes=tank_volumes, days=days)
+    pipeline.add('seperate', _seperate_stage, inputs=['digestion'], dm_capture=dm_capture, solids_dm=solids_dm)
+    return pipeline
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from model import (FeedStockLibrary, MassBalance, mass_balance, KWH_PER_M3_METHANE, HOURS_PER_YEAR,
+                   NON_FEEDSTOCK_NAMES)
+
+
+CACHE_VERSION = 1
+DEFAULT_MAXSIZE = 1024
+
+# Model constants folded into every key, so changing one retires all stored results
+MODEL_CONSTANTS = json.dumps({
+    'version': CACHE_VERSION,
+    'kwh_per_m3_methane': KWH_PER_M3_METHANE,
+    'hours_per_year': HOURS_PER_YEAR,
+    'non_feedstock_names': list(NON_FEEDSTOCK_NAMES)
+}, sort_keys=True).encode('utf-8')
+
+_ARRAY_FIELDS = [f.name for f in fields(MassBalance) if f.name != 'names' and f.type is np.ndarray]
+_SCALAR_FIELDS = [f.name for f in fields(MassBalance) if f.type is float]
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    disk_hits: int  # Included in hits
+    misses: int
+    size: int
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def library_digest(library: FeedStockLibrary):
+    """Hash of every feedstock property except the annual volumes"""
+    digest = hashlib.blake2b(MODEL_CONSTANTS, digest_size=20)
+    for name in FeedStockLibrary.NUMERIC_FIELDS:
+        if name != 'annual_volume':
+            digest.update(np.ascontiguousarray(library.column(name)).tobytes())
+    for name in FeedStockLibrary.CATEGORICAL_FIELDS:
+        digest.update(np.ascontiguousarray(library.codes(name)).tobytes())
+    digest.update(json.dumps([library.categories, library.column('feedstock_name')]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed mass balance results with a bounded LRU and an optional disk tier
+
+    Keys hash the feedstock properties, the volume vector and the model
+    constants, so a result is reused for any library holding the same
+    values and a property edit misses without anything being cleared. The
+    property hash is only recomputed after library.property_version moves;
+    a what-if on volumes alone costs one hash of the volume vector. Results
+    are shared between callers and their arrays are read-only.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, directory: str = None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._digests = weakref.WeakKeyDictionary()  # Library -> (property_version, digest)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return CacheStats(hits=self.hits, disk_hits=self.disk_hits, misses=self.misses, size=len(self._entries))
+
+    def clear(self):
+        """Empty the memory tier and reset the counters; the disk tier is kept"""
+        self._entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def key(self, library: FeedStockLibrary, volumes=None):
+        """Cache key for a library's properties with `volumes` (default its own annual volumes)"""
+        version, digest = self._digests.get(library, (None, None))
+        if version != library.property_version:
+            version, digest = library.property_version, library_digest(library)
+            self._digests[library] = (version, digest)
+        volumes = library.column('annual_volume') if volumes is None else volumes
+        key = hashlib.blake2b(digest.encode('ascii'), digest_size=20)
+        key.update(np.ascontiguousarray(volumes, dtype=np.float64).tobytes())
+        return key.hexdigest()
+
+    def mass_balance(self, library: FeedStockLibrary):
+        """mass_balance(library), served from the cache when the same mix was seen before"""
+        key = self.key(library)
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+        result = self._load(key, library)
+        if result is not None:
+            self.hits += 1
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            result = mass_balance(library)
+            for name in _ARRAY_FIELDS + ['names']:
+                getattr(result, name).flags.writeable = False
+            self._save(key, result)
+        self._entries[key] = result
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return result
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.npz")
+
+    def _load(self, key, library):
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(key), allow_pickle=False) as data:
+                values = {name: data[name] for name in _ARRAY_FIELDS}
+                values.update({name: float(data[name]) for name in _SCALAR_FIELDS})
+        except (OSError, ValueError, KeyError):
+            return None  # Missing or damaged entry - recompute it
+        # Names are part of the key, so the library's own names are the stored ones
+        values['names'] = np.array(library.column('feedstock_name'), dtype=object)
+        for name in _ARRAY_FIELDS + ['names']:
+            values[name].flags.writeable = False
+        return MassBalance(**values)
+
+    def _save(self, key, result: MassBalance):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # np.savez appends .npz to names without it, so write through a file object
+            with open(tmp, 'wb') as f:
+                np.savez(f, **{name: getattr(result, name) for name in _ARRAY_FIELDS + _SCALAR_FIELDS})
+            os.replace(tmp, path)
+        except OSError:
+            pass  # Read-only location, keep the result in memory only
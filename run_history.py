@@ -0,0 +1,290 @@
+import argparse
+import os
+import sqlite3
+import threading
+from dataclasses import asdict, fields
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas
+
+from model import Shit, PlantTotals, normalise_header, normalise_name, write_table
+from result_cache import library_digest
+
+
+HISTORY_NAME = os.path.join('biogas_plant_sim', 'run_history.sqlite')
+SCHEMA_VERSION = 1
+
+# Project Details.csv headers and UI labels -> runs columns
+DETAIL_FIELDS = {
+    'project name': 'project',
+    'project address': 'address',
+    'location': 'address',
+    'date': 'project_date',
+    'ran by': 'consultant',
+    'consultant': 'consultant',
+    'comments': 'comments'
+}
+DETAIL_COLUMNS = ('project', 'address', 'project_date', 'consultant', 'comments')
+TOTAL_COLUMNS = tuple(f.name for f in fields(PlantTotals))
+
+# Per-feedstock inputs and outputs kept for every used feedstock of a run
+FEEDSTOCK_INPUTS = ('annual_volume', 'dm', 'vs_of_dm', 'biogas_yield_vs', 'percent_ch4')
+FEEDSTOCK_OUTPUTS = ('dm_input', 'vs_input', 'biogas_volume', 'methane_volume', 'energy_mwh')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    project TEXT COLLATE NOCASE,
+    address TEXT,
+    project_date TEXT,
+    consultant TEXT COLLATE NOCASE,
+    comments TEXT,
+    library_digest TEXT NOT NULL,
+    library_version INTEGER,
+    feedstocks INTEGER NOT NULL,
+    {', '.join(f'{name} REAL' for name in TOTAL_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS run_feedstocks (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    position INTEGER NOT NULL,
+    feedstock_name TEXT NOT NULL,
+    feedstock_key TEXT NOT NULL,
+    category TEXT,
+    {', '.join(f'{name} REAL' for name in FEEDSTOCK_INPUTS + FEEDSTOCK_OUTPUTS)},
+    PRIMARY KEY (run_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_project ON runs (project, created_at);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at);
+CREATE INDEX IF NOT EXISTS runs_consultant ON runs (consultant, created_at);
+CREATE INDEX IF NOT EXISTS run_feedstocks_key ON run_feedstocks (feedstock_key, run_id);
+CREATE TRIGGER IF NOT EXISTS runs_append_only_update BEFORE UPDATE ON runs
+    BEGIN SELECT RAISE(ABORT, 'run history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS runs_append_only_delete BEFORE DELETE ON runs
+    BEGIN SELECT RAISE(ABORT, 'run history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS run_feedstocks_append_only_update BEFORE UPDATE ON run_feedstocks
+    BEGIN SELECT RAISE(ABORT, 'run history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS run_feedstocks_append_only_delete BEFORE DELETE ON run_feedstocks
+    BEGIN SELECT RAISE(ABORT, 'run history is append-only'); END;
+PRAGMA user_version = {SCHEMA_VERSION};
+"""
+
+
+def project_details(details: dict):
+    """Map Project Details.csv headers or UI labels onto the runs detail columns"""
+    mapped = {}
+    for header, value in (details or {}).items():
+        column = DETAIL_FIELDS.get(normalise_header(str(header)).rstrip(':'))
+        if column is not None and column not in mapped:
+            mapped[column] = None if value is None else str(value).strip()
+    return mapped
+
+
+def snapshot(shit: Shit):
+    """Inputs and outputs of the current mix as plain data, small enough to pass between processes"""
+    mb = shit.mass_balance()
+    active = mb.active
+    lib = shit.library
+    feedstocks = {
+        'feedstock_name': [' '.join(str(name).split()) for name in mb.names[active]],
+        'feedstock_key': [normalise_name(name) for name in mb.names[active]],
+        'category': list(lib.column('crop_residue_waste_other')[active])
+    }
+    for name in FEEDSTOCK_INPUTS:
+        feedstocks[name] = lib.column(name)[active].tolist()
+    for name in FEEDSTOCK_OUTPUTS:
+        feedstocks[name] = getattr(mb, name)[active].tolist()
+    return {
+        'library_digest': library_digest(lib),
+        'library_version': lib.version,
+        'totals': {name: float(value) for name, value in asdict(shit.totals()).items()},
+        'feedstocks': feedstocks
+    }
+
+
+def default_history_path():
+    """Per-user data file: %APPDATA% on Windows, $XDG_DATA_HOME or ~/.local/share elsewhere"""
+    base = os.environ.get('APPDATA' if os.name == 'nt' else 'XDG_DATA_HOME')
+    return os.path.join(base or os.path.join(os.path.expanduser('~'), '.local', 'share'), HISTORY_NAME)
+
+
+def _bound(value, end=False):
+    """Timestamp text for a date range bound; a bare end date includes the whole day"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(timespec='seconds')
+    if isinstance(value, date):
+        value = value.isoformat()
+    if end and len(value) == 10:
+        return (date.fromisoformat(value) + timedelta(days=1)).isoformat()
+    return value
+
+
+def _nullable(value):
+    # SQLite stores NaN as NULL anyway; say so explicitly for plain floats
+    return None if isinstance(value, float) and np.isnan(value) else value
+
+
+class RunHistory:
+    """Append-only SQLite store of simulation runs
+
+    Each run keeps its project details, the content hash and version of the
+    feedstock library, every plant total as its own column, and the inputs
+    and outputs of each feedstock it used. Runs are indexed by project,
+    consultant, date and feedstock name. Updates and deletes are refused by
+    triggers. One connection is shared between threads behind a lock.
+    By default the database lives in the per-user data directory.
+    """
+
+    def __init__(self, path: str = None):
+        if path is None:
+            path = default_history_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def record(self, shit: Shit, details: dict = None, source: str = 'ui', created_at: datetime = None):
+        """Append the current state of a Shit as one run and return its run_id"""
+        return self.append_many([(snapshot(shit), details, source, created_at)])[0]
+
+    def append_many(self, entries):
+        """Append (snapshot, details, source, created_at) entries in one transaction; returns their run_ids"""
+        run_columns = ('created_at', 'source') + DETAIL_COLUMNS + (
+            'library_digest', 'library_version', 'feedstocks') + TOTAL_COLUMNS
+        feedstock_columns = ('run_id', 'position', 'feedstock_name', 'feedstock_key', 'category') + FEEDSTOCK_INPUTS + FEEDSTOCK_OUTPUTS
+        insert_run = f"INSERT INTO runs ({', '.join(run_columns)}) VALUES ({', '.join('?' * len(run_columns))})"
+        insert_feedstocks = (f"INSERT INTO run_feedstocks ({', '.join(feedstock_columns)}) "
+                             f"VALUES ({', '.join('?' * len(feedstock_columns))})")
+
+        run_ids = []
+        with self._lock, self._connection:
+            for data, details, source, created_at in entries:
+                details = project_details(details)
+                created_at = (created_at or datetime.now()).isoformat(timespec='seconds')
+                feedstocks = data['feedstocks']
+                row = [created_at, source] + [details.get(name) for name in DETAIL_COLUMNS] + [
+                    data['library_digest'], data['library_version'], len(feedstocks['feedstock_name'])
+                ] + [_nullable(data['totals'][name]) for name in TOTAL_COLUMNS]
+                run_id = self._connection.execute(insert_run, row).lastrowid
+                columns = [feedstocks[name] for name in feedstock_columns[2:]]
+                self._connection.executemany(insert_feedstocks, (
+                    (run_id, position, *(_nullable(values[position]) for values in columns))
+                    for position in range(len(feedstocks['feedstock_name']))
+                ))
+                run_ids.append(run_id)
+        return run_ids
+
+    def _where(self, project=None, start=None, end=None, feedstock=None, consultant=None, run_ids=None):
+        clauses, params = [], []
+        if project is not None:
+            clauses.append('runs.project = ?')
+            params.append(project)
+        if consultant is not None:
+            clauses.append('runs.consultant = ?')
+            params.append(consultant)
+        if start is not None:
+            clauses.append('runs.created_at >= ?')
+            params.append(_bound(start))
+        if end is not None:
+            clauses.append('runs.created_at < ?' if len(str(_bound(end))) == 10 else 'runs.created_at <= ?')
+            params.append(_bound(end, end=True))
+        if feedstock is not None:
+            names = [feedstock] if isinstance(feedstock, str) else list(feedstock)
+            clauses.append(f"runs.run_id IN (SELECT run_id FROM run_feedstocks "
+                           f"WHERE feedstock_key IN ({', '.join('?' * len(names))}))")
+            params.extend(normalise_name(name) for name in names)
+        if run_ids is not None:
+            run_ids = [int(run_id) for run_id in run_ids]
+            clauses.append(f"runs.run_id IN ({', '.join('?' * len(run_ids))})")
+            params.extend(run_ids)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def runs(self, project: str = None, start=None, end=None, feedstock=None, consultant: str = None,
+             run_ids=None, limit: int = None):
+        """Runs matching every filter given, newest first, as a DataFrame
+
+        `project` and `consultant` match case-insensitively. `start` and
+        `end` bound the run time; a date-only `end` includes that day.
+        `feedstock` is a name or list of names the run must have used,
+        matched after normalise_name as the volume files are.
+        """
+        where, params = self._where(project, start, end, feedstock, consultant, run_ids)
+        sql = f"SELECT * FROM runs{where} ORDER BY created_at DESC, run_id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return pandas.read_sql_query(sql, self._connection, params=params)
+
+    def feedstocks(self, project: str = None, start=None, end=None, feedstock=None, consultant: str = None,
+                   run_ids=None):
+        """Per-feedstock rows of the matching runs, with the project and run time alongside"""
+        where, params = self._where(project, start, end, feedstock, consultant, run_ids)
+        sql = (f"SELECT runs.project, runs.created_at, run_feedstocks.* FROM run_feedstocks "
+               f"JOIN runs USING (run_id){where} ORDER BY run_feedstocks.run_id, run_feedstocks.position")
+        with self._lock:
+            return pandas.read_sql_query(sql, self._connection, params=params)
+
+    def export(self, path: str, feedstocks_path: str = None, **filters):
+        """Write the matching runs (and optionally their feedstock rows) to CSV, or JSON records for .json
+
+        Returns the number of runs written.
+        """
+        runs = self.runs(**filters)
+        outputs = [(path, runs)]
+        if feedstocks_path is not None:
+            outputs.append((feedstocks_path, self.feedstocks(run_ids=runs['run_id'].tolist())))
+        for output_path, df in outputs:
+            write_table(df, output_path)
+        return len(runs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query and export the simulation run history")
+    parser.add_argument('--history', default=None, help="Run history database (default: the user data directory)")
+    parser.add_argument('--project', default=None, help="Project name")
+    parser.add_argument('--consultant', default=None, help="Consultant who ran it")
+    parser.add_argument('--start', default=None, help="Earliest run time, ISO date or timestamp")
+    parser.add_argument('--end', default=None, help="Latest run time, ISO date (inclusive) or timestamp")
+    parser.add_argument('--feedstock', action='append', default=None, help="Feedstock used (repeatable)")
+    parser.add_argument('--limit', type=int, default=None, help="Newest runs only")
+    parser.add_argument('-o', '--output', default=None, help="Export the runs to this .csv or .json file")
+    parser.add_argument('--feedstocks-output', default=None, help="Export their feedstock rows to this file")
+    args = parser.parse_args(argv)
+
+    filters = dict(project=args.project, consultant=args.consultant, start=args.start, end=args.end,
+                   feedstock=args.feedstock, limit=args.limit)
+    with RunHistory(args.history) as history:
+        if args.output:
+            count = history.export(args.output, args.feedstocks_output, **filters)
+            print(f"{count} runs -> {args.output}")
+        else:
+            runs = history.runs(**filters)
+            columns = ['run_id', 'created_at', 'project', 'consultant', 'feedstocks', 'power_output_mwh',
+                       'bulk_dm_percentage']
+            print(runs[columns].to_string(index=False) if len(runs) else "No matching runs")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from model import (Shit, FeedStockLibrary, KWH_PER_M3_METHANE, HOURS_PER_YEAR, NON_FEEDSTOCK_NAMES, TOTAL_FIELDS,
+                   _percentages)
+
+
+# Columns of the property matrix - multiplying a volume vector by it gives the plant totals
+PROPERTY_COLUMNS = TOTAL_FIELDS
+
+CHUNK_SIZE = 65536  # Scenarios per matrix product, keeps temporaries small
+
+
+@dataclass
+class ScenarioResults:
+    """Bulk properties and maximum yields for every scenario, one array entry per scenario"""
+    total_tpa: np.ndarray
+    total_dm: np.ndarray
+    total_vs: np.ndarray
+    bulk_dm_percentage: np.ndarray
+    feedstock_bulk_dm_percentage: np.ndarray
+    bulk_vs_percentage: np.ndarray
+    total_biogas: np.ndarray
+    total_biogas_per_hour: np.ndarray
+    total_methane: np.ndarray
+    total_methane_per_hour: np.ndarray
+    mean_methane_percentage: np.ndarray
+    power_output_mwh: np.ndarray
+    crop_methane_percentage: np.ndarray
+    residue_waste_methane_percentage: np.ndarray
+
+    def __len__(self):
+        return len(self.total_tpa)
+
+
+def property_matrix(library: FeedStockLibrary):
+    """Per-tonne contribution of each feedstock to every plant total, shape (feedstocks, PROPERTY_COLUMNS)"""
+    names = np.array(library.column('feedstock_name'), dtype=object)
+    # Blank lab values count as zero so they cannot poison other scenarios
+    dm = np.nan_to_num(library.column('dm'))
+    vs = dm * np.nan_to_num(library.column('vs_of_dm'))
+    biogas = vs * np.nan_to_num(library.column('biogas_yield_vs'))
+    methane = biogas * np.nan_to_num(library.column('percent_ch4'))
+    crop = library.category_mask('crop_residue_waste_other', 'C')
+    feedstock = ~np.isin(names, NON_FEEDSTOCK_NAMES)
+
+    return np.column_stack([
+        np.ones(len(library)),
+        dm,
+        vs,
+        biogas,
+        methane,
+        np.where(crop, methane, 0.0),
+        feedstock.astype(np.float64),
+        np.where(feedstock, dm, 0.0)
+    ])
+
+
+def evaluate_scenarios(shit: Shit, volumes):
+    """Evaluate a (scenarios x feedstocks) array of annual tonnages in one matrix product per chunk
+
+    Columns follow library row order. Volumes of zero or below are
+    treated as unused, matching Shit.bulk_properties.
+    """
+    volumes = np.atleast_2d(np.asarray(volumes, dtype=np.float64))
+    if volumes.shape[1] != len(shit.library):
+        raise ValueError(f"Expected {len(shit.library)} feedstock columns, got {volumes.shape[1]}")
+
+    matrix = property_matrix(shit.library)
+    totals = np.empty((volumes.shape[0], matrix.shape[1]))
+    for start in range(0, volumes.shape[0], CHUNK_SIZE):
+        chunk = volumes[start:start + CHUNK_SIZE]
+        np.matmul(np.maximum(chunk, 0.0), matrix, out=totals[start:start + CHUNK_SIZE])
+
+    return results_from_totals(totals)
+
+
+def results_from_totals(totals):
+    """Turn a (scenarios x PROPERTY_COLUMNS) array of totals into ScenarioResults"""
+    total_tpa, total_dm, total_vs, total_biogas, total_methane, crop_methane, feedstock_tpa, feedstock_dm = totals.T
+    return ScenarioResults(
+        total_tpa=total_tpa,
+        total_dm=total_dm,
+        total_vs=total_vs,
+        bulk_dm_percentage=_percentages(total_dm, total_tpa),
+        feedstock_bulk_dm_percentage=_percentages(feedstock_dm, feedstock_tpa),
+        bulk_vs_percentage=_percentages(total_vs, total_dm),
+        total_biogas=total_biogas,
+        total_biogas_per_hour=total_biogas / HOURS_PER_YEAR,
+        total_methane=total_methane,
+        total_methane_per_hour=total_methane / HOURS_PER_YEAR,
+        mean_methane_percentage=_percentages(total_methane, total_biogas),
+        power_output_mwh=total_methane * KWH_PER_M3_METHANE / 1000,
+        crop_methane_percentage=_percentages(crop_methane, total_methane),
+        residue_waste_methane_percentage=_percentages(total_methane - crop_methane, total_methane)
+    )
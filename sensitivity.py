@@ -0,0 +1,318 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+from model import Shit, ResultTable, KWH_PER_M3_METHANE, mass_balance
+from scenarios import results_from_totals
+from uncertainty import UNCERTAIN_FIELDS, CHUNK_ELEMENTS, _build_model
+
+
+# Per-feedstock inputs differentiated, and the plant outputs they drive
+INPUTS = ('annual_volume', 'dm', 'vs_of_dm', 'biogas_yield_vs', 'percent_ch4')
+OUTPUTS = ('total_biogas', 'total_methane', 'power_output_mwh', 'bulk_dm_percentage', 'crop_methane_percentage')
+SOBOL_OUTPUTS = ('power_output_mwh', 'bulk_dm_percentage')
+GROUPINGS = ('parameter', 'feedstock', 'field')
+BOOTSTRAP_RESAMPLES = 500
+INPUT_LABELS = {
+    'annual_volume': 'Annual Volume',
+    'dm': 'DM',
+    'vs_of_dm': 'VS of DM',
+    'biogas_yield_vs': 'Biogas Yield VS',
+    'percent_ch4': '% CH4'
+}
+
+
+@dataclass
+class Sensitivity:
+    """Exact derivatives of the plant outputs at the current feedstock values
+
+    jacobian[output, feedstock, input] is d output / d input for that
+    feedstock's input, in output units per input unit. Volume derivatives
+    of unused feedstocks are one-sided: the effect of starting to feed them.
+    """
+    names: np.ndarray
+    inputs: np.ndarray  # (feedstocks, INPUTS) values the derivatives were taken at
+    outputs: dict  # Output -> value
+    jacobian: np.ndarray  # (OUTPUTS, feedstocks, INPUTS)
+
+    def derivative(self, output: str, input: str):
+        """d output / d input for every feedstock"""
+        return self.jacobian[OUTPUTS.index(output), :, INPUTS.index(input)]
+
+    def elasticities(self):
+        """Relative sensitivities (d output / output) / (d input / input), same shape as the jacobian"""
+        base = np.array([self.outputs[name] for name in OUTPUTS])[:, None, None]
+        out = np.zeros_like(self.jacobian)
+        np.divide(self.jacobian * self.inputs[None], base, out=out, where=base != 0)
+        return out
+
+    def tornado(self, output: str, relative_change: float = 0.1, top: int = None):
+        """Feedstock inputs ranked by their effect on `output`, largest swing first
+
+        Low and High are the output with one input moved down and up by
+        `relative_change` of its value, to first order - exact for the gas
+        totals, which are linear in each input on its own.
+        """
+        effect = self.jacobian[OUTPUTS.index(output)] * self.inputs * relative_change
+        effect = np.nan_to_num(effect).ravel()
+        order = np.argsort(-np.abs(effect), kind='stable')
+        order = order[effect[order] != 0][:top]
+        feedstock, input = np.divmod(order, len(INPUTS))
+        base = self.outputs[output]
+        return ResultTable(f"Sensitivity of {output}", {
+            'Feedstock Name': self.names[feedstock],
+            'Input': np.array([INPUT_LABELS[name] for name in INPUTS], dtype=object)[input],
+            'Value': self.inputs[feedstock, input],
+            'Low': base - effect[order],
+            'High': base + effect[order],
+            'Swing': 2 * np.abs(effect[order])
+        }, float_format='%.4g')
+
+
+def sensitivity(shit: Shit):
+    """Analytic jacobian of the plant outputs to every feedstock's volume and lab values
+
+    The mass balance is a product of the inputs per feedstock, summed over
+    feedstocks and then taken as ratios, so every derivative follows from
+    the per-feedstock partial products in one vectorized pass - no reruns.
+    Blank lab values on a used feedstock give NaN derivatives, as they give
+    NaN totals in mass_balance.
+    """
+    lib = shit.library
+    mb = mass_balance(lib)
+    volume = mb.annual_volume
+    dm, vs, y, ch4 = (lib.column(name) for name in INPUTS[1:])
+    used = mb.active
+    crop = lib.category_mask('crop_residue_waste_other', 'C')
+
+    # Biogas per feedstock is volume * dm * vs * y; each partial drops one factor.
+    # The volume partial is taken for every row, so unused feedstocks show what adding them would do.
+    with np.errstate(invalid='ignore'):
+        biogas = np.column_stack([
+            dm * vs * y,
+            np.where(used, volume * vs * y, 0.0),
+            np.where(used, volume * dm * y, 0.0),
+            np.where(used, volume * dm * vs, 0.0),
+            np.zeros(len(lib))
+        ])
+        methane = biogas * ch4[:, None]
+        methane[:, 4] = np.where(used, mb.biogas_volume, 0.0)
+
+    total_tpa, total_dm, total_methane = mb.total_tpa, mb.total_dm, mb.total_methane
+    bulk_dm = np.zeros_like(biogas)
+    if total_tpa > 0:
+        bulk_dm[:, 0] = 100 * (dm - total_dm / total_tpa) / total_tpa
+        bulk_dm[:, 1] = np.where(used, 100 * volume / total_tpa, 0.0)
+
+    # d(crop / total) = (crop_i - share) * d methane_i / total
+    crop_share = np.zeros_like(biogas)
+    if total_methane > 0:
+        share = mb.crop_methane / total_methane
+        crop_share = 100 * (crop.astype(np.float64) - share)[:, None] * methane / total_methane
+
+    jacobian = np.stack([biogas, methane, methane * KWH_PER_M3_METHANE / 1000, bulk_dm, crop_share])
+    return Sensitivity(
+        names=mb.names,
+        inputs=np.column_stack([lib.column(name) for name in INPUTS]),
+        outputs={name: float(getattr(mb, name)) for name in OUTPUTS},
+        jacobian=jacobian
+    )
+
+
+@dataclass
+class SobolResults:
+    """First-order and total Sobol indices, arrays of shape (parameters, outputs)
+
+    The confidence intervals have a leading (lower, upper) axis.
+    """
+    names: list  # Parameter or group names
+    outputs: tuple
+    first: np.ndarray
+    total: np.ndarray
+    first_ci: np.ndarray
+    total_ci: np.ndarray
+    samples: int  # Base samples N; the model was run N * (parameters + 2) times
+    confidence: float
+    seed: int
+
+    def table(self, output: str):
+        """Indices for one output as a ResultTable, largest total index first"""
+        i = self.outputs.index(output)
+        order = np.argsort(-self.total[:, i], kind='stable')
+        return ResultTable(f"Sobol Indices of {output}", {
+            'Parameter': np.asarray(self.names, dtype=object)[order],
+            'First Order': self.first[order, i],
+            'First Order Low': self.first_ci[0, order, i],
+            'First Order High': self.first_ci[1, order, i],
+            'Total': self.total[order, i],
+            'Total Low': self.total_ci[0, order, i],
+            'Total High': self.total_ci[1, order, i]
+        }, float_format='%.4f')
+
+
+# Positions in the scenario totals of the values that vary with the lab properties
+_VARYING = [1, 2, 3, 4, 5, 7]
+
+
+def _contributions(x, volume, crop, feedstock):
+    """Per-feedstock contributions to the varying totals; x is (..., fields, feedstocks) -> (..., 6, feedstocks)"""
+    dm, vs_of_dm, biogas_yield_vs, percent_ch4 = np.moveaxis(x, -2, 0)
+    dm_input = dm * volume
+    vs_input = dm_input * vs_of_dm
+    biogas = vs_input * biogas_yield_vs
+    methane = biogas * percent_ch4
+    return np.stack([dm_input, vs_input, biogas, methane, methane * crop, dm_input * feedstock], axis=-2)
+
+
+def _outputs(model, varying, outputs):
+    """(..., 6) varying totals -> (..., outputs)"""
+    shape = varying.shape[:-1]
+    totals = np.empty((int(np.prod(shape)), 8))
+    totals[:, 0] = model.volume.sum()
+    totals[:, 6] = model.volume[model.feedstock].sum()
+    totals[:, _VARYING] = varying.reshape(-1, 6)
+    results = results_from_totals(totals)
+    return np.column_stack([getattr(results, name) for name in outputs]).reshape(shape + (len(outputs),))
+
+
+def _transform(model, u):
+    """Uniforms (n, fields * feedstocks) -> clipped normal lab values (n, fields, feedstocks)"""
+    u = np.clip(u.reshape(len(u), *model.means.shape), 1e-12, 1 - 1e-12)
+    return np.clip(model.means + model.sds * ndtri(u), 0.0, model.upper)
+
+
+def _saltelli_chunk(args):
+    """Model outputs at rows start:start + n of the A, B and A_B(i) matrices
+
+    Swapping one parameter or one feedstock from B into A only changes that
+    feedstock's contribution, so A_B(i) is A's totals plus one delta rather
+    than a full evaluation.
+    """
+    model, group_by, groups, outputs, seed, start, n = args
+    params = model.means.size
+    sampler = qmc.Sobol(2 * params, scramble=True, seed=seed)
+    if start:
+        sampler.fast_forward(start)
+    u = sampler.random(n)
+    a, b = _transform(model, u[:, :params]), _transform(model, u[:, params:])
+    ca = _contributions(a, model.volume, model.crop, model.feedstock)
+    cb = _contributions(b, model.volume, model.crop, model.feedstock)
+    ta, tb = ca.sum(axis=-1), cb.sum(axis=-1)
+
+    if group_by == 'parameter':
+        fields, rows = groups
+        x = a[:, :, rows]
+        x[:, fields, np.arange(len(rows))] = b[:, fields, rows]
+        swapped = _contributions(x, model.volume[rows], model.crop[rows], model.feedstock[rows])
+        tab = np.moveaxis(ta[:, :, None] - ca[:, :, rows] + swapped, 1, 2)
+    elif group_by == 'feedstock':
+        tab = np.moveaxis(ta[:, :, None] - ca[:, :, groups] + cb[:, :, groups], 1, 2)
+    else:
+        x = np.repeat(a[:, None], len(groups), axis=1)
+        x[:, np.arange(len(groups)), groups] = b[:, groups]
+        tab = _contributions(x, model.volume, model.crop, model.feedstock).sum(axis=-1)
+    return _outputs(model, ta, outputs), _outputs(model, tb, outputs), _outputs(model, tab, outputs)
+
+
+def _sobol_estimates(weights, f_a, f_b, first_terms, total_terms):
+    """Indices for each row of bootstrap `weights` (resamples, N), which sum to N per row"""
+    n = f_a.shape[0]
+    mean = (weights @ f_a + weights @ f_b) / (2 * n)
+    variance = (weights @ (f_a ** 2) + weights @ (f_b ** 2)) / (2 * n) - mean ** 2
+    variance = np.tile(variance, (1, first_terms.shape[1] // f_a.shape[1]))
+    first = np.zeros((len(weights), first_terms.shape[1]))
+    total = np.zeros_like(first)
+    np.divide(weights @ first_terms / n, variance, out=first, where=variance > 0)
+    np.divide(weights @ total_terms / n, variance, out=total, where=variance > 0)
+    return first, total
+
+
+def _groups(model, names, group_by):
+    """(group spec passed to the workers, group names) for the parameters with any uncertainty"""
+    uncertain = model.sds > 0
+    labels = {'dm': 'DM', 'vs_of_dm': 'VS of DM', 'biogas_yield_vs': 'Biogas Yield VS', 'percent_ch4': '% CH4'}
+    if group_by == 'parameter':
+        fields, rows = np.nonzero(uncertain)
+        return (fields, rows), [f"{names[j]} {labels[UNCERTAIN_FIELDS[k]]}" for k, j in zip(fields, rows)]
+    if group_by == 'feedstock':
+        rows = np.flatnonzero(uncertain.any(axis=0))
+        return rows, [names[j] for j in rows]
+    if group_by == 'field':
+        fields = np.flatnonzero(uncertain.any(axis=1))
+        return fields, [labels[UNCERTAIN_FIELDS[k]] for k in fields]
+    raise ValueError(f"group_by must be one of {GROUPINGS}, not {group_by!r}")
+
+
+def sobol(shit: Shit, samples=4096, relative_sd=None, outputs=SOBOL_OUTPUTS, group_by='parameter',
+          resamples=BOOTSTRAP_RESAMPLES, confidence=0.95, seed=0, workers=None):
+    """Variance-based Sobol first-order and total indices of the lab property uncertainties
+
+    The lab values of every used feedstock are distributed as in
+    monte_carlo. Saltelli's scheme evaluates N scrambled Sobol' points for
+    each of the A and B matrices plus one A_B(i) matrix per parameter, in
+    chunks of rows across a process pool. The indices use the Saltelli
+    (2010) first-order and Jansen total estimators. `group_by` gives one
+    index per parameter, per feedstock (all its properties together) or
+    per field (that property across all feedstocks). Bootstrap intervals
+    resample the N rows `resamples` times. `samples` is rounded up to a
+    power of two, and results are the same for any number of workers.
+    """
+    model = _build_model(shit, relative_sd)
+    names = np.array(shit.library.column('feedstock_name'), dtype=object)[shit.library.column('annual_volume') > 0]
+    groups, group_names = _groups(model, names, group_by)
+    outputs = tuple(outputs)
+
+    n = 1 << max(0, int(np.ceil(np.log2(max(samples, 1)))))
+    rows = CHUNK_ELEMENTS // max(1, 6 * max(len(group_names), model.means.size))
+    chunk = min(n, 1 << max(0, int(np.log2(max(rows, 1)))))  # Powers of two keep the Sobol' balance
+    tasks = [(model, group_by, groups, outputs, seed, start, chunk) for start in range(0, n, chunk)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        chunks = [_saltelli_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_saltelli_chunk, tasks))
+    f_a, f_b, f_ab = (np.concatenate(parts) for parts in zip(*chunks))
+
+    # Centring leaves the indices unchanged but cuts the variance of the first-order estimator
+    centre = (f_a.mean(axis=0) + f_b.mean(axis=0)) / 2
+    f_a, f_b, f_ab = f_a - centre, f_b - centre, f_ab - centre
+
+    # One column per (parameter, output)
+    first_terms = (f_b[:, None] * (f_ab - f_a[:, None])).reshape(n, -1)
+    total_terms = (0.5 * (f_a[:, None] - f_ab) ** 2).reshape(n, -1)
+    shape = (len(group_names), len(outputs))
+    first, total = (estimate.reshape(shape) for estimate in
+                    _sobol_estimates(np.ones((1, n)), f_a, f_b, first_terms, total_terms))
+
+    rng = np.random.default_rng(seed)
+    boot_first, boot_total = [], []
+    batch = max(1, CHUNK_ELEMENTS // max(n, first_terms.shape[1]))
+    for start in range(0, resamples, batch):
+        weights = rng.multinomial(n, np.full(n, 1.0 / n), size=min(batch, resamples - start)).astype(np.float64)
+        resampled = _sobol_estimates(weights, f_a, f_b, first_terms, total_terms)
+        boot_first.append(resampled[0])
+        boot_total.append(resampled[1])
+    tails = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+    if resamples:
+        first_ci = np.percentile(np.concatenate(boot_first), tails, axis=0).reshape((2,) + shape)
+        total_ci = np.percentile(np.concatenate(boot_total), tails, axis=0).reshape((2,) + shape)
+    else:
+        first_ci = total_ci = np.full((2,) + shape, np.nan)
+
+    return SobolResults(
+        names=group_names,
+        outputs=outputs,
+        first=first,
+        total=total,
+        first_ci=first_ci,
+        total_ci=total_ci,
+        samples=n,
+        confidence=confidence,
+        seed=seed
+    )
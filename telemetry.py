@@ -0,0 +1,329 @@
+import argparse
+import io
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas
+
+from model import feed, Shit, DEFAULT_RATE_CONSTANT, MAX_BLOCK_DECAY, normalise_name, normalise_header, feedstock_index
+from scenarios import PROPERTY_COLUMNS, property_matrix
+
+
+NS_PER_DAY = 86400 * 10 ** 9
+BLOCK_SIZE = 1 << 23  # Bytes of telemetry parsed and processed per batch
+
+# Accepted column headers (after normalise_header) for each event field
+COLUMN_NAMES = {
+    'timestamp': ('timestamp', 'time', 'datetime'),
+    'feedstocks': ('feedstock', 'feedstock name'),
+    'tonnes': ('tonnes', 'tonnage', 'tpa'),
+    'biogas': ('biogas', 'biogas m3', 'biogas (m3)'),
+    'methane': ('methane', 'methane m3', 'methane (m3)')
+}
+
+
+@dataclass
+class TelemetryWindow:
+    """Gas totals for one fixed time window of the telemetry stream (m3)"""
+    start: pandas.Timestamp
+    end: pandas.Timestamp
+    events: int
+    tonnes: float
+    unknown_tonnes: float  # Fed tonnes whose feedstock is not in the library
+    expected_biogas: float  # Mass balance maximum yield of the tonnes fed in the window
+    expected_methane: float
+    predicted_biogas: float  # First-order release of the fed potential during the window
+    predicted_methane: float
+    metered_biogas: float
+    metered_methane: float
+
+    @property
+    def biogas_ratio(self):
+        """Metered / predicted biogas"""
+        return self.metered_biogas / self.predicted_biogas if self.predicted_biogas > 0 else np.nan
+
+    @property
+    def methane_ratio(self):
+        return self.metered_methane / self.predicted_methane if self.predicted_methane > 0 else np.nan
+
+
+def _last_valid(values, initial):
+    """For each row, the last non-NaN value at or before it per column, starting from `initial`"""
+    values = np.vstack([initial, values])
+    valid = ~np.isnan(values)
+    valid[0] = True
+    index = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    return np.take_along_axis(values, index, axis=0)
+
+
+class TelemetryStream:
+    """Incremental mass balance over a stream of timestamped feed and gas-meter events
+
+    Each feed event adds tonnes x the feedstock's maximum biogas and methane
+    yield (DM -> VS -> Biogas Yield VS -> % CH4, as in the mass balance) to a
+    digester pool that releases gas with first-order kinetics at
+    `rate_constant` (1/day). Events are processed a batch at a time: the pool
+    recurrence is solved for the whole batch in closed form, and the totals
+    are folded into fixed windows of `window` length. Only the pool, the open
+    window and the name lookup are kept, so memory does not grow with the
+    length of the history.
+
+    Events are expected in time order; a late event is counted at the time of
+    the latest event before it.
+    """
+
+    def __init__(self, shit: Shit, window='1h', rate_constant=DEFAULT_RATE_CONSTANT,
+                 cumulative_meter=False):
+        lib = shit.library
+        per_tonne = property_matrix(lib)
+        # Per-tonne yields, with a trailing zero row for unknown feedstocks
+        self.biogas_per_tonne = np.append(per_tonne[:, PROPERTY_COLUMNS.index('total_biogas')], 0.0)
+        self.methane_per_tonne = np.append(per_tonne[:, PROPERTY_COLUMNS.index('total_methane')], 0.0)
+        self.index = {key: rows[-1] for key, rows in feedstock_index(lib).items()}
+        self.unknown = len(lib)
+        self._rows_by_name = {}  # Raw feedstock text -> library row, grows with distinct names only
+
+        self.window_ns = pandas.Timedelta(window).value
+        self.rate_constant = float(rate_constant)
+        self.cumulative_meter = cumulative_meter  # Meter columns are running totalisers, not interval volumes
+        self.pool = np.zeros(2)  # Unreleased biogas, methane potential (m3) at time_ns
+        self.time_ns = None  # Time of the last event
+        self.window = None  # Index of the open window
+        self.totals = np.zeros(9)  # Open window sums, in TelemetryWindow field order
+        self.last_meter = np.full(2, np.nan)
+        self.events = 0
+
+    def _rows(self, names):
+        """Library row for every event's feedstock name, via one lookup per distinct name"""
+        if isinstance(names, pandas.Categorical):
+            codes, uniques = names.codes, names.categories
+        else:
+            codes, uniques = pandas.factorize(np.asarray(names, dtype=object), use_na_sentinel=True)
+        lookup = np.empty(len(uniques) + 1, dtype=np.int64)
+        for i, name in enumerate(uniques):
+            row = self._rows_by_name.get(name)
+            if row is None:
+                row = self._rows_by_name[name] = self.index.get(normalise_name(name), self.unknown)
+            lookup[i] = row
+        lookup[-1] = self.unknown  # The missing-value code -1 picks this entry
+        return lookup[codes]
+
+    def _window(self):
+        start = pandas.Timestamp(self.window * self.window_ns)
+        return TelemetryWindow(
+            start,
+            start + pandas.Timedelta(self.window_ns),
+            int(self.totals[0]),
+            *map(float, self.totals[1:])
+        )
+
+    def _release(self, times_ns, adds):
+        """Gas released between consecutive events, (events x 2)
+
+        The pool follows P_i = P_(i-1) exp(-k dt_i) + add_i. Within a block
+        it is solved in closed form from the block's first event; blocks span
+        at most MAX_BLOCK_DECAY so exp(s) stays in floating point range.
+        """
+        n = len(times_ns)
+        released = np.empty((n, 2))
+        decay = self.rate_constant * ((times_ns - self.time_ns) / NS_PER_DAY)
+        reference = 0.0  # Decay coordinate of self.pool
+        start = 0
+        while start < n:
+            stop = start + int(np.searchsorted(decay[start:], decay[start] + MAX_BLOCK_DECAY, side='right'))
+            base = self.pool * np.exp(-(decay[start] - reference))
+            s = decay[start:stop, None] - decay[start]
+            block = adds[start:stop]
+            pool = np.exp(-s) * (base + np.cumsum(block * np.exp(s), axis=0))
+            # Released up to each event is everything that went in minus what is left
+            cumulative = np.cumsum(block, axis=0) - pool
+            released[start:stop] = np.diff(cumulative, axis=0, prepend=-self.pool[None, :])
+            self.pool, reference, start = pool[-1], decay[stop - 1], stop
+        return released
+
+    def process(self, times_ns, feedstocks=None, tonnes=None, biogas=None, methane=None):
+        """Add one batch of events and return the TelemetryWindows it closed
+
+        `times_ns` are int64 epoch nanoseconds. Feed columns may be None, or
+        hold NaN / None on meter-only events, and likewise for the meters.
+        """
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        n = len(times_ns)
+        if n == 0:
+            return []
+        if self.time_ns is None:
+            self.time_ns = int(times_ns[0])
+            self.window = int(times_ns[0] // self.window_ns)
+        times_ns = np.maximum.accumulate(np.maximum(times_ns, self.time_ns))
+
+        tonnes = np.zeros(n) if tonnes is None else np.nan_to_num(np.asarray(tonnes, dtype=np.float64))
+        rows = np.full(n, self.unknown) if feedstocks is None else self._rows(feedstocks)
+        expected_biogas = tonnes * self.biogas_per_tonne[rows]
+        expected_methane = tonnes * self.methane_per_tonne[rows]
+        released = self._release(times_ns, np.column_stack([expected_biogas, expected_methane]))
+
+        meters = np.column_stack([
+            np.full(n, np.nan) if values is None else np.asarray(values, dtype=np.float64)
+            for values in (biogas, methane)
+        ])
+        if self.cumulative_meter:
+            previous = _last_valid(meters, self.last_meter)
+            self.last_meter = previous[-1]
+            meters = meters - previous[:-1]  # Interval volume since the last reading
+        meters = np.nan_to_num(meters)
+
+        self.time_ns = int(times_ns[-1])
+        self.events += n
+
+        # Fold every event into its window, one reduction per window touched by the batch
+        values = np.column_stack([
+            np.ones(n), tonnes, np.where(rows == self.unknown, tonnes, 0.0),
+            expected_biogas, expected_methane, released, meters
+        ])
+        windows = times_ns // self.window_ns
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(windows)) + 1])
+        sums = np.add.reduceat(values, starts, axis=0)
+
+        closed = []
+        for first, window_sums in zip(starts, sums):
+            index = int(windows[first])
+            if index != self.window:
+                closed.append(self._window())
+                self.window = index
+                self.totals = np.zeros_like(self.totals)
+            self.totals += window_sums
+        return closed
+
+    def flush(self):
+        """The open window, e.g. at the end of a file"""
+        return None if self.window is None else self._window()
+
+
+def _tail_blocks(path, block_size=BLOCK_SIZE, follow=False, poll_interval=1.0):
+    """Yield blocks of complete lines (bytes) from a file, optionally following it as it grows
+
+    A partial last line is held back until it is completed. If the file
+    shrinks (rotated or truncated) it is reopened from the start.
+    """
+    f = open(path, 'rb')
+    try:
+        remainder = b''
+        while True:
+            block = f.read(block_size)
+            if block:
+                block = remainder + block
+                end = block.rfind(b'\n') + 1
+                remainder = block[end:]
+                if end:
+                    yield block[:end]
+                continue
+            if not follow:
+                if remainder.strip():
+                    yield remainder
+                return
+            if os.stat(path).st_size < f.tell():
+                f.close()
+                f = open(path, 'rb')
+                remainder = b''
+            time.sleep(poll_interval)
+    finally:
+        f.close()
+
+
+def _event_columns(df: pandas.DataFrame):
+    """Map a parsed batch to the TelemetryStream.process arguments"""
+    headers = {normalise_header(column): column for column in df.columns}
+    columns = {}
+    for field, names in COLUMN_NAMES.items():
+        column = next((headers[name] for name in names if name in headers), None)
+        columns[field] = None if column is None else df[column]
+    if columns['timestamp'] is None:
+        raise ValueError(f"Telemetry has no timestamp column (have {list(df.columns)})")
+
+    stamps = columns.pop('timestamp')
+    if pandas.api.types.is_numeric_dtype(stamps):
+        times_ns = (stamps.to_numpy(dtype=np.float64) * 1e9).astype(np.int64)  # Epoch seconds
+    else:
+        stamps = pandas.to_datetime(stamps, format='ISO8601', utc=True)
+        times_ns = stamps.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    for field in ('tonnes', 'biogas', 'methane'):
+        if columns[field] is not None:
+            columns[field] = pandas.to_numeric(columns[field], errors='coerce').to_numpy(dtype=np.float64)
+    if columns['feedstocks'] is not None:
+        columns['feedstocks'] = columns['feedstocks'].array  # Categorical from read_csv, else object
+    return times_ns, columns
+
+
+def _csv_dtypes(header: bytes):
+    """read_csv dtypes for the known columns of a CSV header line"""
+    dtypes = {}
+    for column in pandas.read_csv(io.BytesIO(header), encoding='utf-8-sig').columns:
+        name = normalise_header(column)
+        if name in COLUMN_NAMES['feedstocks']:
+            dtypes[column] = 'category'  # Parsed straight to codes, one name lookup per category
+        elif any(name in COLUMN_NAMES[field] for field in ('tonnes', 'biogas', 'methane')):
+            dtypes[column] = np.float64
+    return dtypes
+
+
+def read_events(path, block_size=BLOCK_SIZE, follow=False, poll_interval=1.0, format=None):
+    """Yield (times_ns, columns) batches from a CSV or line-delimited JSON telemetry file
+
+    CSV needs a header row; NDJSON has one object per line. `format` is
+    'csv' or 'ndjson', by default taken from the file extension. Each batch
+    is one block of about `block_size` bytes, so memory stays bounded.
+    """
+    if format is None:
+        format = 'ndjson' if path.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+    header = None
+    for block in _tail_blocks(path, block_size, follow, poll_interval):
+        if format == 'csv':
+            if header is None:
+                end = block.find(b'\n') + 1
+                header, block = block[:end], block[end:]
+                dtypes = _csv_dtypes(header)
+                if not block.strip():
+                    continue
+            df = pandas.read_csv(io.BytesIO(header + block), encoding='utf-8-sig', dtype=dtypes)
+        else:
+            df = pandas.read_json(io.BytesIO(block), lines=True, dtype=False)
+        yield _event_columns(df)
+
+
+def stream_telemetry(path, shit: Shit, window='1h', follow=False, block_size=BLOCK_SIZE,
+                     poll_interval=1.0, format=None, **options):
+    """Yield a TelemetryWindow for every window of a telemetry file as it closes
+
+    With `follow` the file is tailed like `tail -f` and the generator runs
+    until closed; otherwise the last, still open window is yielded at the end
+    of the file. Other options go to TelemetryStream.
+    """
+    stream = TelemetryStream(shit, window, **options)
+    for times_ns, columns in read_events(path, block_size, follow, poll_interval, format):
+        yield from stream.process(times_ns, **columns)
+    last = stream.flush()
+    if last is not None:
+        yield last
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predicted versus metered gas from a plant telemetry log")
+    parser.add_argument('events', help="Telemetry CSV or NDJSON file")
+    parser.add_argument('-f', '--feedstocks', default='Feedstocks_Training.csv', help="Feedstock library CSV")
+    parser.add_argument('--window', default='1h', help="Window length, e.g. 15min, 1h, 1D")
+    parser.add_argument('--follow', action='store_true', help="Keep reading as the file grows")
+    parser.add_argument('--cumulative-meter', action='store_true', help="Meter columns are running totals")
+    args = parser.parse_args(argv)
+
+    print(f"{'Window start':<20} {'Tonnes':>10} {'Expected':>12} {'Predicted':>12} {'Metered':>12} {'Ratio':>7}")
+    for w in stream_telemetry(args.events, feed(args.feedstocks), args.window, args.follow,
+                              cumulative_meter=args.cumulative_meter):
+        print(f"{w.start:%Y-%m-%d %H:%M}     {w.tonnes:>10.2f} {w.expected_biogas:>12.1f} "
+              f"{w.predicted_biogas:>12.1f} {w.metered_biogas:>12.1f} {w.biogas_ratio:>7.3f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import pandas
+import pytest
+
+from batch import run_batch
+from run_history import RunHistory
+
+
+def test_project_details_cannot_overwrite_the_run_outcome(tmp_path, feedstocks_path, volumes_path):
+    projects = tmp_path / 'projects'
+    for name, volumes in (('alpha', True), ('beta', False)):
+        project = projects / name
+        project.mkdir(parents=True)
+        (project / 'Project Details.csv').write_text(f"Project Name,status,error\n{name},draft,none\n")
+        if volumes:
+            (project / 'feedstock volumes.csv').write_bytes(open(volumes_path, 'rb').read())
+
+    output = tmp_path / 'results.csv'
+    results = run_batch(str(projects), feedstocks_path, str(output), workers=1, cache_dir=str(tmp_path / 'cache'))
+
+    assert results['run_status'].tolist() == ['ok', 'error']
+    assert results['run_error'].iloc[1].startswith('FileNotFoundError')
+    assert results['status'].tolist() == ['draft', 'draft']
+    assert pandas.read_csv(output)['run_status'].tolist() == ['ok', 'error']
+
+
+def test_batch_runs_are_appended_to_the_history(tmp_path, feedstocks_path, volumes_path):
+    project = tmp_path / 'projects' / 'alpha'
+    project.mkdir(parents=True)
+    (project / 'Project Details.csv').write_text("Project Name,Ran By\nAlpha,JS\n")
+    (project / 'feedstock volumes.csv').write_bytes(open(volumes_path, 'rb').read())
+    history_path = str(tmp_path / 'history.sqlite')
+
+    results = run_batch(str(tmp_path / 'projects'), feedstocks_path, str(tmp_path / 'results.csv'), workers=1,
+                        cache_dir=str(tmp_path / 'cache'), history_path=history_path)
+
+    with RunHistory(history_path) as history:
+        runs = history.runs()
+    assert runs['project'].tolist() == ['Alpha']
+    assert runs['source'].tolist() == ['batch']
+    assert runs['total_tpa'][0] == pytest.approx(results['total_tpa'][0])
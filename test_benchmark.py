@@ -0,0 +1,61 @@
+import pytest
+
+import benchmark
+from benchmark import MAX_TOLERANCE, SUB_MS_TOLERANCE, THROUGHPUT_TOLERANCE, case_tolerance, compare
+
+
+def result(case, seconds, spread=0.0, peak=50 << 20, size=1000):
+    return {'case': case, 'size': size, 'unit': 'feedstocks', 'seconds': seconds, 'spread': spread,
+            'throughput': size / seconds, 'peak_bytes': peak, 'repeats': 7}
+
+
+def document(*results):
+    return {'results': list(results)}
+
+
+def test_compare_flags_only_changes_beyond_each_case_tolerance():
+    baseline = document(result('steady', 0.1), result('slower', 0.1), result('noisy', 0.1, spread=0.15),
+                        result('hungry', 0.1), result('dropped', 0.1))
+    current = document(result('steady', 0.105), result('slower', 0.125), result('noisy', 0.125, spread=0.15),
+                       result('hungry', 0.1, peak=80 << 20), result('added', 0.1))
+
+    rows = {row[0]: row for row in compare(baseline, current)}
+
+    assert set(rows) == {'steady', 'slower', 'noisy', 'hungry'}  # Only cases in both runs
+    assert rows['steady'][5] == []
+    assert rows['slower'][5] == ['throughput']
+    assert rows['slower'][2] == pytest.approx(0.8)
+    assert rows['noisy'][5] == []  # A 20% drop is inside twice its 15% spread
+    assert rows['noisy'][4] == pytest.approx(0.30)
+    assert rows['hungry'][5] == ['memory']
+    assert rows['hungry'][3] == pytest.approx(1.6)
+
+
+def test_small_memory_growth_is_noise():
+    rows = compare(document(result('tiny', 0.1, peak=1000)), document(result('tiny', 0.1, peak=5000)))
+    assert rows[0][5] == []
+
+
+def test_case_tolerance_widens_for_noise_and_fast_cases_but_is_capped():
+    assert case_tolerance(result('a', 0.1), result('a', 0.1)) == THROUGHPUT_TOLERANCE
+    assert case_tolerance(result('a', 0.1), result('a', 0.1, spread=0.2)) == pytest.approx(0.4)
+    assert case_tolerance(result('a', 1e-4), result('a', 1e-4)) == SUB_MS_TOLERANCE
+    assert case_tolerance(result('a', 0.1, spread=0.9), result('a', 0.1)) == MAX_TOLERANCE
+    # Results saved before the spread was recorded count as noiseless
+    old = result('a', 0.1)
+    del old['spread']
+    assert case_tolerance(old, result('a', 0.1)) == THROUGHPUT_TOLERANCE
+
+
+def test_run_benchmarks_records_median_and_spread(monkeypatch):
+    monkeypatch.setattr(benchmark, 'MIN_TIME', 0.0)
+    monkeypatch.setattr(benchmark, 'MIN_REPEATS', 3)
+
+    document = benchmark.run_benchmarks(feedstock_sizes=(10,), scenario_sizes=(1,),
+                                        cases=['feed_cached', 'evaluate_scenarios'], log=None)
+
+    assert [(r['case'], r['size'], r['repeats']) for r in document['results']] == [
+        ('feed_cached', 10, 3), ('evaluate_scenarios', 1, 3)
+    ]
+    assert all(r['seconds'] > 0 and r['spread'] >= 0 for r in document['results'])
+    assert all(row[5] == [] for row in compare(document, document))
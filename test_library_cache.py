@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+
+from library_cache import load_library
+from model import load_feedstock_library
+
+
+def test_cached_library_matches_a_fresh_parse(tmp_path, feedstocks_path):
+    cache_dir = str(tmp_path / 'cache')
+    load_library(feedstocks_path, cache_dir)
+    cached = load_library(feedstocks_path, cache_dir)
+    parsed = load_feedstock_library(feedstocks_path)
+
+    assert isinstance(cached.column('dm'), np.memmap)
+    assert cached.column('feedstock_name') == parsed.column('feedstock_name')
+    np.testing.assert_array_equal(cached.column('biogas_yield_vs'), parsed.column('biogas_yield_vs'))
+    assert list(cached.column('l_s')) == list(parsed.column('l_s'))
+
+
+def test_edited_csv_rebuilds_the_entry(tmp_path, feedstocks_path):
+    csv = tmp_path / 'feedstocks.csv'
+    text = open(feedstocks_path, encoding='utf-8-sig').read()
+    csv.write_text(text, encoding='utf-8')
+    cache_dir = str(tmp_path / 'cache')
+    names = load_library(str(csv), cache_dir).column('feedstock_name')
+
+    csv.write_text(text.replace(names[0], 'Renamed', 1), encoding='utf-8')
+    os.utime(csv, ns=(0, 0))  # Make sure the stamp differs even on coarse clocks
+
+    assert load_library(str(csv), cache_dir).column('feedstock_name')[0] == 'Renamed'
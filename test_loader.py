@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from model import FeedstockDataError, load_feedstock_library
+
+
+HEADER = 'Source,Feedstock Name,DM,VS of DM,Biogas Yield VS,% CH4,Density,Total N'
+UNITS = 'Unit,Name,%,%,(NM3/Tonne VS),%,(T/M3),(g/T Input)'
+
+
+def write_csv(tmp_path, *rows):
+    path = tmp_path / 'feedstocks.csv'
+    path.write_text('\n'.join(rows) + '\n')
+    return str(path)
+
+
+def test_units_row_is_kept_and_skipped(tmp_path):
+    library = load_feedstock_library(write_csv(tmp_path, HEADER, UNITS, 'Farm,Slurry,0.08,0.8,350,0.6,1,3'))
+
+    assert len(library) == 1
+    assert library.units['biogas_yield_vs'] == '(NM3/Tonne VS)'
+    assert library.units['total_n'] == '(g/T Input)'
+    assert library.column('dm')[0] == 0.08
+
+
+def test_headers_match_after_normalising_case_and_spacing(tmp_path):
+    header = 'source, FEEDSTOCK  NAME ,dm,Vs Of Dm,Biogas Yield VS ,% ch4,Density,Total N'
+    library = load_feedstock_library(write_csv(tmp_path, header, 'Farm,Slurry,0.08,0.8,350,0.6,,3'))
+
+    assert library.units == {}
+    assert library.column('feedstock_name') == ['Slurry']
+    assert np.isnan(library.column('density')[0])  # Blank numeric cells load as NaN
+
+
+def test_every_bad_cell_is_reported_at_once(tmp_path):
+    path = write_csv(
+        tmp_path, HEADER, UNITS,
+        'Farm,Slurry,0.08,0.8,350,0.6,1,3',
+        'Farm,,0.2,0.9,400,0.5,1,2',
+        'Farm,Silage,abc,1.2,-5,0.5,1,2',
+        '',
+        'Farm,Straw,0.9,0.9,300,1.5,x,2'
+    )
+    with pytest.raises(FeedstockDataError) as raised:
+        load_feedstock_library(path)
+
+    # CSV lines count the header and units rows; blank lines are skipped but still counted
+    assert sorted((line, column, problem) for line, column, value, problem in raised.value.errors) == [
+        (4, 'Feedstock Name', 'is required'),
+        (5, 'Biogas Yield VS', 'is below 0'),
+        (5, 'DM', 'is not a number'),
+        (5, 'VS of DM', 'is above 1'),
+        (7, '% CH4', 'is above 1'),
+        (7, 'Density', 'is not a number')
+    ]
+    assert 'line 5' in str(raised.value)
+
+
+def test_missing_required_columns_are_reported_together(tmp_path):
+    path = write_csv(tmp_path, 'Source,Feedstock Name,DM,Density', 'Farm,Slurry,0.08,1')
+    with pytest.raises(FeedstockDataError) as raised:
+        load_feedstock_library(path)
+
+    assert [(column, problem) for line, column, value, problem in raised.value.errors] == [
+        ('vs of dm', 'column is missing'),
+        ('biogas yield vs', 'column is missing'),
+        ('% ch4', 'column is missing')
+    ]
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from model import FeedStock, feed, mass_balance
+
+
+def new_feedstock(name='New', annual_volume=1000.0):
+    return FeedStock('Test', name, 0.2, 0.8, 400, 0.55, 'C', 1.0, 'L', 0.7, 1, 1, 1, 1, 1, 1, 1, 1, annual_volume)
+
+
+def test_deleting_content_removes_the_library_row(shit):
+    rows = len(shit.library)
+    recirc = shit.content['Recirc'].annual_volume
+    total = shit.library.column('annual_volume').sum()
+
+    del shit.content['Recirc']
+
+    assert len(shit.library) == rows - 1
+    assert 'Recirc' not in shit.library.column('feedstock_name')
+    assert shit.library.column('annual_volume').sum() == pytest.approx(total - recirc)
+    # Views of the rows after the removed one follow them
+    for name in shit.content:
+        assert shit.content[name].feedstock_name == name
+
+
+def test_assigning_content_writes_the_library(shit):
+    total = shit.library.column('annual_volume').sum()
+    feed_stock = new_feedstock()
+
+    shit.content['New'] = feed_stock
+
+    assert shit.library.column('feedstock_name')[-1] == 'New'
+    assert shit.library.column('annual_volume').sum() == pytest.approx(total + 1000.0)
+    feed_stock.dm = 0.3  # The caller's object is now a view of the library row
+    assert shit.library.column('dm')[-1] == 0.3
+
+
+def test_assigning_an_existing_name_overwrites_its_row(shit):
+    rows = len(shit.library)
+    shit.content['FYM'] = new_feedstock('FYM', annual_volume=10.0)
+    assert len(shit.library) == rows
+    assert shit.content['FYM'].annual_volume == 10.0
+    assert shit.library.column('annual_volume')[list(shit.content).index('FYM')] == 10.0
+
+
+def test_mass_balance_matches_a_per_feedstock_loop(shit):
+    mb = mass_balance(shit.library)
+    total_dm = total_methane = crop_methane = 0.0
+    for feed_stock in shit.content.values():
+        if feed_stock.annual_volume <= 0:
+            continue
+        dm = feed_stock.annual_volume * feed_stock.dm
+        methane = dm * feed_stock.vs_of_dm * feed_stock.biogas_yield_vs * feed_stock.percent_ch4
+        total_dm += dm
+        total_methane += methane
+        if feed_stock.crop_residue_waste_other == 'C':
+            crop_methane += methane
+
+    assert mb.total_dm == pytest.approx(total_dm)
+    assert mb.total_methane == pytest.approx(total_methane)
+    assert mb.crop_methane == pytest.approx(crop_methane)
+    assert mb.power_output_mwh == pytest.approx(total_methane * 10 / 1000)
+    assert mb.residue_waste_methane_percentage == pytest.approx(100 - mb.crop_methane_percentage)
+
+
+def test_shit_reuses_the_mass_balance_until_an_edit(shit):
+    first = shit.mass_balance()
+    assert shit.mass_balance() is first
+    shit.content['FYM'].annual_volume += 100.0
+    assert shit.mass_balance() is not first
+    assert shit.mass_balance().total_tpa == pytest.approx(first.total_tpa + 100.0)
+
+
+def test_result_tables_compute_without_printing(shit, capsys):
+    bulk_properties, maximum_yields = shit.bulk_tables()
+    production = shit.production_table()
+
+    assert capsys.readouterr().out == ''
+    mb = shit.mass_balance()
+    assert maximum_yields['Value'][list(maximum_yields['Property']).index('Total Methane')] == mb.total_methane
+    assert len(production) == mb.active.sum()
+    assert production.to_dataframe() is production.to_dataframe()  # Built once, on request
+
+
+def test_reporting_methods_print_the_rendered_tables(shit, capsys):
+    frame = shit.biogas_production_stats()
+
+    table = shit.production_table()
+    assert capsys.readouterr().out == table.render() + '\n'
+    assert frame.equals(table.to_dataframe())
+
+
+def test_feed_only_caches_when_asked(tmp_path, feedstocks_path):
+    csv = tmp_path / 'feedstocks.csv'
+    csv.write_bytes(open(feedstocks_path, 'rb').read())
+
+    feed(str(csv))
+    assert os.listdir(tmp_path) == ['feedstocks.csv']
+
+    cache_dir = tmp_path / 'cache'
+    cached = feed(str(csv), cache=True, cache_dir=str(cache_dir))
+    assert os.listdir(cache_dir)
+    assert cached.library.column('feedstock_name') == feed(str(csv)).library.column('feedstock_name')
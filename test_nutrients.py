@@ -0,0 +1,30 @@
+import pytest
+
+from model import feed
+from nutrients import NVZ_N_LIMIT, evaluate_nutrients
+
+
+HEADER = ('Source,Feedstock Name,DM,VS of DM,Biogas Yield VS,% CH4,Crop/Residue/Waste/Other,Density,L/S,'
+          'Digestion Reduction Factor,COD,BOD,Total N,Am N,Total P,Sol P,Solid P,Total K')
+ROW = 'Test,Slurry,0.08,0.8,350,0.6,W,1,L,0.8,270,45,3000,1500,2,0.3,1.7,10'
+
+
+def write_library(path, n_unit):
+    units = f'Unit,Name,%,%,(NM3/Tonne VS),%,,(T/M3),,%,(kg / T input),(kg / T input),({n_unit} / T input),,,,,'
+    path.write_text('\n'.join([HEADER, units, ROW]) + '\n')
+    return str(path)
+
+
+def test_spreading_area_converts_a_g_per_tonne_load_to_kg(tmp_path):
+    shit = feed(write_library(tmp_path / 'feedstocks.csv', 'g'))
+    results = evaluate_nutrients(shit, [[10000.0]])
+
+    assert results.units['total_n'] == 'g/year'
+    # 10,000 t at 3000 g N/t is 30 t N, spread at 170 kg N/ha
+    assert results.spreading_area()[0] == pytest.approx(30000.0 / NVZ_N_LIMIT)
+
+
+def test_spreading_area_rejects_an_unknown_load_unit(tmp_path):
+    shit = feed(write_library(tmp_path / 'feedstocks.csv', 'lb'))
+    with pytest.raises(ValueError):
+        evaluate_nutrients(shit, [[10000.0]]).spreading_area()
@@ -0,0 +1,19 @@
+import pytest
+
+from model import FeedStockViews
+from optimiser import optimise_feed_mix
+
+
+def test_names_and_bounds_follow_the_library_rows(shit):
+    # Content listed in a different order from the library rows
+    names = shit.library.column('feedstock_name')
+    shit.content = FeedStockViews(shit.library, {name: i for i, name in reversed(list(enumerate(names)))})
+
+    result = optimise_feed_mix(shit, 20000, availability={'Maize Silage': 1000, 'DAF Sludges': (500, 2000)})
+
+    assert result.success
+    assert result.names == list(names)
+    volumes = result.as_dict()
+    assert volumes['Maize Silage'] <= 1000 + 1e-6
+    assert 500 - 1e-6 <= volumes['DAF Sludges'] <= 2000 + 1e-6
+    assert result.power_output_mwh == pytest.approx(20000)
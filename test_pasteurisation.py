@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from model import CHP_THERMAL_EFFICIENCY, CP_DRY_MATTER, CP_WATER, FeedStock, Shit, pasteurisation, pasturise, stream
+
+
+@pytest.fixture
+def plant():
+    """One feedstock at 1 tonne/hour plus a row of water with no density"""
+    shit = Shit()
+    shit.add_feedstock(FeedStock('Farm', 'Slurry', 0.1, 0.8, 400, 0.5, 'R', 1.25, 'L', 0.7,
+                                 1, 1, 1, 1, 1, 1, 1, 1, annual_volume=8760.0))
+    water = stream('Water', 8760.0, 0.0, 0.0)
+    water.density = 0.0
+    shit.add_feedstock(water)
+    return shit
+
+
+def test_heat_balance_matches_a_hand_calculation(plant):
+    results = pasteurisation(plant, inlet_temperature=10.0, temperature=70.0, hold_hours=1.0,
+                             heat_recovery=0.5, hold_loss_per_hour=0.02)
+
+    heat_capacity = 8760 * (0.9 * CP_WATER + 0.1 * CP_DRY_MATTER) + 8760 * CP_WATER  # MJ/K per year
+    heat_up = heat_capacity * 60 / 3600
+    heat_demand = heat_up * (1 - 0.5 + 0.02)
+    methane = 8760 * 0.1 * 0.8 * 400 * 0.5
+    chp_heat = methane * 10 / 1000 * CHP_THERMAL_EFFICIENCY
+
+    assert results.mass_flow[0] == pytest.approx(2.0)
+    assert results.volume_flow[0] == pytest.approx(1 / 1.25 + 1.0)  # Water counts as 1 t/m3
+    assert results.hold_volume[0] == pytest.approx(results.volume_flow[0])
+    assert results.heat_up[0] == pytest.approx(heat_up)
+    assert results.heat_demand[0] == pytest.approx(heat_demand)
+    assert results.chp_heat[0] == pytest.approx(chp_heat)
+    assert results.surplus_heat[0] == pytest.approx(chp_heat - heat_demand)
+    assert results.parasitic_percentage[0] == pytest.approx(heat_demand / chp_heat * 100)
+
+
+def test_scenarios_and_per_scenario_settings_in_one_call(plant):
+    volumes = np.array([[8760.0, 8760.0], [17520.0, 17520.0], [0.0, 0.0]])
+    results = pasteurisation(plant, volumes, inlet_temperature=np.array([10.0, 10.0, 10.0]))
+    single = pasteurisation(plant)
+
+    assert results.heat_demand[0] == pytest.approx(single.heat_demand[0])
+    assert results.heat_demand[1] == pytest.approx(2 * single.heat_demand[0])
+    assert results.heat_demand[2] == 0.0
+    assert results.parasitic_percentage[2] == 0.0
+
+
+def test_pasturise_keeps_the_composition_and_the_heat_balance(plant):
+    volumes = plant.library.column('annual_volume').copy()
+    result = pasturise(plant, temperature=72.0)
+
+    assert result is plant
+    np.testing.assert_array_equal(plant.library.column('annual_volume'), volumes)
+    assert plant.pasteurisation.heat_up[0] == pytest.approx(pasteurisation(plant, temperature=72.0).heat_up[0])
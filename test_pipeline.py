@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from pipeline import Pipeline, plant_pipeline
+
+
+TANKS = [4000.0, 2000.0]
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch, feedstocks_path, volumes_path):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    feedstocks = tmp_path / 'feedstocks.csv'
+    volumes = tmp_path / 'volumes.csv'
+    feedstocks.write_bytes(open(feedstocks_path, 'rb').read())
+    volumes.write_bytes(open(volumes_path, 'rb').read())
+    return plant_pipeline(str(feedstocks), str(volumes), TANKS, days=30)
+
+
+def runs(pipeline):
+    return {name: stage.runs for name, stage in pipeline.stages.items()}
+
+
+def test_unchanged_stages_are_reused(pipeline):
+    first = pipeline.run()
+    second = pipeline.run()
+
+    assert runs(pipeline) == dict.fromkeys(pipeline.stages, 1)
+    assert all(second[name] is first[name] for name in first)
+
+
+def test_new_params_rerun_the_stage_and_everything_downstream(pipeline):
+    pipeline.run()
+    assert not pipeline.set_params('digestion', tank_volumes=TANKS)  # Equal values are not a change
+
+    pipeline.set_params('digestion', tank_volumes=[3000.0, 2000.0])
+    pipeline.run()
+
+    assert runs(pipeline) == {'feed': 1, 'mix': 1, 'pasturise': 1, 'digestion': 2, 'seperate': 2}
+
+
+def test_edited_input_file_reruns_the_feed(pipeline):
+    volumes = pipeline['feed'].params['volumes_path']
+    before = pipeline.run()['feed'].library.column('annual_volume').sum()
+
+    with open(volumes, 'a', encoding='utf-8') as f:
+        f.write('\n')  # Same volumes, but a new size and mtime
+    os.utime(volumes, ns=(0, 0))
+    after = pipeline.run()
+
+    assert runs(pipeline) == dict.fromkeys(pipeline.stages, 2)
+    assert after['feed'].library.column('annual_volume').sum() == before
+
+
+def test_stages_get_their_own_copy_of_an_upstream_shit(pipeline):
+    outputs = pipeline.run()
+    assert outputs['mix'].library is not outputs['feed'].library
+    assert len(outputs['mix'].library) == len(outputs['feed'].library)
+
+
+def test_cycles_are_rejected():
+    pipeline = Pipeline()
+    pipeline.add('a', lambda b: b, inputs=['b'])
+    pipeline.add('b', lambda a: a, inputs=['a'])
+    with pytest.raises(ValueError, match='cycle'):
+        pipeline.run()
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from model import anderson, assign_feedstock_volumes, feed, solve_recirculation
+
+
+TANKS = [4000.0, 2000.0]
+
+
+@pytest.fixture
+def natural_dm(feedstocks_path, volumes_path):
+    """Digester DM % with no recirculation"""
+    shit = assign_feedstock_volumes(feed(feedstocks_path), volumes_path)
+    return solve_recirculation(shit, TANKS, 100.0).digester_dm_percentage
+
+
+def test_converges_to_a_reachable_target(shit, natural_dm):
+    target = natural_dm - 2.0
+    results = solve_recirculation(shit, TANKS, target)
+
+    assert results.converged and results.feasible
+    assert results.iterations < 20
+    assert results.digester_dm_percentage == pytest.approx(target, abs=1e-6)
+    assert results.recirc_rate > 0
+    # The recirc row is left at the solution, from the separated liquid
+    assert shit.content['Recirc'].annual_volume == results.recirc_rate
+    assert results.recirc.dm == pytest.approx(results.separation.liquid.dm, rel=1e-6)
+
+
+def test_target_above_the_natural_dm_is_infeasible(shit, natural_dm):
+    results = solve_recirculation(shit, TANKS, natural_dm + 2.0)
+
+    assert not results.feasible
+    assert results.recirc_rate == 0.0
+
+
+def test_anderson_drops_its_history_when_the_residual_grows():
+    # Each call moves x by a set amount, so the residual sequence is fixed
+    moves = iter([1.0, 0.5, 5.0, 0.1, 0.0])
+    calls = []
+
+    def function(x):
+        calls.append(x.copy())
+        return x + next(moves)
+
+    x, iterations, residual, converged = anderson(function, np.zeros(1), tol=1e-12, max_iterations=5)
+
+    # The third step raised the residual, so the fourth is a plain step from its result
+    assert calls[3] == pytest.approx(calls[2] + 5.0)
+    assert converged and iterations == 5
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from model import TOTAL_FIELDS, mass_balance
+from result_cache import ResultCache
+
+
+def assert_same_balance(result, library):
+    expected = mass_balance(library)
+    for name in TOTAL_FIELDS:
+        assert getattr(result, name) == pytest.approx(getattr(expected, name))
+    np.testing.assert_allclose(result.methane_volume, expected.methane_volume)
+
+
+def test_set_column_and_append_change_the_key(shit):
+    cache = ResultCache()
+    lib = shit.library
+    keys = [cache.key(lib)]
+    cache.mass_balance(lib)
+
+    lib.set_column('dm', lib.column('dm') * 1.1)
+    keys.append(cache.key(lib))
+    assert_same_balance(cache.mass_balance(lib), lib)
+
+    lib.set_column('annual_volume', lib.column('annual_volume') * 2)
+    keys.append(cache.key(lib))
+    assert_same_balance(cache.mass_balance(lib), lib)
+
+    lib.append(feedstock_name='Extra', dm=0.3, vs_of_dm=0.9, biogas_yield_vs=600, percent_ch4=0.52,
+               crop_residue_waste_other='C', annual_volume=500)
+    keys.append(cache.key(lib))
+    assert_same_balance(cache.mass_balance(lib), lib)
+
+    assert len(set(keys)) == len(keys)
+    assert cache.stats().misses == 4 and cache.stats().hits == 0
+
+
+def test_same_values_hit_whichever_library_holds_them(shit):
+    cache = ResultCache()
+    first = cache.mass_balance(shit.library)
+    volumes = shit.library.column('annual_volume').copy()
+
+    shit.library.set_column('annual_volume', volumes * 3)
+    cache.mass_balance(shit.library)
+    shit.library.set_column('annual_volume', volumes)
+
+    assert cache.mass_balance(shit.library) is first
+    assert cache.mass_balance(shit.copy().library) is first
+    assert cache.stats().hits == 2
+
+
+def test_least_recently_used_entry_is_evicted(shit):
+    cache = ResultCache(maxsize=2)
+    lib = shit.library
+    volumes = lib.column('annual_volume').copy()
+
+    def balance(factor):
+        lib.set_column('annual_volume', volumes * factor)
+        return cache.mass_balance(lib)
+
+    balance(1)
+    balance(2)
+    balance(1)  # Now the most recent, so 2 is evicted next
+    balance(3)
+    assert len(cache) == 2
+
+    misses = cache.stats().misses
+    balance(1)
+    assert cache.stats().misses == misses
+    balance(2)
+    assert cache.stats().misses == misses + 1
+
+
+def test_disk_tier_serves_a_new_cache(shit, tmp_path):
+    first = ResultCache(directory=str(tmp_path)).mass_balance(shit.library)
+
+    # A fresh process sees only the files
+    cache = ResultCache(directory=str(tmp_path))
+    result = cache.mass_balance(shit.copy().library)
+
+    assert cache.stats().disk_hits == 1 and cache.stats().misses == 0
+    assert list(result.names) == list(first.names)
+    assert_same_balance(result, shit.library)
+    assert not result.methane_volume.flags.writeable
+
+
+def test_only_property_edits_move_the_property_version(shit):
+    lib = shit.library
+    version = lib.property_version
+    shit.content[next(iter(shit.content))].annual_volume = 1234.0
+    lib.set_column('annual_volume', lib.column('annual_volume') * 2)
+    assert lib.property_version == version
+
+    shit.content[next(iter(shit.content))].dm = 0.5
+    assert lib.property_version == version + 1
+    lib.remove(0)
+    assert lib.property_version == version + 2
+
+
+def test_removing_a_row_changes_the_key(shit):
+    cache = ResultCache()
+    lib = shit.library
+    before = cache.key(lib)
+    del shit.content[lib.get('feedstock_name', 0)]
+
+    assert cache.key(lib) != before
+    assert_same_balance(cache.mass_balance(lib), lib)
+
+
+def test_shit_serves_its_mass_balance_from_a_shared_cache(shit):
+    shit.result_cache = ResultCache()
+    first = shit.mass_balance()
+    other = shit.copy()
+
+    assert other.result_cache is shit.result_cache
+    assert other.mass_balance() is first
+    assert shit.result_cache.stats().hits == 1
+    assert other.totals().total_methane == pytest.approx(first.total_methane)
@@ -0,0 +1,71 @@
+import sqlite3
+from datetime import datetime
+
+import pandas
+import pytest
+
+import run_history
+from run_history import RunHistory
+
+
+@pytest.fixture
+def history(tmp_path, shit):
+    with RunHistory(str(tmp_path / 'history.sqlite')) as history:
+        history.record(shit, {'Project Name': 'Test', 'Consultant': 'JS'}, created_at=datetime(2024, 5, 1, 9))
+        yield history
+
+
+def test_feedstock_names_are_stored_trimmed(history):
+    names = history.feedstocks()['feedstock_name'].tolist()
+    assert 'Poultry Litter' in names
+    assert all(name == name.strip() for name in names)
+
+
+def test_feedstock_filter_matches_the_library_names(history):
+    # The library spells it 'Poultry Litter ' with a trailing space
+    assert len(history.runs(feedstock='Poultry Litter')) == 1
+    assert len(history.runs(feedstock=' poultry  LITTER')) == 1
+    assert len(history.runs(feedstock='Straw')) == 0
+
+
+def test_runs_are_filtered_by_project_consultant_and_date(history, shit):
+    history.record(shit, {'Project Name': 'Other'}, created_at=datetime(2024, 6, 1, 9))
+
+    assert history.runs(project='test')['project'].tolist() == ['Test']
+    assert history.runs(consultant='js')['project'].tolist() == ['Test']
+    assert history.runs(end='2024-05-01')['project'].tolist() == ['Test']
+    assert history.runs(start='2024-05-02')['project'].tolist() == ['Other']
+    assert history.runs()['project'].tolist() == ['Other', 'Test']  # Newest first
+
+
+def test_totals_match_the_model(history, shit):
+    run = history.runs().iloc[0]
+    totals = shit.totals()
+    assert run['total_tpa'] == pytest.approx(totals.total_tpa)
+    assert run['power_output_mwh'] == pytest.approx(totals.power_output_mwh)
+
+
+def test_history_is_append_only(history):
+    with pytest.raises(sqlite3.DatabaseError):
+        with history._connection:
+            history._connection.execute('DELETE FROM runs')
+    assert len(history) == 1
+
+
+def test_export_writes_runs_and_their_feedstocks(history, tmp_path):
+    runs_path, feedstocks_path = tmp_path / 'runs.csv', tmp_path / 'feedstocks.json'
+
+    assert history.export(str(runs_path), str(feedstocks_path), project='Test') == 1
+    assert pandas.read_csv(runs_path)['project'].tolist() == ['Test']
+    assert len(pandas.read_json(feedstocks_path)) == history.runs()['feedstocks'][0]
+
+
+def test_default_history_is_in_the_user_data_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'data'))
+    monkeypatch.setenv('APPDATA', str(tmp_path / 'data'))
+    monkeypatch.chdir(tmp_path)
+
+    with RunHistory() as history:
+        assert history.path == run_history.default_history_path()
+        assert history.path.startswith(str(tmp_path / 'data'))
+    assert not list(tmp_path.glob('*.sqlite*'))
@@ -0,0 +1,59 @@
+from dataclasses import asdict
+
+import numpy as np
+import pytest
+
+import model
+from model import FeedStock, PlantTotals, TOTAL_FIELDS, mass_balance
+
+
+def full_pass(shit):
+    mb = mass_balance(shit.library)
+    return asdict(PlantTotals.from_totals(*(getattr(mb, name) for name in TOTAL_FIELDS)))
+
+
+def test_running_totals_deltas_match_a_full_pass(shit):
+    rng = np.random.default_rng(0)
+    names = list(shit.content)
+    shit.totals()
+    deltas = 0
+    for _ in range(200):
+        feedstock = shit.content[names[rng.integers(len(names))]]
+        edit = rng.integers(4)
+        if edit == 0:
+            feedstock.annual_volume = float(rng.uniform(0, 20000))
+        elif edit == 1:
+            feedstock.dm = float(rng.uniform(0, 1))
+        elif edit == 2:
+            feedstock.biogas_yield_vs = float(rng.uniform(0, 800))
+        else:
+            feedstock.crop_residue_waste_other = str(rng.choice(['C', 'R', 'W']))
+
+        deltas += not shit.running_totals.dirty  # Kept current by the delta, no full pass
+        running = shit.running_totals.current()
+        expected = full_pass(shit)
+        for name, value in asdict(running).items():
+            assert value == pytest.approx(expected[name], rel=1e-9, abs=1e-9), name
+    # Only the drift guard, one full pass per len(library) deltas, interrupts them
+    assert deltas >= 200 * len(names) // (len(names) + 1)
+
+
+def test_totals_follow_added_and_removed_feedstocks(shit):
+    shit.totals()
+    shit.content['New'] = FeedStock('Test', 'New', 0.2, 0.8, 400, 0.55, 'C', 1.0, 'L', 0.7,
+                                    1, 1, 1, 1, 1, 1, 1, 1, 1000.0)
+    del shit.content['Recirc']
+
+    for name, value in asdict(shit.totals()).items():
+        assert value == pytest.approx(full_pass(shit)[name]), name
+
+
+def test_one_run_does_one_mass_balance_pass(shit, monkeypatch):
+    calls = []
+    kernel = model.mass_balance
+    monkeypatch.setattr(model, 'mass_balance', lambda library: calls.append(1) or kernel(library))
+
+    shit.library.set_column('annual_volume', shit.library.column('annual_volume') * 2)
+    shit.production_table()
+    shit.bulk_tables()
+    assert len(calls) == 1
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from model import mass_balance
+from scenarios import PROPERTY_COLUMNS, evaluate_scenarios, property_matrix
+
+
+def test_property_matrix_reproduces_the_mass_balance(shit):
+    totals = np.maximum(shit.library.column('annual_volume'), 0.0) @ property_matrix(shit.library)
+    mb = mass_balance(shit.library)
+    for column, total in zip(PROPERTY_COLUMNS, totals):
+        assert total == pytest.approx(getattr(mb, column)), column
+
+
+def test_each_scenario_matches_a_mass_balance_of_its_volumes(shit):
+    rng = np.random.default_rng(0)
+    base = shit.library.column('annual_volume').copy()
+    volumes = base * rng.uniform(0.5, 1.5, size=(5, len(base)))
+
+    results = evaluate_scenarios(shit, volumes)
+
+    assert len(results) == 5
+    for i, row in enumerate(volumes):
+        shit.library.column('annual_volume')[:] = row
+        mb = mass_balance(shit.library)
+        for field in ('total_tpa', 'total_methane', 'bulk_dm_percentage', 'feedstock_bulk_dm_percentage',
+                      'crop_methane_percentage', 'power_output_mwh'):
+            assert getattr(results, field)[i] == pytest.approx(getattr(mb, field)), field
+
+
+def test_evaluate_scenarios_checks_the_column_count(shit):
+    with pytest.raises(ValueError):
+        evaluate_scenarios(shit, np.ones((2, len(shit.library) + 1)))
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+import sensitivity as sensitivity_module
+from model import mass_balance
+from sensitivity import INPUTS, OUTPUTS, sensitivity, sobol
+from uncertainty import UNCERTAIN_FIELDS
+
+
+def _outputs(library):
+    mb = mass_balance(library)
+    return np.array([getattr(mb, name) for name in OUTPUTS])
+
+
+def _finite_difference(library, row, input, forward=False):
+    """d outputs / d input for one row, by central (or forward) differences"""
+    column = library.column(input)
+    value = column[row]
+    step = 1e-6 * max(abs(value), 1.0)
+    column[row] = value + step
+    high = _outputs(library)
+    column[row] = value if forward else value - step
+    low = _outputs(library)
+    column[row] = value
+    return (high - low) / (step if forward else 2 * step)
+
+
+def _finite_rows(shit, active):
+    inputs = np.column_stack([shit.library.column(name) for name in INPUTS])
+    volume = shit.library.column('annual_volume')
+    usable = np.isfinite(inputs).all(axis=1) & ((volume > 0) == active)
+    return np.flatnonzero(usable)
+
+
+def test_jacobian_matches_finite_differences(shit):
+    result = sensitivity(shit)
+    rows = _finite_rows(shit, active=True)
+    assert len(rows) > 0
+
+    for row in rows:
+        for j, input in enumerate(INPUTS):
+            expected = _finite_difference(shit.library, row, input)
+            np.testing.assert_allclose(result.jacobian[:, row, j], expected, rtol=1e-4, atol=1e-6,
+                                       err_msg=f"{shit.library.get('feedstock_name', row)} {input}")
+
+
+def test_unused_feedstock_volume_derivative_is_one_sided(shit):
+    rows = _finite_rows(shit, active=False)
+    if len(rows) == 0:
+        shit.library.column('annual_volume')[0] = 0.0
+        rows = [0]
+    result = sensitivity(shit)
+
+    for row in rows:
+        expected = _finite_difference(shit.library, row, 'annual_volume', forward=True)
+        np.testing.assert_allclose(result.derivative('total_biogas', 'annual_volume')[row], expected[0], rtol=1e-4)
+        # Lab values of an unused feedstock have no effect until it is fed
+        assert not result.jacobian[:, row, 1:].any()
+
+
+def test_outputs_match_the_mass_balance(shit):
+    result = sensitivity(shit)
+    mb = mass_balance(shit.library)
+    for name in OUTPUTS:
+        assert result.outputs[name] == pytest.approx(getattr(mb, name))
+
+
+def test_tornado_is_ranked_by_swing(shit):
+    table = sensitivity(shit).tornado('total_methane', top=5)
+    swing = table['Swing']
+    assert len(swing) == 5
+    assert np.all(np.diff(swing) <= 0)
+
+
+def _linear_dm_model(shit):
+    """Only DM varies, so bulk DM % = 100 * sum(volume * dm) / tpa is linear in independent normal inputs"""
+    relative_sd = {name: 0.0 for name in UNCERTAIN_FIELDS}
+    relative_sd['dm'] = 0.01  # Small enough that the clip to [0, 1] never bites
+    volume = shit.library.column('annual_volume')
+    dm = np.nan_to_num(shit.library.column('dm'))[volume > 0]
+    weight = (volume[volume > 0] * dm * 0.01) ** 2
+    return relative_sd, weight[weight > 0] / weight.sum()
+
+
+def test_sobol_indices_of_a_linear_model_are_the_variance_shares(shit):
+    relative_sd, expected = _linear_dm_model(shit)
+    results = sobol(shit, samples=8192, relative_sd=relative_sd, outputs=('bulk_dm_percentage',),
+                    resamples=0, workers=1)
+
+    assert len(results.names) == len(expected)
+    # Additive model: first-order and total indices coincide and sum to one
+    np.testing.assert_allclose(results.first[:, 0], expected, atol=0.02)
+    np.testing.assert_allclose(results.total[:, 0], expected, atol=0.02)
+    assert results.first[:, 0].sum() == pytest.approx(1.0, abs=0.02)
+
+
+def test_sobol_field_grouping_gives_the_one_uncertain_field_all_the_variance(shit):
+    relative_sd, _ = _linear_dm_model(shit)
+    results = sobol(shit, samples=1024, relative_sd=relative_sd, outputs=('bulk_dm_percentage',),
+                    group_by='field', resamples=50, workers=1)
+
+    assert results.names == ['DM']
+    assert results.first[0, 0] == pytest.approx(1.0, abs=0.05)
+    assert results.total[0, 0] == pytest.approx(1.0, abs=0.05)
+    assert results.total_ci.shape == (2, 1, 1)
+
+
+def test_sobol_does_not_depend_on_the_worker_count(shit, monkeypatch):
+    monkeypatch.setattr(sensitivity_module, 'CHUNK_ELEMENTS', 20000)  # Several chunks per run
+    serial = sobol(shit, samples=512, group_by='feedstock', resamples=20, workers=1)
+    parallel = sobol(shit, samples=512, group_by='feedstock', resamples=20, workers=2)
+
+    np.testing.assert_array_equal(serial.first, parallel.first)
+    np.testing.assert_array_equal(serial.total_ci, parallel.total_ci)
+
+
+def test_sobol_rejects_an_unknown_grouping(shit):
+    with pytest.raises(ValueError):
+        sobol(shit, samples=8, group_by='category', workers=1)
@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pandas
+import pytest
+
+from scenarios import PROPERTY_COLUMNS, property_matrix
+from telemetry import stream_telemetry
+
+
+@pytest.fixture
+def events(shit):
+    """Two days of feed events every 10 minutes with a biogas meter reading alongside"""
+    rng = np.random.default_rng(0)
+    names = [name for name, f in shit.content.items() if f.annual_volume > 0]
+    times = pandas.date_range('2024-01-01', periods=288, freq='10min')
+    return pandas.DataFrame({
+        'Timestamp': times.strftime('%Y-%m-%dT%H:%M:%S'),
+        'Feedstock': rng.choice(names + ['Unknown mix'], size=len(times)),
+        'Tonnes': rng.uniform(0.5, 5.0, size=len(times)).round(3),
+        'Biogas': rng.uniform(100, 300, size=len(times)).round(1)
+    })
+
+
+def write_ndjson(path, events):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in events.to_dict('records'):
+            f.write(json.dumps(record) + '\n')
+
+
+def windows(path, shit, **options):
+    return [(w.start, w.events, w.tonnes, w.unknown_tonnes, w.expected_biogas, w.predicted_biogas, w.metered_biogas)
+            for w in stream_telemetry(str(path), shit, window='6h', **options)]
+
+
+def test_csv_and_ndjson_give_the_same_windows_in_any_block_size(tmp_path, shit, events):
+    events.to_csv(tmp_path / 'events.csv', index=False)
+    write_ndjson(tmp_path / 'events.ndjson', events)
+
+    whole = windows(tmp_path / 'events.csv', shit)
+    assert len(whole) == 8
+    for path in ('events.csv', 'events.ndjson'):
+        for block_size in (1 << 20, 512):
+            result = windows(tmp_path / path, shit, block_size=block_size)
+            assert [w[:2] for w in result] == [w[:2] for w in whole], (path, block_size)
+            np.testing.assert_allclose([w[2:] for w in result], [w[2:] for w in whole], rtol=1e-9)
+
+
+def test_windows_add_up_to_the_mass_balance_of_the_tonnes_fed(tmp_path, shit, events):
+    events.to_csv(tmp_path / 'events.csv', index=False)
+    biogas_per_tonne = dict(zip(shit.library.column('feedstock_name'),
+                                property_matrix(shit.library)[:, PROPERTY_COLUMNS.index('total_biogas')]))
+
+    result = windows(tmp_path / 'events.csv', shit)
+
+    unknown = events['Feedstock'] == 'Unknown mix'
+    expected = (events['Tonnes'][~unknown] * events['Feedstock'][~unknown].map(biogas_per_tonne)).sum()
+    assert sum(w[1] for w in result) == len(events)
+    assert sum(w[3] for w in result) == pytest.approx(events['Tonnes'][unknown].sum())
+    assert sum(w[4] for w in result) == pytest.approx(expected)
+    assert sum(w[6] for w in result) == pytest.approx(events['Biogas'].sum())
+    # Gas still in the digester pool at the end has not been released yet
+    assert 0 < sum(w[5] for w in result) < expected
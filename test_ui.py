@@ -0,0 +1,292 @@
+import queue
+import threading
+
+import matplotlib
+import numpy as np
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+with pytest.MonkeyPatch.context() as patch:
+    patch.setattr(matplotlib, 'use', lambda *args, **kwargs: None)  # No display for TkAgg here
+    import ui
+from run_history import RunHistory
+
+
+class FakeWidget:
+    """Stands in for the ttk widgets the run loop configures"""
+
+    def __init__(self):
+        self.options = {}
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def __setitem__(self, name, value):
+        self.options[name] = value
+
+    def __getitem__(self, name):
+        return self.options[name]
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+
+@pytest.fixture
+def app(shit, monkeypatch):
+    app = object.__new__(ui.BiogasSimulatorUI)
+    app.root = FakeRoot()
+    app.feedstock_obj = shit
+    app.results_queue = queue.Queue()
+    app.worker = None
+    app.cancel_event = threading.Event()
+    app.pending_volumes = None
+    app.run_id = 0
+    app.run_details = None
+    app.history = None
+    app.polling = False
+    app.shown_results = None
+    app.cancel_button, app.progress, app.status_label = FakeWidget(), FakeWidget(), FakeWidget()
+    app.shown = []
+    monkeypatch.setattr(app, 'show_results', lambda *tables: app.shown.append(tables))
+    return app
+
+
+def edited_volumes(app, name, volume):
+    """Volumes as read from the table, in library order, with one row changed"""
+    volumes = app.feedstock_obj.library.column('annual_volume').copy()
+    volumes[app.feedstock_obj.library.column('feedstock_name').index(name)] = volume
+    return volumes
+
+
+def drain(app):
+    messages = []
+    while not app.results_queue.empty():
+        messages.append(app.results_queue.get_nowait())
+    return messages
+
+
+def test_simulate_reports_progress_then_the_tables(app):
+    app.simulate(1, edited_volumes(app, 'FYM', 1234.0), threading.Event())
+
+    messages = drain(app)
+    assert [kind for kind, run_id, payload in messages] == ['progress', 'progress', 'progress', 'done']
+    assert [payload[0] for kind, run_id, payload in messages[:3]] == [10, 40, 80]
+    assert app.feedstock_obj.content['FYM'].annual_volume == 1234.0
+    (production_df, bulk_df, yields_df), data = messages[-1][2]
+    assert 'FYM' in list(production_df['Feedstock Name'])
+    assert bulk_df['Value'][0] == pytest.approx(app.feedstock_obj.totals().total_tpa)
+    assert data['totals']['total_tpa'] == pytest.approx(app.feedstock_obj.totals().total_tpa)
+
+
+def test_cancelled_run_stops_at_the_next_stage(app):
+    cancel = threading.Event()
+    cancel.set()
+    app.simulate(1, edited_volumes(app, 'FYM', 1234.0), cancel)
+
+    assert [kind for kind, run_id, payload in drain(app)] == ['progress', 'cancelled']
+
+
+def test_poll_drops_superseded_runs_and_starts_the_latest_request(app, monkeypatch):
+    started = []
+    monkeypatch.setattr(app, 'start_worker', started.append)
+    app.run_id = 2
+    app.pending_volumes = {'FYM': 10.0}
+    app.results_queue.put(('done', 1, ('stale',)))
+    app.results_queue.put(('cancelled', 2, None))
+
+    app.poll_results()
+
+    assert started == [{'FYM': 10.0}]
+    assert app.shown == []
+
+
+def test_poll_shows_the_finished_run(app):
+    app.run_id = 1
+    app.simulate(1, edited_volumes(app, 'FYM', 1234.0), threading.Event())
+
+    app.poll_results()
+
+    assert app.status_label['text'] == 'Done'
+    assert app.progress['value'] == 100
+    assert len(app.shown) == 1 and len(app.shown[0]) == 3
+    assert not app.polling
+
+
+def test_poll_saves_the_finished_run_with_its_project_details(app, tmp_path):
+    app.history = RunHistory(str(tmp_path / 'history.sqlite'))
+    app.run_id = 1
+    app.run_details = {'Project Name': 'Farm A', 'Consultant': 'JS'}
+    app.simulate(1, edited_volumes(app, 'FYM', 1234.0), threading.Event())
+
+    app.poll_results()
+
+    runs = app.history.runs()
+    app.history.close()
+    assert list(runs['project']) == ['Farm A']
+    assert list(runs['source']) == ['ui']
+    assert runs['total_tpa'][0] == pytest.approx(app.feedstock_obj.totals().total_tpa)
+
+
+class RecordingCanvas(FigureCanvasAgg):
+    """Agg canvas that counts full redraws and blits"""
+
+    def __init__(self, figure):
+        super().__init__(figure)
+        self.draws = self.blits = 0
+
+    def draw_idle(self, *args, **kwargs):
+        self.draws += 1
+        self.draw()
+
+    def restore_region(self, region, *args, **kwargs):
+        self.blits += 1
+        super().restore_region(region, *args, **kwargs)
+
+
+@pytest.fixture
+def chart():
+    chart = object.__new__(ui.BiogasSimulatorUI)
+    chart.fig = Figure(figsize=(5, 8))
+    chart.ax = chart.fig.add_subplot()
+    chart.ax2 = chart.ax.twinx()
+    chart.canvas = RecordingCanvas(chart.fig)
+    chart.chart_names = None
+    chart.chart_bars, chart.chart_lefts, chart.chart_labels = [], [], []
+    chart.chart_background = None
+    chart.chart_message = chart.ax.text(0.5, 0.5, 'Run simulation to generate chart', transform=chart.ax.transAxes)
+    chart.canvas.mpl_connect('draw_event', chart.on_chart_draw)
+    return chart
+
+
+def test_bar_verts_are_the_corners_of_each_bar():
+    verts = ui.BiogasSimulatorUI.bar_verts(np.array([0.0, 1.0]), 0.25, [3.0, 5.0])
+
+    assert verts.shape == (2, 4, 2)
+    np.testing.assert_array_equal(verts[1], [[1.0, 0.0], [1.0, 5.0], [1.25, 5.0], [1.25, 0.0]])
+
+
+def test_fit_limit_only_rescales_outside_its_band():
+    axis = Figure().add_subplot()
+    assert ui.BiogasSimulatorUI.fit_limit(axis, 100.0)
+    assert axis.get_ylim() == (0, pytest.approx(110.0))
+    assert not ui.BiogasSimulatorUI.fit_limit(axis, 90.0)  # Still fits, more than half full
+    assert ui.BiogasSimulatorUI.fit_limit(axis, 200.0)  # Outgrown
+    assert ui.BiogasSimulatorUI.fit_limit(axis, 50.0)  # Under half of the axis
+
+
+def test_repeat_runs_update_the_bars_in_place(chart, shit):
+    chart.update_chart(shit.production_table().to_dataframe())
+    bars = list(chart.chart_bars)
+    assert chart.canvas.draws == 1 and len(bars) == 3
+
+    shit.content['FYM'].annual_volume *= 1.01
+    production_df = shit.production_table().to_dataframe()
+    chart.update_chart(production_df)
+
+    assert chart.chart_bars == bars  # Same artists, new vertices
+    assert len(chart.fig.axes) == 2  # No stacked twin axes
+    assert (chart.canvas.draws, chart.canvas.blits) == (1, 1)
+    row = list(production_df['Feedstock Name']).index('FYM')
+    assert bars[0].get_paths()[row].vertices[:, 1].max() == pytest.approx(shit.content['FYM'].annual_volume)
+
+
+class FakeTreeview:
+    """Just enough of ttk.Treeview to watch which lines a VirtualTable writes"""
+
+    def __init__(self, parent, **options):
+        self.options = options
+        self.items = {}  # Item -> (text, values)
+        self.attached = []
+        self.writes = 0
+
+    def insert(self, parent, index):
+        item = f"I{len(self.items)}"
+        self.items[item] = ('', ())
+        self.attached.append(item)
+        return item
+
+    def detach(self, item):
+        self.attached.remove(item)
+
+    def move(self, item, parent, index):
+        self.attached.insert(index, item)
+
+    def delete(self, item):
+        del self.items[item]
+
+    def item(self, item, text, values):
+        self.items[item] = (text, tuple(values))
+        self.writes += 1
+
+    def lines(self):
+        return [self.items[item] for item in self.attached]
+
+    def selection(self):
+        return ()
+
+    def heading(self, *args, **kwargs):
+        pass
+
+    column = pack = bind = selection_remove = heading
+
+
+class FakeScrollbar:
+    def __init__(self, parent, **options):
+        self.position = None
+
+    def pack(self, **options):
+        pass
+
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    monkeypatch.setattr(ui.ttk, 'Treeview', FakeTreeview)
+    monkeypatch.setattr(ui.ttk, 'Scrollbar', FakeScrollbar)
+    table = ui.VirtualTable(None, [('name', 'Feedstock', 100, None), ('kind', 'Type', 50, None),
+                                   ('volume', 'Volume', 80, '{:.1f}')], height=3)
+    table.set_data(name=['Maize', 'Slurry', 'Straw', 'Grass', 'Whey'], kind=['C', 'W', 'R', 'C', 'W'],
+                   volume=[50.0, 10.0, 40.0, 20.0, 30.0])
+    return table
+
+
+def test_only_the_lines_in_view_are_in_the_tree(table):
+    assert table.tree.lines() == [('Maize', ('C', '50.0')), ('Slurry', ('W', '10.0')), ('Straw', ('R', '40.0'))]
+    assert table.scrollbar.position == (0.0, 0.6)
+
+    table.scroll_to(10)  # Clamped to the last full page
+
+    assert table.first == 2
+    assert [text for text, values in table.tree.lines()] == ['Straw', 'Grass', 'Whey']
+
+
+def test_sorting_twice_reverses_the_order(table):
+    table.sort_by('volume')
+    assert [text for text, values in table.tree.lines()] == ['Slurry', 'Grass', 'Whey']
+
+    table.sort_by('volume')
+    assert [text for text, values in table.tree.lines()] == ['Maize', 'Straw', 'Whey']
+
+
+def test_filters_combine_and_empty_lines_are_detached(table):
+    table.set_filter('a', kind='C')
+
+    assert table.tree.lines() == [('Maize', ('C', '50.0')), ('Grass', ('C', '20.0'))]
+    assert table.row_for_item(table.slots[1]) == 3
+    assert table.row_for_item(table.slots[2]) is None
+
+
+def test_a_cell_edit_rewrites_only_its_line(table):
+    writes = table.tree.writes
+    table.set_value(1, 'volume', 12.5)
+
+    assert table.tree.writes == writes + 1
+    assert table.tree.lines()[1] == ('Slurry', ('W', '12.5'))
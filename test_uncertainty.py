@@ -0,0 +1,24 @@
+import pytest
+
+import uncertainty
+from model import mass_balance
+from uncertainty import OUTPUTS, UNCERTAIN_FIELDS, monte_carlo
+
+
+def test_results_do_not_depend_on_the_worker_count(shit, monkeypatch):
+    monkeypatch.setattr(uncertainty, 'CHUNK_ELEMENTS', 1000)  # Several chunks per run
+    serial = monte_carlo(shit, draws=5000, seed=3, workers=1)
+    parallel = monte_carlo(shit, draws=5000, seed=3, workers=2)
+
+    assert serial.draws == parallel.draws == 5000
+    for name in OUTPUTS:
+        assert serial[name] == parallel[name], name
+
+
+def test_zero_spread_reproduces_the_mass_balance(shit):
+    results = monte_carlo(shit, draws=100, relative_sd={name: 0.0 for name in UNCERTAIN_FIELDS}, workers=1)
+    mb = mass_balance(shit.library)
+
+    assert results['total_methane'].mean == pytest.approx(mb.total_methane)
+    assert results['total_methane'].std == pytest.approx(0.0, abs=1e-6)
+    assert results['power_output_mwh'].p50 == pytest.approx(mb.power_output_mwh)
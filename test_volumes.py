@@ -0,0 +1,43 @@
+from model import FeedStock, Shit, match_feedstock_volumes
+
+
+def library_shit(*names):
+    shit = Shit()
+    for name in names:
+        shit.add_feedstock(FeedStock('Farm', name, 0.2, 0.8, 400, 0.55, 'C', 1.0, 'L', 0.7, 1, 1, 1, 1, 1, 1, 1, 1))
+    return shit
+
+
+def write_volumes(tmp_path, *rows):
+    path = tmp_path / 'volumes.csv'
+    path.write_text('\n'.join(['Feedstock Name,TPA'] + list(rows)) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_names_match_after_normalising_and_aliases(tmp_path):
+    shit = library_shit('Maize Silage', 'Cattle  Slurry', 'Straw', 'Water')
+    path = write_volumes(tmp_path, ' maize silage ,"18,500"', 'CATTLE SLURRY, 2 000', 'Barley straw,30', 'Water, -')
+
+    report = match_feedstock_volumes(shit, path, aliases={'Barley Straw': 'straw'})
+
+    assert report.ok
+    assert report.matched == {'Maize Silage': 18500.0, 'Cattle  Slurry': 2000.0, 'Straw': 30.0, 'Water': 0.0}
+    assert report.missing == []
+    assert list(shit.library.column('annual_volume')) == [18500.0, 2000.0, 30.0, 0.0]
+
+
+def test_report_lists_every_matching_problem(tmp_path):
+    shit = library_shit('Maize', 'Grass', 'Straw')
+    path = write_volumes(tmp_path, 'Maize,10', 'maize,20', 'Grass,lots', 'Manure,5')
+
+    report = match_feedstock_volumes(shit, path)
+
+    assert not report.ok
+    assert report.unmatched == ['Manure']
+    assert report.missing == ['Straw']
+    assert report.ambiguous == [('maize', ['Maize', 'maize', 'Maize'])]
+    assert report.invalid == [('Grass', 'lots')]
+    # The last of the colliding rows wins and unparseable tonnages count as zero
+    assert shit.content['Maize'].annual_volume == 20.0
+    assert shit.content['Grass'].annual_volume == 0.0
+    assert shit.content['Straw'].annual_volume == 0.0
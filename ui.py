@@ -1,16 +1,194 @@
+import argparse
+import queue
+import sqlite3
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from model import Shit, FeedStock, feed
+from run_history import RunHistory, snapshot
 from datetime import datetime
 import matplotlib
 matplotlib.use('TkAgg')  # Set backend before importing pyplot
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.collections import PolyCollection
 import numpy as np
 
 
+MAX_BAR_LABELS = 30  # Value labels are only drawn for charts with up to this many feedstocks
+
+
+class VirtualTable:
+    """Treeview that only holds the rows in view
+
+    The data stays in columnar arrays; the tree keeps one item per visible
+    line and scrolling, sorting and filtering only change which data rows
+    those items show. A cell is written to Tk only when its text changes,
+    so a table of 100,000 feedstocks costs the same to refresh as one of 8.
+    """
+
+    def __init__(self, parent, columns, height=8):
+        # columns: (data key, heading, width, format string or None); the first is the tree column
+        self.keys = [key for key, _, _, _ in columns]
+        self.formats = {key: fmt for key, _, _, fmt in columns}
+        self.data = {key: np.array([], dtype=object) for key in self.keys}
+        self.size = 0
+        self.order = np.arange(0)  # Data rows in view order after sorting and filtering
+        self.sort_key = None
+        self.descending = False
+        self.text_filter = ''
+        self.equals_filter = {}
+        self.first = 0  # View position of the top visible line
+        self.slots = []  # Tree items, one per visible line
+        self.shown = []  # (text, values) each slot currently displays, None when detached
+        
+        self.tree = ttk.Treeview(parent, columns=self.keys[1:], show="tree headings", height=height)
+        for key, heading, width, _ in columns:
+            column = "#0" if key == self.keys[0] else key
+            self.tree.heading(column, text=heading, command=lambda k=key: self.sort_by(k))
+            self.tree.column(column, width=width, stretch=False)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.yview)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        self.tree.bind("<Configure>", self.on_resize)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self.on_wheel)
+        self.set_slot_count(height)
+    
+    def set_slot_count(self, count):
+        count = max(1, count)
+        while len(self.slots) < count:
+            item = self.tree.insert("", "end")
+            self.tree.detach(item)  # Attached by refresh once it has a row to show
+            self.slots.append(item)
+            self.shown.append(None)
+        while len(self.slots) > count:
+            self.tree.delete(self.slots.pop())
+            self.shown.pop()
+        self.refresh()
+    
+    def on_resize(self, event):
+        rowheight = ttk.Style().lookup("Treeview", "rowheight")
+        rowheight = int(rowheight) if rowheight else 20
+        heading = 25 if "headings" in str(self.tree.cget("show")) else 0
+        count = max(1, (event.height - heading) // rowheight)
+        if count != len(self.slots):
+            self.set_slot_count(count)
+    
+    def on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self.first - 3)
+        else:
+            self.scroll_to(self.first + 3)
+        return "break"
+    
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units' | 'pages')"""
+        if args[0] == "moveto":
+            self.scroll_to(int(round(float(args[1]) * len(self.order))))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (len(self.slots) if args[2] == "pages" else 1)
+            self.scroll_to(self.first + step)
+    
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.order) - len(self.slots)))
+        if first != self.first:
+            self.first = first
+            self.tree.selection_remove(self.tree.selection())
+            self.refresh()
+    
+    def set_data(self, **columns):
+        """Replace the table contents with whole columns keyed by data key"""
+        # Formatted columns are numeric, everything else (names, categories, units) is text
+        self.data = {key: np.asarray(values, dtype=None if self.formats.get(key) else object)
+                     for key, values in columns.items()}
+        self.size = len(next(iter(self.data.values()))) if self.data else 0
+        self._lower_names = None
+        self.update_view()
+    
+    def set_value(self, row, key, value):
+        """Change one data cell; only the line showing it is redrawn"""
+        self.data[key][row] = value
+        self.refresh()
+    
+    def column(self, key):
+        return self.data[key]
+    
+    def row_for_item(self, item):
+        """Data row behind a tree item, or None for an empty line"""
+        if item not in self.slots:
+            return None
+        position = self.first + self.slots.index(item)
+        return int(self.order[position]) if position < len(self.order) else None
+    
+    def sort_by(self, key):
+        """Sort on a column; choosing the same column again reverses the order"""
+        self.descending = not self.descending if key == self.sort_key else False
+        self.sort_key = key
+        self.first = 0
+        self.update_view()
+    
+    def set_filter(self, text=None, **equals):
+        """Show rows whose first column contains `text` and whose columns equal `equals` (None = any)"""
+        self.text_filter = (text or '').strip().lower()
+        self.equals_filter = {key: value for key, value in equals.items() if value not in (None, '')}
+        self.first = 0
+        self.update_view()
+    
+    def update_view(self):
+        order = np.arange(self.size)
+        if self.sort_key is not None and self.sort_key in self.data and self.size:
+            values = self.data[self.sort_key]
+            if values.dtype == object:
+                values = np.array(['' if v is None else str(v).lower() for v in values])
+            order = np.argsort(values, kind='stable')
+            if self.descending:
+                order = order[::-1]
+        
+        mask = np.ones(self.size, dtype=bool)
+        if self.text_filter:
+            if self._lower_names is None:
+                self._lower_names = [str(name).lower() for name in self.data[self.keys[0]]]
+            mask &= np.fromiter((self.text_filter in name for name in self._lower_names), bool, self.size)
+        for key, value in self.equals_filter.items():
+            if key in self.data:
+                mask &= self.data[key] == value
+        self.order = order[mask[order]]
+        
+        self.first = max(0, min(self.first, len(self.order) - len(self.slots)))
+        self.refresh()
+    
+    def format(self, key, value):
+        fmt = self.formats.get(key)
+        if value is None or (fmt and isinstance(value, float) and np.isnan(value)):
+            return ""
+        return fmt.format(value) if fmt else str(value)
+    
+    def refresh(self):
+        """Write the visible lines, touching only the ones whose text changed"""
+        for i, item in enumerate(self.slots):
+            position = self.first + i
+            if position >= len(self.order):
+                if self.shown[i] is not None:
+                    self.tree.detach(item)
+                    self.shown[i] = None
+                continue
+            row = self.order[position]
+            line = tuple(self.format(key, self.data[key][row]) if key in self.data else ""
+                         for key in self.keys)
+            if self.shown[i] is None:
+                self.tree.move(item, "", i)
+            if line != self.shown[i]:
+                self.tree.item(item, text=line[0], values=line[1:])
+                self.shown[i] = line
+        
+        total = max(len(self.order), 1)
+        self.scrollbar.set(self.first / total, min(1.0, (self.first + len(self.slots)) / total))
+
+
 class BiogasSimulatorUI:
-    def __init__(self, root):
+    def __init__(self, root, history_path=None):
         self.root = root
         self.root.title("Biogas Plant Simulator")
         self.root.geometry("1200x900")
@@ -18,6 +196,18 @@ class BiogasSimulatorUI:
         # Initialize data
         self.feedstock_obj = None
         self.load_feedstock_data()
+        self.history = None
+        self.open_history(history_path)
+        
+        # Background simulation state - the worker thread owns the model while it runs
+        self.results_queue = queue.Queue()
+        self.worker = None
+        self.cancel_event = threading.Event()
+        self.pending_volumes = None  # Latest request made while the worker was busy
+        self.run_id = 0
+        self.run_details = None  # Project details as they were when the current run started
+        self.polling = False
+        self.shown_results = None
         
         # Create main frame
         self.main_frame = ttk.Frame(self.root, padding="10")
@@ -36,10 +226,17 @@ class BiogasSimulatorUI:
     def load_feedstock_data(self):
         """Load feedstock data from CSV"""
         try:
-            self.feedstock_obj = feed("Feedstocks_Training.csv")
+            self.feedstock_obj = feed("Feedstocks_Training.csv", cache=True)
         except Exception as e:
             messagebox.showerror("Error", f"Error loading feedstock data: {e}")
     
+    def open_history(self, path=None):
+        """Open the run history (by default in the user data directory); simulations still run without it"""
+        try:
+            self.history = RunHistory(path)
+        except (sqlite3.Error, OSError) as e:
+            messagebox.showwarning("Warning", f"Run history unavailable: {e}")
+    
     def create_header_section(self):
         """Create project details and logo section"""
         header_frame = ttk.LabelFrame(self.main_frame, text="Project Details", padding="10")
@@ -96,20 +293,25 @@ class BiogasSimulatorUI:
         feedstock_container.pack(fill=tk.BOTH, expand=True)
         feedstock_container.pack_propagate(False)
         
-        # Create treeview for feedstock volumes
-        columns = ("Volume",)
-        self.feedstock_tree = ttk.Treeview(feedstock_container, columns=columns, show="tree headings", height=8)
-        self.feedstock_tree.heading("#0", text="Feedstock Name")
-        self.feedstock_tree.heading("Volume", text="Annual Volume (TPA)")
-        self.feedstock_tree.column("#0", width=180, stretch=False)
-        self.feedstock_tree.column("Volume", width=150, stretch=False)
-        
-        # Scrollbar for feedstock tree
-        feedstock_scroll = ttk.Scrollbar(feedstock_container, orient="vertical", command=self.feedstock_tree.yview)
-        self.feedstock_tree.configure(yscrollcommand=feedstock_scroll.set)
-        
-        self.feedstock_tree.pack(side="left", fill="both", expand=True)
-        feedstock_scroll.pack(side="right", fill="y")
+        # Name / category filter, applied to the volume and result tables alike
+        filter_frame = ttk.Frame(feedstock_frame)
+        filter_frame.pack(fill=tk.X, pady=(0, 5), before=feedstock_container)
+        ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.apply_filter())
+        ttk.Entry(filter_frame, textvariable=self.filter_var, width=18).pack(side=tk.LEFT, padx=(5, 0))
+        self.category_var = tk.StringVar(value="All")
+        self.category_box = ttk.Combobox(filter_frame, textvariable=self.category_var, width=6,
+                                         values=["All"], state="readonly")
+        self.category_box.pack(side=tk.LEFT, padx=(5, 0))
+        self.category_box.bind("<<ComboboxSelected>>", lambda event: self.apply_filter())
+        
+        # Virtualised table for feedstock volumes
+        self.feedstock_table = VirtualTable(feedstock_container, [
+            ("Feedstock Name", "Feedstock Name", 180, None),
+            ("Volume", "Annual Volume (TPA)", 150, "{:g}")
+        ])
+        self.feedstock_tree = self.feedstock_table.tree
         
         # Enable volume editing
         self.feedstock_tree.bind("<Double-1>", self.edit_volume)
@@ -124,6 +326,15 @@ class BiogasSimulatorUI:
         self.run_button = ttk.Button(button_frame, text="Run Simulation", command=self.run_simulation)
         self.run_button.pack(side=tk.LEFT)
         
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_simulation, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.progress = ttk.Progressbar(button_frame, mode='determinate', maximum=100, length=100)
+        self.progress.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.status_label = ttk.Label(button_frame, text="")
+        self.status_label.pack(side=tk.LEFT, padx=(5, 0))
+        
         # Right side - Biogas Production Statistics (fixed width)
         results_frame = ttk.LabelFrame(main_section_frame, text="Biogas Production Statistics", padding="10")
         results_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(2, 0))
@@ -133,32 +344,16 @@ class BiogasSimulatorUI:
         results_container.pack(fill=tk.BOTH, expand=True)
         results_container.pack_propagate(False)
         
-        # Create treeview for Biogas Production Statistics
-        columns = ("Volume_TPA", "Biogas_Year", "Biogas_Hour", "Methane_Year", "Methane_Hour", "Energy")
-        self.results_tree = ttk.Treeview(results_container, columns=columns, show="tree headings", height=8)
-        self.results_tree.heading("#0", text="Feedstock Name")
-        self.results_tree.heading("Volume_TPA", text="Volume (TPA)")
-        self.results_tree.heading("Biogas_Year", text="Biogas (m³/yr)")
-        self.results_tree.heading("Biogas_Hour", text="Biogas (m³/hr)")
-        self.results_tree.heading("Methane_Year", text="Methane (m³/yr)")
-        self.results_tree.heading("Methane_Hour", text="Methane (m³/hr)")
-        self.results_tree.heading("Energy", text="Energy (MWh/yr)")
-        
-        # Set column widths wide enough for headers and values
-        self.results_tree.column("#0", width=120, stretch=False)      # "Feedstock Name"
-        self.results_tree.column("Volume_TPA", width=100, stretch=False)   # "Volume (TPA)"
-        self.results_tree.column("Biogas_Year", width=110, stretch=False)  # "Biogas (m³/yr)"
-        self.results_tree.column("Biogas_Hour", width=110, stretch=False)  # "Biogas (m³/hr)"
-        self.results_tree.column("Methane_Year", width=115, stretch=False) # "Methane (m³/yr)"
-        self.results_tree.column("Methane_Hour", width=115, stretch=False) # "Methane (m³/hr)"
-        self.results_tree.column("Energy", width=120, stretch=False)       # "Energy (MWh/yr)"
-        
-        # Scrollbar for results
-        results_scroll = ttk.Scrollbar(results_container, orient="vertical", command=self.results_tree.yview)
-        self.results_tree.configure(yscrollcommand=results_scroll.set)
-        
-        self.results_tree.pack(side="left", fill="both", expand=True)
-        results_scroll.pack(side="right", fill="y")
+        # Virtualised table for Biogas Production Statistics, keyed by production table column
+        self.results_table = VirtualTable(results_container, [
+            ("Feedstock Name", "Feedstock Name", 120, None),
+            ("Annual Volume (TPA)", "Volume (TPA)", 100, "{:,.0f}"),
+            ("Biogas Volume (m3/yr)", "Biogas (m³/yr)", 110, "{:,.0f}"),
+            ("Biogas Output (m3/hr)", "Biogas (m³/hr)", 110, "{:,.2f}"),
+            ("Methane Volume (m3/yr)", "Methane (m³/yr)", 115, "{:,.0f}"),
+            ("Methane Output (m3/hr)", "Methane (m³/hr)", 115, "{:,.2f}"),
+            ("Energy Output (MWh/yr)", "Energy (MWh/yr)", 120, "{:,.1f}")
+        ])
     
     def create_results_section(self):
         """Results section now handled in create_feedstock_section"""
@@ -179,22 +374,8 @@ class BiogasSimulatorUI:
         bulk_container.pack(fill=tk.BOTH, expand=True)
         bulk_container.pack_propagate(False)
         
-        # Create treeview for bulk properties
-        columns = ("Value", "Units")
-        self.bulk_tree = ttk.Treeview(bulk_container, columns=columns, show="tree headings", height=8)
-        self.bulk_tree.heading("#0", text="Property")
-        self.bulk_tree.heading("Value", text="Value")
-        self.bulk_tree.heading("Units", text="Units")
-        self.bulk_tree.column("#0", width=165, stretch=False)
-        self.bulk_tree.column("Value", width=90, stretch=False)
-        self.bulk_tree.column("Units", width=60, stretch=False)
-        
-        # Scrollbar for bulk properties
-        bulk_scroll = ttk.Scrollbar(bulk_container, orient="vertical", command=self.bulk_tree.yview)
-        self.bulk_tree.configure(yscrollcommand=bulk_scroll.set)
-        
-        self.bulk_tree.pack(side="left", fill="both", expand=True)
-        bulk_scroll.pack(side="right", fill="y")
+        # Table for bulk properties
+        self.bulk_table = VirtualTable(bulk_container, self.property_columns())
         
         # Right side - Maximum Yields (fixed width)
         yields_frame = ttk.LabelFrame(bulk_section_frame, text="Maximum Gas Yields", padding="10")
@@ -205,22 +386,16 @@ class BiogasSimulatorUI:
         yields_container.pack(fill=tk.BOTH, expand=True)
         yields_container.pack_propagate(False)
         
-        # Create treeview for maximum yields
-        columns = ("Value", "Units")
-        self.yields_tree = ttk.Treeview(yields_container, columns=columns, show="tree headings", height=8)
-        self.yields_tree.heading("#0", text="Property")
-        self.yields_tree.heading("Value", text="Value")
-        self.yields_tree.heading("Units", text="Units")
-        self.yields_tree.column("#0", width=165, stretch=False)
-        self.yields_tree.column("Value", width=90, stretch=False)
-        self.yields_tree.column("Units", width=60, stretch=False)
-        
-        # Scrollbar for yields
-        yields_scroll = ttk.Scrollbar(yields_container, orient="vertical", command=self.yields_tree.yview)
-        self.yields_tree.configure(yscrollcommand=yields_scroll.set)
-        
-        self.yields_tree.pack(side="left", fill="both", expand=True)
-        yields_scroll.pack(side="right", fill="y")
+        # Table for maximum yields
+        self.yields_table = VirtualTable(yields_container, self.property_columns())
+    
+    @staticmethod
+    def property_columns():
+        return [
+            ("Property", "Property", 165, None),
+            ("Value", "Value", 90, "{:.2f}"),
+            ("Units", "Units", 60, None)
+        ]
     
     def create_chart_section(self):
         """Create chart section below the tables"""
@@ -238,8 +413,25 @@ class BiogasSimulatorUI:
             canvas_widget = self.canvas.get_tk_widget()
             canvas_widget.pack(fill=tk.BOTH, expand=True, pady=5)
             
+            # Axes, styling and the message text are created once; runs only update the bars
+            self.ax2 = self.ax.twinx()
+            self.ax.set_title('Feedstock Volumes vs Biogas & Methane Production', 
+                             fontsize=9, fontweight='bold')
+            self.ax.set_xlabel('Feedstock Type', fontsize=7)
+            self.ax.set_ylabel('Feedstock Volume (TPA)', color='steelblue', fontsize=7)
+            self.ax.tick_params(axis='y', labelcolor='steelblue', labelsize=6)
+            self.ax2.set_ylabel('Gas Volume (1000 m³/yr)', color='darkred', fontsize=7)
+            self.ax2.tick_params(axis='y', labelcolor='darkred', labelsize=6)
+            self.ax.grid(True, alpha=0.3)
+            self.chart_names = None
+            self.chart_bars = []  # Volume, biogas and methane bars, one PolyCollection each
+            self.chart_lefts = []  # Left edge of every bar, per collection
+            self.chart_labels = []  # Value annotations, one list per container
+            self.chart_background = None
+            self.canvas.mpl_connect('draw_event', self.on_chart_draw)
+            
             # Initial empty plot
-            self.ax.text(0.5, 0.5, 'Run simulation to generate chart', 
+            self.chart_message = self.ax.text(0.5, 0.5, 'Run simulation to generate chart', 
                         horizontalalignment='center', verticalalignment='center',
                         transform=self.ax.transAxes, fontsize=12, alpha=0.5)
             self.canvas.draw()
@@ -261,10 +453,6 @@ class BiogasSimulatorUI:
         if not self.feedstock_obj:
             return
         
-        # Clear existing items
-        for item in self.feedstock_tree.get_children():
-            self.feedstock_tree.delete(item)
-        
         # Default volumes
         default_volumes = {
             'Cow Slurry': 18500,
@@ -275,12 +463,21 @@ class BiogasSimulatorUI:
             'Water': 5000
         }
         
-        # Add feedstock items
-        for feedstock_name in self.feedstock_obj.content.keys():
-            volume = default_volumes.get(feedstock_name, 0)
-            self.feedstock_tree.insert("", "end", text=feedstock_name, values=(volume,))
-            # Set volume in model
-            self.feedstock_obj.content[feedstock_name].annual_volume = volume
+        # Whole columns go to the table and the model in one step each
+        library = self.feedstock_obj.library
+        names = library.column('feedstock_name')
+        categories = library.column('crop_residue_waste_other')
+        volumes = np.array([default_volumes.get(name, 0) for name in names], dtype=np.float64)
+        library.set_column('annual_volume', volumes)
+        self.feedstock_table.set_data(**{'Feedstock Name': names, 'Volume': volumes, 'Category': categories})
+        self.category_box.configure(values=["All"] + sorted({c for c in categories if c is not None}))
+    
+    def apply_filter(self):
+        """Filter the volume and result tables by name and category without rebuilding them"""
+        category = self.category_var.get()
+        category = None if category == "All" else category
+        for table in (self.feedstock_table, self.results_table):
+            table.set_filter(self.filter_var.get(), Category=category)
     
     def add_logo(self, event):
         """Add logo functionality"""
@@ -308,6 +505,9 @@ class BiogasSimulatorUI:
             return
         
         item = item[0]
+        row = self.feedstock_table.row_for_item(item)
+        if row is None:
+            return
         column = self.feedstock_tree.identify_column(event.x)
         
         # Check if clicked on the volume column (either #1 or #2 depending on setup)
@@ -328,8 +528,8 @@ class BiogasSimulatorUI:
                 def save_edit(event=None):
                     new_value = edit_var.get()
                     try:
-                        float(new_value)  # Validate numeric input
-                        self.feedstock_tree.set(item, "Volume", new_value)
+                        volume = float(new_value)  # Validate numeric input
+                        self.feedstock_table.set_value(row, "Volume", volume)
                         edit_entry.destroy()
                     except ValueError:
                         messagebox.showerror("Error", "Please enter a valid number")
@@ -347,78 +547,149 @@ class BiogasSimulatorUI:
                 # If bbox fails, the item might not be visible
                 pass
     
+    def project_details(self):
+        """Project detail fields as {label: text}"""
+        return {
+            'Project Name': self.project_name.get(),
+            'Location': self.location.get(),
+            'Date': self.date.get(),
+            'Consultant': self.consultant.get()
+        }
+    
+    def save_run(self, data):
+        """Append a finished run to the history with the project details it was run under"""
+        if self.history is None:
+            return
+        try:
+            self.history.append_many([(data, self.run_details, 'ui', None)])
+        except sqlite3.Error as e:
+            self.status_label.configure(text=f"Done - not saved to history: {e}")
+    
+    def read_volumes(self):
+        """Volumes from the feedstock table in library order, including filtered-out rows"""
+        return self.feedstock_table.column("Volume").astype(np.float64)
+    
     def run_simulation(self):
-        """Run the biogas simulation"""
+        """Run the biogas simulation on a worker thread"""
+        if not self.feedstock_obj:
+            messagebox.showerror("Error", "Feedstock data not loaded")
+            return
+        
+        volumes = self.read_volumes()
+        
+        if self.worker is not None and self.worker.is_alive():
+            # Coalesce repeated clicks: stop the current run and keep only the latest volumes
+            self.pending_volumes = volumes
+            self.cancel_event.set()
+            self.status_label.configure(text="Restarting...")
+            return
+        
+        self.start_worker(volumes)
+    
+    def start_worker(self, volumes):
+        self.run_id += 1
+        self.run_details = self.project_details()
+        self.cancel_event = threading.Event()
+        self.worker = threading.Thread(target=self.simulate, args=(self.run_id, volumes, self.cancel_event),
+                                       daemon=True)
+        self.worker.start()
+        
+        self.cancel_button.configure(state=tk.NORMAL)
+        self.progress['value'] = 0
+        self.status_label.configure(text="Running...")
+        if not self.polling:
+            self.polling = True
+            self.root.after(50, self.poll_results)
+    
+    def cancel_simulation(self):
+        self.pending_volumes = None
+        self.cancel_event.set()
+    
+    def simulate(self, run_id, volumes, cancel_event):
+        """Worker thread: apply the volumes and compute the result tables, reporting through the queue"""
+        post = self.results_queue.put
         try:
-            if not self.feedstock_obj:
-                messagebox.showerror("Error", "Feedstock data not loaded")
+            post(('progress', run_id, (10, "Applying volumes")))
+            library = self.feedstock_obj.library
+            # Only edited rows are written, each one an O(1) update of the running totals
+            for row in np.flatnonzero(library.column('annual_volume') != volumes):
+                library.set('annual_volume', row, volumes[row])
+            if cancel_event.is_set():
+                post(('cancelled', run_id, None))
                 return
             
-            # Update volumes from UI
-            for item in self.feedstock_tree.get_children():
-                feedstock_name = self.feedstock_tree.item(item, "text")
-                volume_str = self.feedstock_tree.set(item, "Volume")
-                try:
-                    volume = float(volume_str)
-                    if feedstock_name in self.feedstock_obj.content:
-                        self.feedstock_obj.content[feedstock_name].annual_volume = volume
-                except ValueError:
-                    messagebox.showerror("Error", f"Invalid volume for {feedstock_name}: {volume_str}")
-                    return
-            
-            # Get production results
-            production_df = self.feedstock_obj.biogas_production_stats()
-            
-            # Get bulk properties and yields
-            bulk_df, yields_df = self.feedstock_obj.bulk_properties()
-            
-            # Clear existing results
-            for item in self.results_tree.get_children():
-                self.results_tree.delete(item)
-            
-            # Clear bulk properties and yields tables
-            for item in self.bulk_tree.get_children():
-                self.bulk_tree.delete(item)
-            for item in self.yields_tree.get_children():
-                self.yields_tree.delete(item)
-            
-            # Add results to tree with all Biogas Production Statistics columns
-            if production_df is not None and not production_df.empty:
-                for _, row in production_df.iterrows():
-                    self.results_tree.insert("", "end",
-                                           text=row['Feedstock Name'],
-                                           values=(
-                                               f"{row['Annual Volume (TPA)']:,.0f}",
-                                               f"{row['Biogas Volume (m3/yr)']:,.0f}",
-                                               f"{row['Biogas Output (m3/hr)']:,.2f}",
-                                               f"{row['Methane Volume (m3/yr)']:,.0f}",
-                                               f"{row['Methane Output (m3/hr)']:,.2f}",
-                                               f"{row['Energy Output (MWh/yr)']:,.1f}"
-                                           ))
-            
-            # Populate bulk properties table
-            if bulk_df is not None and not bulk_df.empty:
-                for _, row in bulk_df.iterrows():
-                    self.bulk_tree.insert("", "end",
-                                        text=row['Property'],
-                                        values=(
-                                            f"{row['Value']:.2f}",
-                                            row['Units']
-                                        ))
+            post(('progress', run_id, (40, "Mass balance")))
+            production_df = self.feedstock_obj.production_table().to_dataframe()
+            active = self.feedstock_obj.mass_balance().active
+            production_df['Category'] = self.feedstock_obj.library.column('crop_residue_waste_other')[active]
+            if cancel_event.is_set():
+                post(('cancelled', run_id, None))
+                return
             
-            # Populate maximum yields table
-            if yields_df is not None and not yields_df.empty:
-                for _, row in yields_df.iterrows():
-                    self.yields_tree.insert("", "end",
-                                          text=row['Property'],
-                                          values=(
-                                              f"{row['Value']:.2f}",
-                                              row['Units']
-                                          ))
+            post(('progress', run_id, (80, "Bulk properties")))
+            bulk_table, yields_table = self.feedstock_obj.bulk_tables()
+            tables = (production_df, bulk_table.to_dataframe(), yields_table.to_dataframe())
+            post(('done', run_id, (tables, snapshot(self.feedstock_obj))))
+        except Exception as e:
+            post(('error', run_id, e))
+    
+    def poll_results(self):
+        """Main thread: drain the worker queue and apply only the latest finished run"""
+        finished = None
+        while True:
+            try:
+                kind, run_id, payload = self.results_queue.get_nowait()
+            except queue.Empty:
+                break
+            if run_id != self.run_id:
+                continue  # Left over from a superseded run
+            if kind == 'progress':
+                self.progress['value'], step = payload
+                self.status_label.configure(text=step)
+            else:
+                finished = (kind, payload)
+        
+        if finished is None:
+            self.root.after(50, self.poll_results)
+            return
+        self.polling = False
+        
+        if self.pending_volumes is not None:
+            volumes, self.pending_volumes = self.pending_volumes, None
+            self.start_worker(volumes)
+            return
+        
+        self.cancel_button.configure(state=tk.DISABLED)
+        kind, payload = finished
+        if kind == 'done':
+            self.progress['value'] = 100
+            self.status_label.configure(text="Done")
+            tables, data = payload
+            self.save_run(data)
+            self.show_results(*tables)
+        elif kind == 'cancelled':
+            self.progress['value'] = 0
+            self.status_label.configure(text="Cancelled")
+        else:
+            self.progress['value'] = 0
+            self.status_label.configure(text="Failed")
+            messagebox.showerror("Error", f"Simulation failed: {payload}")
+    
+    def show_results(self, production_df, bulk_df, yields_df):
+        """Populate the result tables and chart from a finished run"""
+        results = (production_df, bulk_df, yields_df)
+        if self.shown_results is not None and all(a.equals(b) for a, b in zip(results, self.shown_results)):
+            return  # Nothing changed since the last run on screen
+        self.shown_results = results
+        try:
+            # Tables take the result columns whole and only draw the rows in view
+            self.results_table.set_data(**{name: production_df[name].to_numpy() for name in production_df})
+            self.bulk_table.set_data(**{name: bulk_df[name].to_numpy() for name in bulk_df})
+            self.yields_table.set_data(**{name: yields_df[name].to_numpy() for name in yields_df})
             
             # Update chart if it exists
             if hasattr(self, 'canvas'):
-                self.update_chart()
+                self.update_chart(production_df)
                 
             if production_df is not None and not production_df.empty:
                 messagebox.showinfo("Success", "Simulation completed successfully!")
@@ -428,112 +699,156 @@ class BiogasSimulatorUI:
         except Exception as e:
             messagebox.showerror("Error", f"Simulation failed: {e}")
     
-    def update_chart(self):
-        """Update the chart with current simulation data"""
+    def show_chart_message(self, message):
+        self.chart_message.set_text(message)
+        self.chart_message.set_visible(True)
+        for artist in self.chart_artists():
+            artist.set_visible(False)
+        self.canvas.draw_idle()
+    
+    def chart_artists(self):
+        yield from self.chart_bars
+        for labels in self.chart_labels:
+            yield from labels
+    
+    @staticmethod
+    def bar_verts(lefts, width, heights):
+        """Rectangle corners for a row of bars, shape (bars, 4, 2)"""
+        verts = np.zeros((len(lefts), 4, 2))
+        verts[:, :2, 0] = lefts[:, None]
+        verts[:, 2:, 0] = (lefts + width)[:, None]
+        verts[:, 1:3, 1] = np.asarray(heights)[:, None]
+        return verts
+    
+    def on_chart_draw(self, event):
+        """After a full draw, keep the static background and paint the animated bars on top"""
+        self.chart_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_chart_artists()
+    
+    def draw_chart_artists(self):
+        for artist in self.chart_artists():
+            if artist.get_visible():
+                self.fig.draw_artist(artist)
+    
+    def build_chart_bars(self, feedstock_names):
+        """Create the bar and label artists for a new set of feedstocks"""
+        for artist in self.chart_artists():
+            artist.remove()
+        
+        x = np.arange(len(feedstock_names))
+        width = self.chart_width = 0.25
+        zeros = np.zeros(len(feedstock_names))
+        series = (
+            (self.ax, x - 1.5 * width, 'Feedstock Volume (TPA)', 'steelblue', None),
+            (self.ax2, x - 0.5 * width, 'Biogas Volume (1000 m³/yr)', 'darkorange', 'darkorange'),
+            (self.ax2, x + 0.5 * width, 'Methane Volume (1000 m³/yr)', 'forestgreen', 'forestgreen')
+        )
+        
+        # One collection per series draws 200 bars as fast as one; animated artists are
+        # left out of full draws and blitted over the cached background
+        self.chart_bars, self.chart_lefts, self.chart_labels = [], [], []
+        for axis, lefts, label, color, text_color in series:
+            bars = PolyCollection(self.bar_verts(lefts, width, zeros), label=label,
+                                  facecolor=color, alpha=0.8, animated=True)
+            axis.add_collection(bars)
+            self.chart_bars.append(bars)
+            self.chart_lefts.append(lefts)
+            if len(feedstock_names) <= MAX_BAR_LABELS:
+                self.chart_labels.append([
+                    axis.annotate('', xy=(left + width / 2, 0),
+                                  xytext=(0, 3), textcoords="offset points",
+                                  ha='center', va='bottom', fontsize=6, color=text_color, animated=True)
+                    for left in lefts
+                ])
+        self.ax.set_xlim(-0.5 - width, len(feedstock_names) - 0.5 + width)
+        
+        self.ax.set_xticks(x)
+        self.ax.set_xticklabels(feedstock_names, rotation=45, ha='right', fontsize=6)
+        
+        # Create combined legend
+        lines1, labels1 = self.ax.get_legend_handles_labels()
+        lines2, labels2 = self.ax2.get_legend_handles_labels()
+        self.ax.legend(lines1 + lines2, labels1 + labels2, loc='upper left', fontsize=6)
+        
+        self.chart_names = feedstock_names
+        self.fig.tight_layout(pad=1.5)
+    
+    @staticmethod
+    def fit_limit(axis, top):
+        """Rescale only when the bars outgrow the axis or shrink to under half of it; True if it changed"""
+        top = max(top, 1) * 1.1  # Headroom above the tallest bar for its value label
+        current = axis.get_ylim()[1]
+        if top / 1.1 <= current <= top * 2:
+            return False
+        axis.set_ylim(0, top)
+        return True
+    
+    def update_chart(self, production_df):
+        """Update the chart in place from the production table of the last run"""
         try:
-            # Clear the current plot
-            self.ax.clear()
-            
-            # Get production data
-            production_df = self.feedstock_obj.biogas_production_stats()
-            
             if production_df is None or production_df.empty:
-                self.ax.text(0.5, 0.5, 'No data to display', 
-                           horizontalalignment='center', verticalalignment='center',
-                           transform=self.ax.transAxes, fontsize=14, alpha=0.5)
-                self.canvas.draw()
+                self.show_chart_message('No data to display')
                 return
             
             # Filter out feedstocks with zero volume
             production_df = production_df[production_df['Annual Volume (TPA)'] > 0]
             
             if production_df.empty:
-                self.ax.text(0.5, 0.5, 'No feedstocks with volume > 0', 
-                           horizontalalignment='center', verticalalignment='center',
-                           transform=self.ax.transAxes, fontsize=14, alpha=0.5)
-                self.canvas.draw()
+                self.show_chart_message('No feedstocks with volume > 0')
                 return
             
             # Extract data for plotting
             feedstock_names = production_df['Feedstock Name'].tolist()
-            volumes = production_df['Annual Volume (TPA)'].tolist()
-            biogas_outputs = (production_df['Biogas Volume (m3/yr)'] / 1000).tolist()  # Convert to thousands
-            methane_outputs = (production_df['Methane Volume (m3/yr)'] / 1000).tolist()  # Convert to thousands
+            volumes = production_df['Annual Volume (TPA)'].to_numpy()
+            biogas_outputs = production_df['Biogas Volume (m3/yr)'].to_numpy() / 1000  # Convert to thousands
+            methane_outputs = production_df['Methane Volume (m3/yr)'].to_numpy() / 1000  # Convert to thousands
             
-            # Create the plot
-            x = np.arange(len(feedstock_names))
-            width = 0.25
+            # Bars are only rebuilt when the feedstocks on the chart change
+            full_redraw = self.chart_message.get_visible() or self.chart_background is None
+            if feedstock_names != self.chart_names:
+                self.build_chart_bars(feedstock_names)
+                full_redraw = True
             
-            # First y-axis for input volumes
-            bars1 = self.ax.bar(x - width, volumes, width, label='Feedstock Volume (TPA)', 
-                               color='steelblue', alpha=0.8)
-            self.ax.set_xlabel('Feedstock Type', fontsize=7)
-            self.ax.set_ylabel('Feedstock Volume (TPA)', color='steelblue', fontsize=7)
-            self.ax.tick_params(axis='y', labelcolor='steelblue', labelsize=6)
+            series = (volumes, biogas_outputs, methane_outputs)
+            for bars, lefts, values in zip(self.chart_bars, self.chart_lefts, series):
+                bars.set_verts(self.bar_verts(lefts, self.chart_width, values))
+            for labels, values in zip(self.chart_labels, series):
+                for label, height in zip(labels, values):
+                    label.xy = (label.xy[0], height)
+                    label.set_text(f'{height:.0f}')
             
-            # Second y-axis for gas outputs
-            ax2 = self.ax.twinx()
-            bars2 = ax2.bar(x, biogas_outputs, width, label='Biogas Volume (1000 m³/yr)', 
-                          color='darkorange', alpha=0.8)
-            bars3 = ax2.bar(x + width, methane_outputs, width, label='Methane Volume (1000 m³/yr)', 
-                          color='forestgreen', alpha=0.8)
-            ax2.set_ylabel('Gas Volume (1000 m³/yr)', color='darkred', fontsize=7)
-            ax2.tick_params(axis='y', labelcolor='darkred', labelsize=6)
+            full_redraw |= self.fit_limit(self.ax, volumes.max())
+            full_redraw |= self.fit_limit(self.ax2, max(biogas_outputs.max(), methane_outputs.max()))
             
-            # Customize the plot
-            self.ax.set_title('Feedstock Volumes vs Biogas & Methane Production', 
-                             fontsize=9, fontweight='bold')
-            self.ax.set_xticks(x)
-            self.ax.set_xticklabels(feedstock_names, rotation=45, ha='right', fontsize=6)
-            
-            # Create combined legend
-            lines1, labels1 = self.ax.get_legend_handles_labels()
-            lines2, labels2 = ax2.get_legend_handles_labels()
-            self.ax.legend(lines1 + lines2, labels1 + labels2, loc='upper left', fontsize=6)
-            
-            # Add value labels on bars
-            for bar in bars1:
-                height = bar.get_height()
-                self.ax.annotate(f'{height:.0f}',
-                               xy=(bar.get_x() + bar.get_width() / 2, height),
-                               xytext=(0, 3), textcoords="offset points",
-                               ha='center', va='bottom', fontsize=6)
-            
-            for bar in bars2:
-                height = bar.get_height()
-                ax2.annotate(f'{height:.0f}',
-                           xy=(bar.get_x() + bar.get_width() / 2, height),
-                           xytext=(0, 3), textcoords="offset points",
-                           ha='center', va='bottom', fontsize=6, color='darkorange')
-            
-            for bar in bars3:
-                height = bar.get_height()
-                ax2.annotate(f'{height:.0f}',
-                           xy=(bar.get_x() + bar.get_width() / 2, height),
-                           xytext=(0, 3), textcoords="offset points",
-                           ha='center', va='bottom', fontsize=6, color='forestgreen')
-            
-            # Add grid for better readability
-            self.ax.grid(True, alpha=0.3)
+            self.chart_message.set_visible(False)
+            for artist in self.chart_artists():
+                artist.set_visible(True)
             
-            # Refresh the canvas
-            self.fig.tight_layout(pad=1.5)
-            self.canvas.draw()
+            if full_redraw:
+                self.canvas.draw_idle()  # on_chart_draw paints the bars
+            else:
+                # Axes unchanged - blit the bars over the cached background
+                self.canvas.restore_region(self.chart_background)
+                self.draw_chart_artists()
+                self.canvas.blit(self.fig.bbox)
             
         except Exception as e:
-            self.ax.clear()
-            self.ax.text(0.5, 0.5, f'Error generating chart: {str(e)}', 
-                        horizontalalignment='center', verticalalignment='center',
-                        transform=self.ax.transAxes, fontsize=12, alpha=0.7)
-            self.canvas.draw()
+            self.show_chart_message(f'Error generating chart: {str(e)}')
+
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Biogas plant simulator")
+    parser.add_argument('--history', default=None, help="Run history database (default: the user data directory)")
+    args = parser.parse_args(argv)
 
-def main():
     root = tk.Tk()
-    app = BiogasSimulatorUI(root)
+    app = BiogasSimulatorUI(root, history_path=args.history)
     
     # Ensure proper cleanup on window close
     def on_closing():
+        app.cancel_simulation()
+        if app.history is not None:
+            app.history.close()
         try:
             # Close matplotlib figures
             plt.close('all')
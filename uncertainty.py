@@ -0,0 +1,248 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from model import Shit, NON_FEEDSTOCK_NAMES
+from scenarios import results_from_totals
+
+
+# Lab properties that are sampled, with their default relative standard deviation
+UNCERTAIN_FIELDS = ('dm', 'vs_of_dm', 'biogas_yield_vs', 'percent_ch4')
+DEFAULT_RELATIVE_SD = {
+    'dm': 0.10,
+    'vs_of_dm': 0.05,
+    'biogas_yield_vs': 0.15,
+    'percent_ch4': 0.05
+}
+FRACTION_FIELDS = ('dm', 'vs_of_dm', 'percent_ch4')  # Sampled values are capped at 1
+
+# Scenario outputs tracked by the percentile estimators
+OUTPUTS = (
+    'total_biogas', 'total_methane', 'power_output_mwh', 'mean_methane_percentage',
+    'bulk_dm_percentage', 'feedstock_bulk_dm_percentage', 'crop_methane_percentage'
+)
+
+CHUNK_ELEMENTS = 1 << 20  # Draws x feedstocks per chunk, bounds worker memory
+HISTOGRAM_BINS = 8192
+PILOT_DRAWS = 20000
+
+
+@dataclass
+class OutputSummary:
+    """Streaming summary of one Monte Carlo output"""
+    mean: float
+    std: float
+    minimum: float
+    maximum: float
+    percentiles: dict = field(default_factory=dict)
+
+    @property
+    def p10(self):
+        return self.percentiles.get(10)
+
+    @property
+    def p50(self):
+        return self.percentiles.get(50)
+
+    @property
+    def p90(self):
+        return self.percentiles.get(90)
+
+
+@dataclass
+class MonteCarloResults:
+    draws: int
+    seed: int
+    outputs: dict  # Output name -> OutputSummary
+
+    def __getitem__(self, name):
+        return self.outputs[name]
+
+
+@dataclass
+class _Model:
+    """Everything a worker needs to evaluate a chunk, small enough to pickle per task"""
+    means: np.ndarray  # (fields, feedstocks)
+    sds: np.ndarray
+    upper: np.ndarray
+    volume: np.ndarray
+    crop: np.ndarray
+    feedstock: np.ndarray
+
+
+class _Accumulator:
+    """Mergeable running moments plus a fixed-bin histogram per output"""
+
+    def __init__(self, lower, upper, bins=HISTOGRAM_BINS):
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.width = (np.asarray(upper, dtype=np.float64) - self.lower) / bins
+        self.width[self.width <= 0] = 1.0
+        self.bins = bins
+        outputs = len(self.lower)
+        # Bin 0 is underflow and bin bins + 1 is overflow
+        self.counts = np.zeros((outputs, bins + 2), dtype=np.int64)
+        self.n = 0
+        self.mean = np.zeros(outputs)
+        self.m2 = np.zeros(outputs)
+        self.minimum = np.full(outputs, np.inf)
+        self.maximum = np.full(outputs, -np.inf)
+
+    def add(self, values):
+        """Add a (draws x outputs) block"""
+        n = len(values)
+        if n == 0:
+            return
+        index = np.floor((values - self.lower) / self.width).astype(np.int64) + 1
+        np.clip(index, 0, self.bins + 1, out=index)
+        for i in range(values.shape[1]):
+            self.counts[i] += np.bincount(index[:, i], minlength=self.bins + 2)
+        block_mean = values.mean(axis=0)
+        block_m2 = ((values - block_mean) ** 2).sum(axis=0)
+        self._merge_moments(n, block_mean, block_m2)
+        self.minimum = np.minimum(self.minimum, values.min(axis=0))
+        self.maximum = np.maximum(self.maximum, values.max(axis=0))
+
+    def merge(self, other):
+        self.counts += other.counts
+        self._merge_moments(other.n, other.mean, other.m2)
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+
+    def _merge_moments(self, n, mean, m2):
+        # Chan et al. parallel update of the mean and sum of squared deviations
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+    def percentile(self, i, q):
+        """Percentile estimate from the histogram, interpolated within a bin"""
+        counts = self.counts[i]
+        target = q / 100 * self.n
+        cumulative = np.cumsum(counts)
+        b = int(np.searchsorted(cumulative, target, side='left'))
+        if b == 0:
+            return float(self.minimum[i])
+        if b == self.bins + 1:
+            return float(self.maximum[i])
+        below = cumulative[b - 1]
+        fraction = (target - below) / counts[b] if counts[b] else 0.0
+        value = self.lower[i] + (b - 1 + fraction) * self.width[i]
+        return float(np.clip(value, self.minimum[i], self.maximum[i]))
+
+
+def _relative_sd(relative_sd, n):
+    sd = dict(DEFAULT_RELATIVE_SD)
+    sd.update(relative_sd or {})
+    return np.vstack([np.broadcast_to(np.asarray(sd[name], dtype=np.float64), (n,)) for name in UNCERTAIN_FIELDS])
+
+
+def _build_model(shit: Shit, relative_sd):
+    lib = shit.library
+    volume = lib.column('annual_volume')
+    active = volume > 0
+    names = np.array(lib.column('feedstock_name'), dtype=object)[active]
+
+    means = np.nan_to_num(np.vstack([lib.column(name)[active] for name in UNCERTAIN_FIELDS]))
+    sds = means * _relative_sd(relative_sd, len(lib))[:, active]
+    upper = np.full_like(means, np.inf)
+    for i, name in enumerate(UNCERTAIN_FIELDS):
+        if name in FRACTION_FIELDS:
+            upper[i] = 1.0
+
+    return _Model(
+        means=means,
+        sds=sds,
+        upper=upper,
+        volume=volume[active].copy(),
+        crop=lib.category_mask('crop_residue_waste_other', 'C')[active],
+        feedstock=~np.isin(names, NON_FEEDSTOCK_NAMES)
+    )
+
+
+def _evaluate(model: _Model, seed, draws):
+    """Sample properties for `draws` cases and return a (draws x OUTPUTS) array"""
+    rng = np.random.default_rng(seed)
+    n = model.volume.shape[0]
+    samples = rng.standard_normal((len(UNCERTAIN_FIELDS), draws, n))
+    samples *= model.sds[:, None, :]
+    samples += model.means[:, None, :]
+    np.clip(samples, 0.0, model.upper[:, None, :], out=samples)
+    dm, vs_of_dm, biogas_yield_vs, percent_ch4 = samples
+
+    # Same chain as the mass balance, one row per draw
+    dm_input = dm * model.volume
+    vs_input = dm_input * vs_of_dm
+    biogas = vs_input * biogas_yield_vs
+    methane = biogas * percent_ch4
+
+    totals = np.empty((draws, 8))
+    totals[:, 0] = model.volume.sum()
+    totals[:, 1] = dm_input.sum(axis=1)
+    totals[:, 2] = vs_input.sum(axis=1)
+    totals[:, 3] = biogas.sum(axis=1)
+    totals[:, 4] = methane.sum(axis=1)
+    totals[:, 5] = methane[:, model.crop].sum(axis=1)
+    totals[:, 6] = model.volume[model.feedstock].sum()
+    totals[:, 7] = dm_input[:, model.feedstock].sum(axis=1)
+
+    results = results_from_totals(totals)
+    return np.column_stack([getattr(results, name) for name in OUTPUTS])
+
+
+def _run_chunk(args):
+    model, seed, draws, lower, upper = args
+    accumulator = _Accumulator(lower, upper)
+    accumulator.add(_evaluate(model, seed, draws))
+    return accumulator
+
+
+def monte_carlo(shit: Shit, draws=100000, relative_sd=None, percentiles=(10, 50, 90),
+                seed=0, workers=None):
+    """Monte Carlo run of the mass balance with uncertain lab properties
+
+    Each feedstock's DM, VS of DM, Biogas Yield VS and % CH4 are drawn from a
+    normal distribution around the lab value (relative_sd maps field name to a
+    scalar or per-feedstock relative standard deviation), clipped to valid
+    ranges. Draws are evaluated in chunks across a process pool and folded into
+    fixed-size histograms, so memory does not grow with the number of draws.
+    Every chunk has its own seed spawned from `seed`, so results are the same
+    for any number of workers.
+    """
+    model = _build_model(shit, relative_sd)
+    chunk = max(1, CHUNK_ELEMENTS // max(1, model.volume.shape[0]))
+    sizes = [min(chunk, draws - start) for start in range(0, draws, chunk)]
+    pilot_seed, *chunk_seeds = np.random.SeedSequence(seed).spawn(len(sizes) + 1)
+
+    # A small pilot run fixes the histogram range shared by every worker
+    pilot = _evaluate(model, pilot_seed, min(PILOT_DRAWS, max(draws, 1)))
+    low, high = pilot.min(axis=0), pilot.max(axis=0)
+    span = np.maximum(high - low, np.abs(high) * 1e-9)
+    lower, upper = low - span / 2, high + span / 2
+
+    tasks = ((model, s, size, lower, upper) for s, size in zip(chunk_seeds, sizes))
+    total = _Accumulator(lower, upper)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(sizes) == 1:
+        for task in tasks:
+            total.merge(_run_chunk(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(_run_chunk, tasks):
+                total.merge(result)
+
+    outputs = {}
+    for i, name in enumerate(OUTPUTS):
+        outputs[name] = OutputSummary(
+            mean=float(total.mean[i]),
+            std=float(np.sqrt(total.m2[i] / total.n)) if total.n else 0.0,
+            minimum=float(total.minimum[i]),
+            maximum=float(total.maximum[i]),
+            percentiles={q: total.percentile(i, q) for q in percentiles}
+        )
+    return MonteCarloResults(draws=total.n, seed=seed, outputs=outputs)